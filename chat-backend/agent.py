@@ -9,20 +9,98 @@ import websockets
 import httpx
 from dotenv import load_dotenv
 
+from audio_io import AudioIO
+from vad import EnergyVAD
+from resampler import PolyphaseResampler
+
 load_dotenv()
 
 # Audio Configuration
-SAMPLE_RATE = 44100
+DEVICE_SAMPLE_RATE = 44100  # Fallback when the device does not report its native rate
 CHUNK_SIZE = 2048  # Increased chunk size for smoother streaming
 CHANNELS = 1
 FORMAT = pyaudio.paInt16
 
+# audio/pcm rates the realtime session accepts that are still fine for speech.
+# The client asks for the lowest one (or WIRE_SAMPLE_RATE if set) and
+# resamples to/from the device's native rate locally.
+SUPPORTED_WIRE_RATES = [16000, 24000, 44100, 48000]
+WIRE_SAMPLE_RATE = int(os.getenv("WIRE_SAMPLE_RATE", "0")) or None
+
+# Client-side VAD: only speech (plus hangover/pre-roll padding) is sent upstream
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() == "true"
+VAD_ENERGY_DB = float(os.getenv("VAD_ENERGY_DB", "-45"))
+VAD_ZCR_MIN = float(os.getenv("VAD_ZCR_MIN", "0.25"))
+VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "300"))
+VAD_PRE_ROLL_MS = int(os.getenv("VAD_PRE_ROLL_MS", "200"))
+# Commit the input buffer as soon as local VAD sees the end of speech, instead of
+# waiting for the server's own silence detection
+VAD_EARLY_COMMIT = os.getenv("VAD_EARLY_COMMIT", "false").lower() == "true"
+# Without early commit, this much digital silence follows each utterance: the
+# gate stops sending after the hangover, and server VAD only ends a turn once
+# it has heard its own silence window
+VAD_SILENCE_TAIL_MS = int(os.getenv("VAD_SILENCE_TAIL_MS", "800"))
+
+# Session fields an error must point at for us to treat it as "rate not supported"
+AUDIO_FORMAT_PARAMS = ("session.audio.input.format", "session.audio.output.format")
+
+
+def rejects_audio_format(error) -> bool:
+    """True if a server error event's error names our audio format (e.g. its rate) as the bad parameter."""
+    if not isinstance(error, dict):
+        return False
+    param = error.get("param") or ""
+    return any(param == p or param.startswith(p + ".") for p in AUDIO_FORMAT_PARAMS)
+
+
 class GrokVoiceClient:
-    def __init__(self):
-        self.p = pyaudio.PyAudio()
-        self.input_stream = None
-        self.output_stream = None
+    def __init__(self, input_stream=None, output_stream=None):
+        # Pass fake streams (see audio_io.FakeAudioStream) to run without sound hardware
+        self.p = None if input_stream and output_stream else pyaudio.PyAudio()
+        self.input_stream = input_stream
+        self.output_stream = output_stream
+        self.audio = None
+        self.device_rate = DEVICE_SAMPLE_RATE
+        self.wire_rates = [WIRE_SAMPLE_RATE] if WIRE_SAMPLE_RATE else list(SUPPORTED_WIRE_RATES)
+        self.wire_rate = None
+        self.session_confirmed = False
+        self.mic_resampler = None
+        self.speaker_resampler = None
+        self.vad = None
+        self.silence_tail = b""
         self.is_listening = True
+
+    def set_wire_rate(self, rate: int):
+        """(Re)build everything that depends on the rate we speak to the server in."""
+        self.wire_rate = rate
+        self.mic_resampler = PolyphaseResampler(self.device_rate, rate)
+        self.speaker_resampler = PolyphaseResampler(rate, self.device_rate)
+        previous = self.vad
+        self.vad = EnergyVAD(
+            rate=rate,
+            energy_db=VAD_ENERGY_DB,
+            zcr_min=VAD_ZCR_MIN,
+            hangover_ms=VAD_HANGOVER_MS,
+            pre_roll_ms=VAD_PRE_ROLL_MS,
+        ) if VAD_ENABLED else None
+        if self.vad and previous:
+            self.vad.carry_over(previous)
+        self.silence_tail = bytes(rate * VAD_SILENCE_TAIL_MS // 1000 * 2)
+        print(f"🎚️ Audio: device {self.device_rate} Hz <-> wire {rate} Hz")
+
+    def session_config(self) -> dict:
+        return {
+            "type": "session.update",
+            "session": {
+                "voice": "Ara",
+                "instructions": "You are a witty, helpful AI.",
+                "turn_detection": {"type": "server_vad"}, 
+                "audio": {
+                    "input": {"format": {"type": "audio/pcm", "rate": self.wire_rate}},
+                    "output": {"format": {"type": "audio/pcm", "rate": self.wire_rate}}
+                }
+            }
+        }
         
     async def get_token(self):
         """Fetch token from our local Dockerized server or use direct Key."""
@@ -39,14 +117,25 @@ class GrokVoiceClient:
             return os.getenv("XAI_API_KEY")
 
     def setup_audio(self):
-        self.input_stream = self.p.open(
-            format=FORMAT, channels=CHANNELS, rate=SAMPLE_RATE,
-            input=True, frames_per_buffer=CHUNK_SIZE
-        )
-        self.output_stream = self.p.open(
-            format=FORMAT, channels=CHANNELS, rate=SAMPLE_RATE,
-            output=True
-        )
+        # Capture/play at the device's native rate, so the OS does no resampling of its own
+        if self.p:
+            self.device_rate = int(self.p.get_default_input_device_info()["defaultSampleRate"])
+        else:
+            self.device_rate = getattr(self.input_stream, "rate", DEVICE_SAMPLE_RATE)
+
+        if self.input_stream is None:
+            self.input_stream = self.p.open(
+                format=FORMAT, channels=CHANNELS, rate=self.device_rate,
+                input=True, frames_per_buffer=CHUNK_SIZE
+            )
+        if self.output_stream is None:
+            self.output_stream = self.p.open(
+                format=FORMAT, channels=CHANNELS, rate=self.device_rate,
+                output=True, frames_per_buffer=CHUNK_SIZE
+            )
+        # Capture and playback get their own threads; the loops below only touch ring buffers
+        self.audio = AudioIO(self.input_stream, self.output_stream, rate=self.device_rate, chunk=CHUNK_SIZE)
+        self.audio.start(asyncio.get_running_loop())
 
     async def send_audio_loop(self, websocket):
         """Continuously reads mic input and sends to WebSocket."""
@@ -56,33 +145,35 @@ class GrokVoiceClient:
         
         try:
             while self.is_listening:
-                # 1. Read raw bytes from microphone (Non-blocking way)
-                # We use specific exception handling for input overflow
-                try:
-                    data = await asyncio.to_thread(
-                        self.input_stream.read, 
-                        CHUNK_SIZE, 
-                        exception_on_overflow=False
-                    )
-                except IOError as e:
-                    print(f"Audio read warning: {e}")
-                    continue
-
-                if not data:
-                    break
-
-                # 2. Encode to Base64
-                b64_audio = base64.b64encode(data).decode("utf-8")
-                
-                # 3. Send Append Message
-                msg = {
-                    "type": "input_audio_buffer.append",
-                    "audio": b64_audio
-                }
-                await websocket.send(json.dumps(msg))
-                
-                # Zero sleep allows event loop to switch context without adding latency
-                await asyncio.sleep(0) 
+                # 1. Next chunk from the capture thread's ring buffer
+                data = await self.audio.read_chunk()
+                data = self.mic_resampler.process(data)
+
+                # 2. Gate out silence
+                speech_ended = False
+                if self.vad:
+                    data, speech_ended = self.vad.process(data)
+
+                if data:
+                    # 3. Encode to Base64
+                    b64_audio = base64.b64encode(data).decode("utf-8")
+
+                    # 4. Send Append Message
+                    msg = {
+                        "type": "input_audio_buffer.append",
+                        "audio": b64_audio
+                    }
+                    await websocket.send(json.dumps(msg))
+
+                if speech_ended:
+                    if VAD_EARLY_COMMIT:
+                        await websocket.send(json.dumps({"type": "input_audio_buffer.commit"}))
+                    elif self.silence_tail:
+                        # Let server VAD hear the end of the turn instead of waiting for more audio
+                        await websocket.send(json.dumps({
+                            "type": "input_audio_buffer.append",
+                            "audio": base64.b64encode(self.silence_tail).decode("utf-8")
+                        }))
         except Exception as e:
             print(f"Audio send error: {e}")
 
@@ -101,9 +192,12 @@ class GrokVoiceClient:
                 if event_type == "response.audio.delta":
                     b64_data = event.get("delta", "")
                     if b64_data:
-                        audio_bytes = base64.b64decode(b64_data)
-                        # Write audio directly to stream
-                        await asyncio.to_thread(self.output_stream.write, audio_bytes)
+                        audio_bytes = self.speaker_resampler.process(base64.b64decode(b64_data))
+                        # Hand off to the playback thread's jitter buffer
+                        self.audio.play(audio_bytes)
+
+                elif event_type in ["response.audio.done", "response.done"]:
+                    self.audio.end_of_playback()
                 
                 elif event_type == "response.audio_transcript.delta":
                     delta = event.get("delta", "")
@@ -112,8 +206,20 @@ class GrokVoiceClient:
                 elif event_type == "response.created":
                     print("\n🤖 Generating response...")
 
+                elif event_type == "session.updated":
+                    self.session_confirmed = True
+                    # Follow whatever rate the server actually settled on
+                    rate = event.get("session", {}).get("audio", {}).get("input", {}).get("format", {}).get("rate")
+                    if rate and rate != self.wire_rate:
+                        self.set_wire_rate(rate)
+
                 elif event_type == "error":
                     print(f"\n❌ Error: {event.get('error')}")
+                    # Rejected before the session was confirmed: try the next rate up
+                    next_rates = [r for r in self.wire_rates if r > self.wire_rate]
+                    if not self.session_confirmed and next_rates and rejects_audio_format(event.get("error")):
+                        self.set_wire_rate(next_rates[0])
+                        await websocket.send(json.dumps(self.session_config()))
 
         except websockets.exceptions.ConnectionClosed:
             print("\nConnection closed.")
@@ -132,20 +238,9 @@ class GrokVoiceClient:
         async with websockets.connect(url, additional_headers=headers) as ws:
             print("✅ Connected to Grok Voice API")
             
-            # 1. Send Session Configuration
-            session_config = {
-                "type": "session.update",
-                "session": {
-                    "voice": "Ara",
-                    "instructions": "You are a witty, helpful AI.",
-                    "turn_detection": {"type": "server_vad"}, 
-                    "audio": {
-                        "input": {"format": {"type": "audio/pcm", "rate": SAMPLE_RATE}},
-                        "output": {"format": {"type": "audio/pcm", "rate": SAMPLE_RATE}}
-                    }
-                }
-            }
-            await ws.send(json.dumps(session_config))
+            # 1. Send Session Configuration, asking for the lowest wire rate first
+            self.set_wire_rate(self.wire_rates[0])
+            await ws.send(json.dumps(self.session_config()))
 
             # 
 
@@ -158,13 +253,19 @@ class GrokVoiceClient:
 
     def cleanup(self):
         print("\nCleaning up audio resources...")
+        if self.audio:
+            self.audio.stop()
+            print(f"📊 Audio stats: {self.audio.stats()}")
+        if self.vad:
+            print(f"📊 VAD stats: {self.vad.stats()}")
         if self.input_stream: 
             self.input_stream.stop_stream()
             self.input_stream.close()
         if self.output_stream: 
             self.output_stream.stop_stream()
             self.output_stream.close()
-        self.p.terminate()
+        if self.p:
+            self.p.terminate()
 
 if __name__ == "__main__":
     client = GrokVoiceClient()
@@ -0,0 +1,222 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Single-producer/single-consumer ring of int16 samples backed by a NumPy array.
+
+    No locks: only the writer moves `_write_pos` and only the reader moves
+    `_read_pos`, and each is a plain int assignment under the GIL.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = np.zeros(capacity, dtype=np.int16)
+        self._write_pos = 0
+        self._read_pos = 0
+        self.overruns = 0  # samples dropped because the reader fell behind
+
+    def available(self) -> int:
+        return self._write_pos - self._read_pos
+
+    def write(self, samples: np.ndarray) -> int:
+        free = self.capacity - self.available()
+        if len(samples) > free:
+            self.overruns += len(samples) - free
+            samples = samples[:free]
+        n = len(samples)
+        start = self._write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start:start + first] = samples[:first]
+        self._buf[:n - first] = samples[first:]
+        self._write_pos += n
+        return n
+
+    def read(self, n: int) -> Optional[np.ndarray]:
+        """Exactly n samples, or None if fewer are buffered."""
+        if self.available() < n:
+            return None
+        start = self._read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        out = np.concatenate((self._buf[start:start + first], self._buf[:n - first]))
+        self._read_pos += n
+        return out
+
+    def clear(self):
+        self._read_pos = self._write_pos
+
+
+class JitterBuffer:
+    """
+    Playback buffer that waits for `target` samples before it starts playing, and
+    grows the target after every underrun / shrinks it again after a calm stretch.
+    """
+
+    def __init__(self, rate: int, target_ms: int = 80, min_ms: int = 40, max_ms: int = 400, capacity_seconds: int = 30):
+        self.ring = RingBuffer(rate * capacity_seconds)
+        self.min_target = rate * min_ms // 1000
+        self.max_target = rate * max_ms // 1000
+        self.target = rate * target_ms // 1000
+        # Shrink the target after this many samples played without an underrun
+        self.calm_samples = rate * 5
+        self._priming = True
+        self._streaming = False
+        self._played_since_underrun = 0
+        self.underruns = 0
+
+    def push(self, samples: np.ndarray):
+        self.ring.write(samples)
+        self._streaming = True
+
+    def end_of_stream(self):
+        """The response finished: whatever is buffered plays out, running dry is expected."""
+        self._streaming = False
+
+    def pull(self, n: int) -> np.ndarray:
+        """n samples to play right now; silence while priming or when there is nothing to play."""
+        available = self.ring.available()
+        if self._priming:
+            if self._streaming and available < max(self.target, n):
+                return np.zeros(n, dtype=np.int16)
+            self._priming = False
+
+        if available >= n:
+            chunk = self.ring.read(n)
+            self._played_since_underrun += n
+            if self._played_since_underrun >= self.calm_samples and self.target > self.min_target:
+                self.target = max(self.target * 9 // 10, self.min_target)
+                self._played_since_underrun = 0
+            return chunk
+
+        # Short of a full chunk: play the tail padded with silence
+        chunk = np.zeros(n, dtype=np.int16)
+        if available:
+            chunk[:available] = self.ring.read(available)
+        if self._streaming:
+            # Ran dry mid-response: re-prime with a bigger cushion
+            self.underruns += 1
+            self.target = min(self.target * 3 // 2, self.max_target)
+            self._played_since_underrun = 0
+        self._priming = True
+        return chunk
+
+    def clear(self):
+        self.ring.clear()
+        self._priming = True
+        self._streaming = False
+
+
+class FakeAudioStream:
+    """Stand-in for a PyAudio stream so the audio core runs without sound hardware."""
+
+    def __init__(self, rate: int, source: Optional[np.ndarray] = None):
+        self.rate = rate
+        self.source = source if source is not None else np.zeros(0, dtype=np.int16)
+        self._pos = 0
+        self.written = bytearray()
+
+    def read(self, frames: int, exception_on_overflow: bool = True) -> bytes:
+        time.sleep(frames / self.rate)
+        chunk = np.zeros(frames, dtype=np.int16)
+        data = self.source[self._pos:self._pos + frames]
+        chunk[:len(data)] = data
+        self._pos += frames
+        return chunk.tobytes()
+
+    def write(self, data: bytes):
+        time.sleep(len(data) / 2 / self.rate)
+        self.written += data
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class AudioIO:
+    """
+    Runs capture and playback on their own threads so no audio chunk ever waits
+    on the asyncio default executor. The event loop only touches the ring buffers.
+    """
+
+    def __init__(self, input_stream, output_stream, rate: int, chunk: int):
+        self.input_stream = input_stream
+        self.output_stream = output_stream
+        self.rate = rate
+        self.chunk = chunk
+
+        self.capture = RingBuffer(rate * 2)
+        self.playback = JitterBuffer(rate)
+
+        self._running = False
+        self._threads = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._captured = asyncio.Event()
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="audio-capture", daemon=True),
+            threading.Thread(target=self._playback_loop, name="audio-playback", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+
+    async def read_chunk(self) -> bytes:
+        """Next CHUNK of captured audio, waiting on the capture thread without polling."""
+        while True:
+            samples = self.capture.read(self.chunk)
+            if samples is not None:
+                return samples.tobytes()
+            self._captured.clear()
+            # Re-check after clearing so a write in between is not missed
+            if self.capture.available() >= self.chunk:
+                continue
+            await self._captured.wait()
+
+    def play(self, pcm: bytes):
+        self.playback.push(np.frombuffer(pcm, dtype=np.int16))
+
+    def end_of_playback(self):
+        self.playback.end_of_stream()
+
+    def stats(self) -> dict:
+        return {
+            "capture_overruns": self.capture.overruns,
+            "playback_underruns": self.playback.underruns,
+            "playback_overruns": self.playback.ring.overruns,
+            "jitter_target_ms": self.playback.target * 1000 // self.rate,
+        }
+
+    def _capture_loop(self):
+        while self._running:
+            try:
+                data = self.input_stream.read(self.chunk, exception_on_overflow=False)
+            except IOError as e:
+                print(f"Audio read warning: {e}")
+                continue
+            if not data:
+                break
+            self.capture.write(np.frombuffer(data, dtype=np.int16))
+            try:
+                self._loop.call_soon_threadsafe(self._captured.set)
+            except RuntimeError:
+                break  # Event loop already closed
+
+    def _playback_loop(self):
+        # The blocking write paces this thread at the device rate
+        while self._running:
+            self.output_stream.write(self.playback.pull(self.chunk).tobytes())
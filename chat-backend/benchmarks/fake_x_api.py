@@ -0,0 +1,134 @@
+"""
+Local stand-in for the two X API v2 endpoints the crawler uses, with X's
+rate-limit behaviour: per-endpoint windows, x-rate-limit-* headers on every
+response, 429 once a window is spent, and a 400 for the whole users lookup if
+any username in it is malformed.
+
+Users exist for every valid handle except those starting with "ghost"; each
+has FAKE_TWEETS_PER_USER tweets with increasing ids. Run it on its own and point
+the backend at it with X_API_BASE_URL:
+
+    cd chat-backend && uvicorn benchmarks.fake_x_api:app --port 8099
+    X_API_BASE_URL=http://127.0.0.1:8099 X_BEARER_TOKEN=fake uvicorn main:app
+"""
+import re
+import time
+import zlib
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+
+VALID_USERNAME = re.compile(r"^[A-Za-z0-9_]{1,15}$")
+FAKE_TWEETS_PER_USER = 120
+
+# Requests per window, and window length in seconds, per endpoint
+WINDOWS = {
+    "users_by": (300, 900.0),
+    "user_tweets": (1500, 900.0),
+}
+
+app = FastAPI()
+requests_seen: Dict[str, int] = {"users_by": 0, "user_tweets": 0, "rejected": 0, "rate_limited": 0}
+_windows: Dict[str, Dict[str, float]] = {}
+
+
+def configure(windows: Dict[str, tuple]):
+    """Swap the rate-limit windows (e.g. tiny ones for a quick run) and reset counters."""
+    WINDOWS.update(windows)
+    _windows.clear()
+    for key in requests_seen:
+        requests_seen[key] = 0
+
+
+def _take(bucket: str) -> Optional[Dict[str, str]]:
+    """Spend one request from the bucket; returns the headers, or None once the window is spent."""
+    limit, seconds = WINDOWS[bucket]
+    now = time.time()
+    window = _windows.get(bucket)
+    if window is None or now >= window["reset"]:
+        window = _windows[bucket] = {"remaining": limit, "reset": now + seconds}
+    spent = window["remaining"] <= 0
+    if not spent:
+        window["remaining"] -= 1
+    headers = {
+        "x-rate-limit-limit": str(limit),
+        "x-rate-limit-remaining": str(int(window["remaining"])),
+        "x-rate-limit-reset": str(int(window["reset"]) + 1),
+    }
+    return None if spent else headers
+
+
+def _rate_limited(bucket: str) -> JSONResponse:
+    requests_seen["rate_limited"] += 1
+    window = _windows[bucket]
+    return JSONResponse(
+        {"title": "Too Many Requests", "status": 429},
+        status_code=429,
+        headers={"x-rate-limit-remaining": "0", "x-rate-limit-reset": str(int(window["reset"]) + 1)},
+    )
+
+
+def _user(username: str) -> Dict:
+    user_id = str(zlib.crc32(username.lower().encode()))
+    return {
+        "id": user_id,
+        "username": username,
+        "name": username.capitalize(),
+        "description": f"Fake bio of @{username}",
+        "location": "Localhost",
+        "verified": False,
+        "created_at": "2020-01-01T00:00:00.000Z",
+        "public_metrics": {"followers_count": 100, "following_count": 10, "tweet_count": FAKE_TWEETS_PER_USER, "listed_count": 1},
+    }
+
+
+@app.get("/2/users/by")
+async def users_by(usernames: str, user_fields: Optional[str] = Query(None, alias="user.fields")):
+    headers = _take("users_by")
+    if headers is None:
+        return _rate_limited("users_by")
+    requests_seen["users_by"] += 1
+    names = usernames.split(",")
+    bad = [name for name in names if not VALID_USERNAME.match(name)]
+    if bad or len(names) > 100:
+        requests_seen["rejected"] += 1
+        return JSONResponse(
+            {"errors": [{"message": f"The `usernames` query parameter value [{name}] is not valid"} for name in bad]},
+            status_code=400,
+            headers=headers,
+        )
+    data = [_user(name) for name in names if not name.lower().startswith("ghost")]
+    errors = [{"value": name, "title": "Not Found Error"} for name in names if name.lower().startswith("ghost")]
+    body = {"data": data} if data else {}
+    if errors:
+        body["errors"] = errors
+    return JSONResponse(body, headers=headers)
+
+
+@app.get("/2/users/{user_id}/tweets")
+async def user_tweets(user_id: str, max_results: int = 10, since_id: Optional[str] = None):
+    headers = _take("user_tweets")
+    if headers is None:
+        return _rate_limited("user_tweets")
+    requests_seen["user_tweets"] += 1
+    base = int(user_id) * 1000
+    ids = [base + i for i in range(FAKE_TWEETS_PER_USER, 0, -1)]
+    if since_id:
+        ids = [i for i in ids if i > int(since_id)]
+    ids = ids[:max_results]
+    data = [{
+        "id": str(i),
+        "text": f"Fake tweet {i - base} from {user_id}",
+        "created_at": f"2024-01-01T00:{(i - base) // 60 % 60:02d}:{(i - base) % 60:02d}.000Z",
+        "public_metrics": {"retweet_count": 0, "reply_count": 0, "like_count": i % 50, "quote_count": 0},
+    } for i in ids]
+    meta = {"result_count": len(data)}
+    if data:
+        meta.update(newest_id=data[0]["id"], oldest_id=data[-1]["id"])
+    return JSONResponse({"data": data, "meta": meta} if data else {"meta": meta}, headers=headers)
+
+
+@app.get("/_stats")
+async def stats():
+    return requests_seen
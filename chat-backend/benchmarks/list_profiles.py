@@ -0,0 +1,81 @@
+"""
+Throughput of GET /api/profiles with trusted reads off (response_model
+validation + the standard encoder) and on (documents straight to orjson).
+
+The Mongo read is taken out of the loop: ProfileManager.get_all_profiles is
+replaced by one that returns the same pre-built page of PAGE_SIZE projected
+documents, so the numbers isolate what the endpoint itself spends per page.
+Requests go through the ASGI app in-process.
+
+    cd chat-backend && python -m benchmarks.list_profiles
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+os.environ.setdefault("XAI_API_KEY", "bench")
+
+import main  # noqa: E402
+from services.profile_manager import SUMMARY_PROJECTION  # noqa: E402
+
+# One INFO line per request would dominate the measurement
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+PAGE_SIZE = 50
+SECONDS = 3
+
+
+def _page() -> dict:
+    now = datetime.utcnow().replace(microsecond=0)
+    docs = []
+    for i in range(PAGE_SIZE):
+        doc = {
+            "_id": str(1_000_000 + i),
+            "username": f"persona_{i}",
+            "name": f"Persona {i}",
+            "description": "Builds things, posts about them, argues about tabs vs spaces. " * 2,
+            "profile_image_url": f"https://pbs.twimg.com/profile_images/{i}/avatar_normal.jpg",
+            "verified": i % 3 == 0,
+            "voice_id": "Ara",
+            "tags": ["AI", "Startups", "Space"],
+            "public_metrics": {"followers_count": 10_000 * i, "following_count": 420, "tweet_count": 1337, "listed_count": 50},
+            "fetched_at": now - timedelta(minutes=i),
+        }
+        docs.append({k: v for k, v in doc.items() if k in SUMMARY_PROJECTION})
+    return {"items": docs, "next_cursor": "eyJmIjogIjIwMjYtMDEtMDFUMDA6MDA6MDAiLCAiaSI6ICIxIn0="}
+
+
+async def _throughput(client: httpx.AsyncClient) -> float:
+    done = 0
+    deadline = time.perf_counter() + SECONDS
+    while time.perf_counter() < deadline:
+        r = await client.get("/api/profiles", params={"limit": PAGE_SIZE})
+        r.raise_for_status()
+        done += 1
+    return done / SECONDS
+
+
+async def bench():
+    page = _page()
+
+    async def fixed_page(limit, after):
+        return page
+
+    main.profile_mgr.get_all_profiles = fixed_page
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        results = {}
+        for trusted in (False, True):
+            main.TRUSTED_READS = trusted
+            await _throughput(client)  # warm-up
+            results[trusted] = await _throughput(client)
+            print({"trusted_reads": trusted, "page_size": PAGE_SIZE, "req_per_s": round(results[trusted])})
+        print({"speedup": round(results[True] / results[False], 2)})
+
+
+if __name__ == "__main__":
+    asyncio.run(bench())
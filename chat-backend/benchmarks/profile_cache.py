@@ -0,0 +1,106 @@
+"""
+/api/session/init latency with the profile cache on and off.
+
+Seeds PROFILES personas into the configured Mongo (use a scratch database,
+e.g. MONGODB_DB_NAME=x_clones_bench), then replays REQUESTS session inits
+drawn from a skewed popularity distribution (a few personas get most calls)
+through the FastAPI app in-process, CONCURRENCY at a time, once with the
+cache disabled and once enabled. Reports p50/p95/p99 and the cache stats.
+
+    cd chat-backend && MONGODB_DB_NAME=x_clones_bench python -m benchmarks.profile_cache
+"""
+import asyncio
+import os
+import statistics
+import time
+from datetime import datetime
+
+import httpx
+import numpy as np
+
+os.environ.setdefault("XAI_API_KEY", "bench")
+
+import main  # noqa: E402
+from database import db  # noqa: E402
+
+PROFILES = 200
+REQUESTS = 5000
+CONCURRENCY = 32
+ZIPF_A = 1.3
+
+
+async def _seed():
+    await db.profiles.delete_many({"_id": {"$regex": "^bench-"}})
+    now = datetime.utcnow()
+    await db.profiles.insert_many([
+        {
+            "_id": f"bench-{i}",
+            "username": f"bench_{i}",
+            "name": f"Bench {i}",
+            "description": "Benchmark persona",
+            "created_at": now,
+            "fetched_at": now,
+            "voice_id": "Ara",
+            "public_metrics": {"followers_count": i, "following_count": 0, "tweet_count": 0, "listed_count": 0},
+            "entities": {},
+            "tags": ["bench"],
+            "system_prompt": "You are a benchmark persona. " * 40,
+            "typing_style": "Terse.",
+            "speech_style": "Fast.",
+            "behavior_summary": "Predictable.",
+        }
+        for i in range(PROFILES)
+    ])
+
+
+async def _run(client: httpx.AsyncClient, ids) -> list:
+    latencies = []
+    queue = asyncio.Queue()
+    for pid in ids:
+        queue.put_nowait(pid)
+
+    async def worker():
+        while not queue.empty():
+            pid = queue.get_nowait()
+            started = time.perf_counter()
+            r = await client.post("/api/session/init", json={"profile_id": pid, "goals": ["Say hi"]})
+            latencies.append((time.perf_counter() - started) * 1000)
+            r.raise_for_status()
+            # A cache hit never suspends in-process; yield like a socket read would so
+            # one worker cannot starve requests that are waiting on Mongo
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return latencies
+
+
+def _summary(latencies: list) -> dict:
+    q = statistics.quantiles(latencies, n=100)
+    return {"p50_ms": round(q[49], 2), "p95_ms": round(q[94], 2), "p99_ms": round(q[98], 2)}
+
+
+async def bench():
+    await _seed()
+    rng = np.random.default_rng(0)
+    ids = [f"bench-{(r - 1) % PROFILES}" for r in rng.zipf(ZIPF_A, REQUESTS)]
+
+    cache = main.profile_mgr.cache
+    # Uses the change stream when Mongo is a replica set, the fallback TTL otherwise
+    await cache.start()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for enabled in (False, True):
+            cache.enabled = enabled
+            cache.clear()
+            cache.hits = cache.misses = cache.coalesced = 0
+            result = {"cache": "on" if enabled else "off", **_summary(await _run(client, ids))}
+            if enabled:
+                result.update({k: cache.stats()[k] for k in ("hit_rate", "coalesced", "size")})
+            print(result)
+
+    await cache.stop()
+    await db.profiles.delete_many({"_id": {"$regex": "^bench-"}})
+
+
+if __name__ == "__main__":
+    asyncio.run(bench())
@@ -0,0 +1,132 @@
+"""
+Bandwidth and added latency of each browser-leg codec through the /ws relay.
+
+Runs server.py in-process against a local fake xAI upstream that answers every
+response.create with a paced stream of response.audio.delta events, then
+connects once per codec like a browser would.
+
+    cd chat-backend && python -m benchmarks.relay_codecs
+"""
+import asyncio
+import base64
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+import websockets
+
+UPSTREAM_PORT = 8765
+RELAY_PORT = 8766
+SAMPLE_RATE = 24000
+CHUNK_MS = 40
+AUDIO_SECONDS = 5
+
+os.environ.setdefault("XAI_API_KEY", "bench")
+os.environ["XAI_REALTIME_URL"] = f"ws://127.0.0.1:{UPSTREAM_PORT}"
+os.environ["TOKEN_POOL_SIZE"] = "0"
+os.environ["RELAY_LOG_EVENTS"] = "error"
+
+from services.audio_codecs import available_codecs, create_codec  # noqa: E402
+from services.pcm_protocol import HEADER, KIND_AUDIO_IN, SUBPROTOCOLS  # noqa: E402
+
+
+def _speech_like_chunks():
+    t = np.arange(SAMPLE_RATE * AUDIO_SECONDS) / SAMPLE_RATE
+    rng = np.random.default_rng(0)
+    signal = 6000 * np.sin(2 * np.pi * 220 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+    signal += rng.normal(0, 800, t.shape)
+    pcm = signal.astype("<i2").tobytes()
+    step = SAMPLE_RATE * CHUNK_MS // 1000 * 2
+    return [pcm[i:i + step] for i in range(0, len(pcm), step)]
+
+
+CHUNKS = _speech_like_chunks()
+SENT_AT = []
+
+
+async def fake_upstream(ws):
+    async for message in ws:
+        if json.loads(message).get("type") != "response.create":
+            continue
+        SENT_AT.clear()
+        for chunk in CHUNKS:
+            SENT_AT.append(time.perf_counter())
+            await ws.send(json.dumps({
+                "type": "response.audio.delta",
+                "response_id": "resp_1",
+                "item_id": "item_1",
+                "delta": base64.b64encode(chunk).decode(),
+            }))
+            await asyncio.sleep(CHUNK_MS / 1000)
+        await ws.send(json.dumps({"type": "response.done"}))
+
+
+async def run_client(subprotocol):
+    subprotocols = [subprotocol] if subprotocol else None
+    codec = create_codec(SUBPROTOCOLS[subprotocol]) if subprotocol else None
+    up_bytes = down_bytes = 0
+    latencies = []
+
+    async with websockets.connect(f"ws://127.0.0.1:{RELAY_PORT}/ws", subprotocols=subprotocols) as ws:
+        await ws.recv()  # server_log
+
+        # Upstream leg: the "microphone" sends the same audio in
+        for seq, chunk in enumerate(CHUNKS):
+            if codec:
+                for payload in codec.encode_sync(chunk):
+                    frame = HEADER.pack(KIND_AUDIO_IN, 0, seq & 0xFFFF) + payload
+                    up_bytes += len(frame)
+                    await ws.send(frame)
+            else:
+                text = json.dumps({"type": "input_audio_buffer.append", "audio": base64.b64encode(chunk).decode()})
+                up_bytes += len(text)
+                await ws.send(text)
+
+        await ws.send(json.dumps({"type": "response.create"}))
+        received = 0
+        async for message in ws:
+            arrived = time.perf_counter()
+            down_bytes += len(message)
+            if isinstance(message, str):
+                if '"response.done"' in message:
+                    break
+                if '"response.audio.delta"' not in message:
+                    continue
+            # Only codecs that keep one frame per delta can be matched up with SENT_AT
+            if codec is None or codec.name != "opus":
+                latencies.append((arrived - SENT_AT[received]) * 1000)
+            received += 1
+
+    return {
+        "codec": SUBPROTOCOLS[subprotocol] if subprotocol else "json/base64",
+        "down_kbps": round(down_bytes * 8 / AUDIO_SECONDS / 1000, 1),
+        "up_kbps": round(up_bytes * 8 / AUDIO_SECONDS / 1000, 1),
+        "latency_ms_mean": round(statistics.mean(latencies), 2) if latencies else None,
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2) if latencies else None,
+    }
+
+
+async def main():
+    import uvicorn
+    import server
+
+    relay = uvicorn.Server(uvicorn.Config(server.app, port=RELAY_PORT, log_level="warning"))
+    async with websockets.serve(fake_upstream, "127.0.0.1", UPSTREAM_PORT):
+        serving = asyncio.create_task(relay.serve())
+        while not relay.started:
+            await asyncio.sleep(0.05)
+
+        candidates = [None] + [name for name, codec in SUBPROTOCOLS.items() if codec in available_codecs()]
+        for subprotocol in candidates:
+            print(await run_client(subprotocol))
+
+        relay.should_exit = True
+        await serving
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+"""
+CPU cost of the voice client's resampler and the bytes it keeps off the wire.
+
+For each device/wire rate pair, streams 10 s of audio through PolyphaseResampler
+in CHUNK_SIZE blocks (as agent.py does), in both the capture (device -> wire)
+and playback (wire -> device) direction, and reports CPU milliseconds per second
+of audio plus the upstream bytes per second once wrapped into
+input_audio_buffer.append events.
+
+    cd chat-backend && python -m benchmarks.resampler
+"""
+import base64
+import json
+import time
+
+import numpy as np
+
+from resampler import PolyphaseResampler
+
+CHUNK_SIZE = 2048
+SECONDS = 10
+
+
+def _wire_bytes_per_second(pcm_per_second: int) -> int:
+    # Same framing agent.py sends: base64 PCM inside a JSON append event, per chunk
+    chunk = b"\x00" * (CHUNK_SIZE * 2)
+    event = json.dumps({"type": "input_audio_buffer.append", "audio": base64.b64encode(chunk).decode()})
+    return int(pcm_per_second * len(event) / len(chunk))
+
+
+def _cpu_ms_per_audio_second(in_rate: int, out_rate: int) -> float:
+    t = np.arange(in_rate * SECONDS) / in_rate
+    rng = np.random.default_rng(0)
+    pcm = (6000 * np.sin(2 * np.pi * 220 * t) + rng.normal(0, 500, t.shape)).astype("<i2").tobytes()
+    step = CHUNK_SIZE * 2
+
+    resampler = PolyphaseResampler(in_rate, out_rate)
+    started = time.process_time()
+    for i in range(0, len(pcm), step):
+        resampler.process(pcm[i:i + step])
+    return round((time.process_time() - started) * 1000 / SECONDS, 2)
+
+
+def bench(device_rate: int, wire_rate: int) -> dict:
+    return {
+        "device_hz": device_rate,
+        "wire_hz": wire_rate,
+        "capture_cpu_ms_per_audio_s": _cpu_ms_per_audio_second(device_rate, wire_rate),
+        "playback_cpu_ms_per_audio_s": _cpu_ms_per_audio_second(wire_rate, device_rate),
+        "upstream_kB_per_s": round(_wire_bytes_per_second(wire_rate * 2) / 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    # 44100 -> 44100 is the previous behaviour: no resampling, full-rate wire
+    for device_rate, wire_rate in [(44100, 44100), (44100, 24000), (44100, 16000), (48000, 24000), (48000, 16000)]:
+        print(bench(device_rate, wire_rate))
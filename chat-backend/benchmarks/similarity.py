@@ -0,0 +1,84 @@
+"""
+Query latency of the similarity index at 100k profiles, plus the cost of
+vectorizing one profile (what a crawler upsert adds) and of saving/loading
+the matrix.
+
+Builds N_PROFILES synthetic profiles from a small vocabulary, so related
+personas share words the way real ones do, and indexes them without Mongo.
+
+    cd chat-backend && python -m benchmarks.similarity
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from services.similarity_index import SimilarityIndex
+
+N_PROFILES = 100_000
+QUERIES = 500
+K = 10
+
+TOPICS = [
+    "ai machine learning models gpus", "rockets space launch orbit", "crypto bitcoin defi tokens",
+    "startups founders fundraising vc", "politics policy elections senate", "memes shitposting irony",
+    "fitness running marathon protein", "music producer beats studio", "climate energy solar grid",
+    "gaming esports streaming twitch",
+]
+STYLES = ["lowercase no punctuation", "ALL CAPS energy", "long threads with numbered points", "one-liners and emojis"]
+
+
+def _doc(rng: np.random.Generator) -> dict:
+    topics = rng.choice(len(TOPICS), size=2, replace=False)
+    words = " ".join(TOPICS[t] for t in topics).split()
+    return {
+        "tags": [TOPICS[t].split()[0] for t in topics],
+        "description": " ".join(rng.choice(words, size=12)),
+        "system_prompt": "You are a poster who talks about " + " ".join(rng.choice(words, size=40)),
+        "typing_style": STYLES[rng.integers(len(STYLES))],
+    }
+
+
+def bench():
+    rng = np.random.default_rng(0)
+    index = SimilarityIndex(database=None, path=os.path.join(tempfile.mkdtemp(), "bench_index"))
+
+    docs = [_doc(rng) for _ in range(N_PROFILES)]
+    started = time.perf_counter()
+    for i, doc in enumerate(docs):
+        index.upsert(str(i), doc)
+    upsert_ms = (time.perf_counter() - started) * 1000 / N_PROFILES
+
+    latencies = []
+    for pid in rng.integers(N_PROFILES, size=QUERIES):
+        started = time.perf_counter()
+        index.similar(str(pid), K)
+        latencies.append((time.perf_counter() - started) * 1000)
+    q = statistics.quantiles(latencies, n=100)
+
+    started = time.perf_counter()
+    asyncio.run(index.save())
+    save_ms = (time.perf_counter() - started) * 1000
+    reloaded = SimilarityIndex(database=None, path=index.path)
+    started = time.perf_counter()
+    reloaded._load()
+    load_ms = (time.perf_counter() - started) * 1000
+
+    print({
+        "profiles": len(index),
+        "dim": index.vectorizer.dim,
+        "query_p50_ms": round(q[49], 2),
+        "query_p99_ms": round(q[98], 2),
+        "upsert_ms": round(upsert_ms, 3),
+        "save_ms": round(save_ms, 1),
+        "mmap_load_ms": round(load_ms, 1),
+    })
+    pid = "0"
+    print({"query": docs[0]["tags"], "top": [docs[int(i)]["tags"] for i, _ in index.similar(pid, 5)]})
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,114 @@
+"""
+XClient against the local fake X API (benchmarks/fake_x_api.py), served by
+uvicorn in-process on a free port. Checks that:
+
+- concurrent get_user() calls share one GET /2/users/by lookup,
+- a malformed handle fails alone instead of taking its batch down with it,
+- a spent rate-limit window queues requests until the reset rather than
+  failing them, and every request still succeeds,
+- stop() fails lookups still waiting on a batch instead of leaving them hanging.
+
+Exits non-zero if any check fails.
+
+    cd chat-backend && python -m benchmarks.x_fetch
+"""
+import asyncio
+import logging
+import socket
+import sys
+import time
+
+import uvicorn
+
+from benchmarks import fake_x_api
+from services.x_client import XApiError, XClient, XInvalidUsername, XUserNotFound
+
+logging.basicConfig(level=logging.WARNING)
+
+HANDLES = 60
+TWEET_FETCHES = 12
+# Tiny window so the rate-limit check waits seconds, not fifteen minutes
+TWEETS_PER_WINDOW = 5
+WINDOW_SECONDS = 2.0
+
+failures = []
+
+
+def check(ok: bool, what: str):
+    print(f"  {'ok  ' if ok else 'FAIL'} {what}")
+    if not ok:
+        failures.append(what)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run(base_url: str):
+    fake_x_api.configure({"user_tweets": (TWEETS_PER_WINDOW, WINDOW_SECONDS)})
+    x = XClient("fake", base_url=base_url, max_wait_seconds=WINDOW_SECONDS * 2)
+
+    print("Batching")
+    handles = [f"user_{i}" for i in range(HANDLES)]
+    start = time.perf_counter()
+    users = await asyncio.gather(*(x.get_user(h) for h in handles))
+    elapsed = time.perf_counter() - start
+    check([u["username"] for u in users] == handles, f"{HANDLES} concurrent lookups resolved to the right users")
+    check(fake_x_api.requests_seen["users_by"] == 1, f"one /2/users/by call (saw {fake_x_api.requests_seen['users_by']}) in {elapsed * 1000:.0f}ms")
+
+    print("Bad handles")
+    results = await asyncio.gather(
+        x.get_user("@good_one"), x.get_user("bad handle!"), x.get_user("ghost_1"), x.get_user("good_two"),
+        return_exceptions=True
+    )
+    check(isinstance(results[1], XInvalidUsername), "malformed handle rejected before batching")
+    check(isinstance(results[2], XUserNotFound), "missing user reported as not found")
+    check(isinstance(results[0], dict) and isinstance(results[3], dict), "valid handles in the same batch still resolved")
+    check(fake_x_api.requests_seen["rejected"] == 0, "no batch was rejected by the API")
+
+    print("Rate limiting")
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(x.get_users_tweets(users[i]["id"], max_results=10) for i in range(TWEET_FETCHES)),
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+    errors = [r for r in results if isinstance(r, Exception)]
+    check(not errors, f"{TWEET_FETCHES} fetches over a {TWEETS_PER_WINDOW}/{WINDOW_SECONDS:.0f}s window all succeeded ({errors[:1]})")
+    check(elapsed >= WINDOW_SECONDS, f"requests queued for the reset ({elapsed:.1f}s, {x.stats()['windows']['user_tweets']['waits']} waits)")
+    print(f"    429s sent by the fake API: {fake_x_api.requests_seen['rate_limited']}")
+    tweets, meta = await x.get_users_tweets(users[0]["id"], max_results=10, since_id=results[0][0][2]["id"])
+    check(len(tweets) == 2 and meta["newest_id"] == results[0][1]["newest_id"], "since_id returns only newer tweets")
+
+    print("Stop")
+    waiting = asyncio.gather(*(x.get_user(f"late_{i}") for i in range(3)), return_exceptions=True)
+    await asyncio.sleep(0)
+    await x.stop()
+    try:
+        results = await asyncio.wait_for(waiting, 2)
+        check(all(isinstance(r, XApiError) and r.status_code == 503 for r in results), "pending lookups failed with 503")
+    except asyncio.TimeoutError:
+        check(False, "pending lookups failed on stop instead of hanging")
+
+
+async def main():
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(fake_x_api.app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        await run(f"http://127.0.0.1:{port}")
+    finally:
+        server.should_exit = True
+        await serving
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    if failures:
+        print(f"{len(failures)} check(s) failed")
+        sys.exit(1)
+    print("All checks passed")
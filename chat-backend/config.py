@@ -6,4 +6,115 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DB_NAME = os.getenv("MONGODB_DB_NAME", "x_clones_db")
 XAI_API_KEY = os.getenv("XAI_API_KEY")
-TWITTER_BEARER_TOKEN = os.getenv("X_BEARER_TOKEN")
\ No newline at end of file
+TWITTER_BEARER_TOKEN = os.getenv("X_BEARER_TOKEN")
+
+# --- Ephemeral token broker ---
+XAI_SESSION_URL = os.getenv("XAI_SESSION_URL", "https://api.x.ai/v1/realtime/client_secrets")
+TOKEN_POOL_SIZE = int(os.getenv("TOKEN_POOL_SIZE", "4"))
+TOKEN_TTL_SECONDS = int(os.getenv("TOKEN_TTL_SECONDS", "300"))
+# Tokens with less life left than this are dropped instead of handed out
+TOKEN_MIN_REMAINING_SECONDS = int(os.getenv("TOKEN_MIN_REMAINING_SECONDS", "60"))
+
+# --- Realtime relay ---
+# Fast path forwards xAI frames untouched and only decodes the ones we log
+RELAY_FAST_PATH = os.getenv("RELAY_FAST_PATH", "true").lower() == "true"
+RELAY_LOG_EVENTS = {e.strip() for e in os.getenv("RELAY_LOG_EVENTS", "error,session.update,session.updated,response.done").split(",") if e.strip()}
+RELAY_LOG_SAMPLE_RATE = float(os.getenv("RELAY_LOG_SAMPLE_RATE", "0"))
+# Bounded per-direction queues: "drop_audio" evicts old audio when full, "block" always applies backpressure
+RELAY_QUEUE_MAXSIZE = int(os.getenv("RELAY_QUEUE_MAXSIZE", "256"))
+RELAY_QUEUE_POLICY = os.getenv("RELAY_QUEUE_POLICY", "drop_audio")
+RELAY_AUDIO_LATENCY_BUDGET_MS = int(os.getenv("RELAY_AUDIO_LATENCY_BUDGET_MS", "500"))
+RELAY_COALESCE_MAX_BYTES = int(os.getenv("RELAY_COALESCE_MAX_BYTES", "65536"))
+
+# --- Upstream realtime connection pool ---
+XAI_REALTIME_URL = os.getenv("XAI_REALTIME_URL", "wss://api.x.ai/v1/realtime")
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "2"))
+UPSTREAM_MAX_AGE_SECONDS = int(os.getenv("UPSTREAM_MAX_AGE_SECONDS", "240"))
+UPSTREAM_PING_INTERVAL_SECONDS = int(os.getenv("UPSTREAM_PING_INTERVAL_SECONDS", "20"))
+# Browser-leg audio: sample rate we speak to xAI in, and threads for codec work
+RELAY_AUDIO_SAMPLE_RATE = int(os.getenv("RELAY_AUDIO_SAMPLE_RATE", "24000"))
+RELAY_CODEC_WORKERS = int(os.getenv("RELAY_CODEC_WORKERS", "4"))
+
+# --- Relay admission control (per worker) ---
+RELAY_MAX_SESSIONS = int(os.getenv("RELAY_MAX_SESSIONS", "50"))
+RELAY_ADMISSION_QUEUE = int(os.getenv("RELAY_ADMISSION_QUEUE", "10"))
+RELAY_ADMISSION_TIMEOUT_SECONDS = float(os.getenv("RELAY_ADMISSION_TIMEOUT_SECONDS", "2"))
+RELAY_RETRY_AFTER_SECONDS = int(os.getenv("RELAY_RETRY_AFTER_SECONDS", "5"))
+
+# --- Profile cache (per worker) ---
+PROFILE_CACHE_ENABLED = os.getenv("PROFILE_CACHE_ENABLED", "true").lower() == "true"
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "1024"))
+# TTL while a change stream invalidates entries; the fallback applies when change streams are unavailable
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300"))
+PROFILE_CACHE_FALLBACK_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_FALLBACK_TTL_SECONDS", "5"))
+
+# --- Indexes ---
+# Refuse to start when a known query shape would do a collection scan (set in CI and staging)
+INDEX_STRICT = os.getenv("INDEX_STRICT", "false").lower() == "true"
+
+# --- Reads ---
+# Build models from our own documents without revalidating them, and encode list responses with orjson
+TRUSTED_READS = os.getenv("TRUSTED_READS", "true").lower() == "true"
+
+# --- Compiled system prompts (per worker) ---
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "512"))
+
+# --- Clone coordination ---
+# A worker crawling a handle holds its lease this long; others wait for its profile meanwhile
+CLONE_LEASE_SECONDS = float(os.getenv("CLONE_LEASE_SECONDS", "120"))
+CLONE_LEASE_POLL_SECONDS = float(os.getenv("CLONE_LEASE_POLL_SECONDS", "0.5"))
+
+# --- Session records ---
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "86400"))
+# Session writes are batched: flushed every interval or once a batch fills up
+SESSION_WRITE_BATCH = int(os.getenv("SESSION_WRITE_BATCH", "100"))
+SESSION_WRITE_INTERVAL_MS = int(os.getenv("SESSION_WRITE_INTERVAL_MS", "50"))
+# A write that keeps failing is retried (with back-off) this many times, then dropped
+SESSION_WRITE_MAX_ATTEMPTS = int(os.getenv("SESSION_WRITE_MAX_ATTEMPTS", "5"))
+
+# --- Similarity index (per worker, persisted to disk) ---
+SIMILARITY_INDEX_PATH = os.getenv("SIMILARITY_INDEX_PATH", "data/similarity_index")
+# Query cost is one pass over a profiles x dim float32 matrix (51 MB at 100k profiles)
+SIMILARITY_DIM = int(os.getenv("SIMILARITY_DIM", "128"))
+# How often to pick up profiles written by other workers
+SIMILARITY_REFRESH_SECONDS = float(os.getenv("SIMILARITY_REFRESH_SECONDS", "30"))
+# How often to drop deleted profiles (one pass over profile ids)
+SIMILARITY_PRUNE_SECONDS = float(os.getenv("SIMILARITY_PRUNE_SECONDS", "600"))
+
+# --- Profile export/import ---
+# Cursor batch on export, bulk_write batch on import
+PROFILE_IO_BATCH = int(os.getenv("PROFILE_IO_BATCH", "1000"))
+
+# --- X API ---
+# Point at a local fake X API for tests and benchmarks
+X_API_BASE_URL = os.getenv("X_API_BASE_URL", "https://api.twitter.com")
+X_MAX_CONNECTIONS = int(os.getenv("X_MAX_CONNECTIONS", "10"))
+# get_user() calls this close together share one users lookup
+X_LOOKUP_BATCH_WINDOW_MS = int(os.getenv("X_LOOKUP_BATCH_WINDOW_MS", "20"))
+# Queue for a spent rate-limit window up to this long, then fail
+X_MAX_RATE_LIMIT_WAIT_SECONDS = float(os.getenv("X_MAX_RATE_LIMIT_WAIT_SECONDS", "900"))
+
+# --- Bulk clone jobs ---
+# Claiming loops per worker process; X fetches and Grok analyses are capped separately
+CLONE_JOB_WORKERS = int(os.getenv("CLONE_JOB_WORKERS", "16"))
+CLONE_JOB_X_CONCURRENCY = int(os.getenv("CLONE_JOB_X_CONCURRENCY", "4"))
+CLONE_JOB_LLM_CONCURRENCY = int(os.getenv("CLONE_JOB_LLM_CONCURRENCY", "8"))
+CLONE_JOB_MAX_ATTEMPTS = int(os.getenv("CLONE_JOB_MAX_ATTEMPTS", "3"))
+# Back-off before retry n is CLONE_JOB_RETRY_SECONDS * 2^(n-1)
+CLONE_JOB_RETRY_SECONDS = float(os.getenv("CLONE_JOB_RETRY_SECONDS", "30"))
+# An item whose worker stops renewing its lease for this long is picked up again
+CLONE_JOB_LEASE_SECONDS = float(os.getenv("CLONE_JOB_LEASE_SECONDS", "300"))
+CLONE_JOB_POLL_SECONDS = float(os.getenv("CLONE_JOB_POLL_SECONDS", "2"))
+CLONE_BATCH_MAX_HANDLES = int(os.getenv("CLONE_BATCH_MAX_HANDLES", "10000"))
+
+# --- Incremental refresh ---
+# Fewer new tweets than this since the last analysis: update X-side fields only, skip Grok
+REFRESH_MIN_NEW_TWEETS = int(os.getenv("REFRESH_MIN_NEW_TWEETS", "10"))
+
+# --- LLM response cache ---
+# "mongo" (shared by all workers), "disk" (per host) or "off"
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "mongo")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "data/llm_cache")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 86400)))
+# Least recently used entries beyond this are evicted
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
@@ -1,34 +1,70 @@
 import json
+import zlib
 import asyncio
 import os
 import logging
-import httpx
-from fastapi import FastAPI, WebSocket, HTTPException, Body
+from datetime import datetime, timedelta
+from fastapi import FastAPI, WebSocket, HTTPException, Body, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from typing import List, Optional
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("GrokRelay")
 
-from services.crawler import CrawlerService
+from services.crawler import CrawlerService, PersonaAnalysisFailed, ReanalyzeUnavailable
 from services.profile_manager import ProfileManager
 from services.chat_engine import ChatEngine
 from services.llm_service import GrokService
-from models import UserX, ConversationalGoal
+from services.llm_cache import LLMCache
+from services.token_broker import TokenBroker, TokenMintError
+from services.relay import RelaySession, relay_stats
+from services.upstream_pool import UpstreamPool
+from services.pcm_protocol import negotiate_subprotocol
+from services.admission import AdmissionController, AdmissionRejected
+from services.index_manager import IndexManager
+from services.clone_coordinator import CloneCoordinator
+from services.clone_jobs import CloneJobQueue
+from services.x_client import XApiError
+from services.session_store import SessionStore
+from services.similarity_index import SimilarityIndex
+from services.profile_io import ProfileImport, export_ndjson, import_progress
+from services.tag_catalog import TagCatalog
+from services.tweet_store import TweetStore
+from models import UserX, ConversationalGoal, ProfilePage, ChatSession, SimilarProfile
 from database import db
+from config import TRUSTED_READS, SESSION_TTL_SECONDS, CLONE_BATCH_MAX_HANDLES
 
 app = FastAPI()
 XAI_API_KEY = os.getenv("XAI_API_KEY")
+llm_cache = LLMCache()
 if not XAI_API_KEY:
     print("⚠️ WARNING: XAI_API_KEY not found. Crawler will fail.")
     grok_service = None
 else:
-    grok_service = GrokService(api_key=XAI_API_KEY)
+    grok_service = GrokService(api_key=XAI_API_KEY, cache=llm_cache)
+
+similarity_index = SimilarityIndex()
 
 # 2. Pass LLM Service to Crawler
-crawler = CrawlerService(grok_service=grok_service)
+crawler = CrawlerService(grok_service=grok_service, similarity_index=similarity_index)
 profile_mgr = ProfileManager()
+clone_coordinator = CloneCoordinator(crawler, profile_mgr)
+clone_jobs = CloneJobQueue(clone_coordinator, profile_mgr)
+session_store = SessionStore()
+index_mgr = IndexManager()
 chat_engine = ChatEngine()
+token_broker = TokenBroker(api_key=XAI_API_KEY)
+admission = AdmissionController()
+
+# Persona-independent half of the realtime session.update, sent while pre-warming
+SESSION_DEFAULTS = {
+    "modalities": ["text", "audio"],
+    "input_audio_format": "pcm16",
+    "output_audio_format": "pcm16",
+    "turn_detection": {"type": "server_vad"}
+}
+upstream_pool = UpstreamPool(api_key=XAI_API_KEY, session_defaults=SESSION_DEFAULTS)
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,15 +73,73 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    await index_mgr.ensure_indexes()
+    await profile_mgr.tag_catalog.ensure_built()
+    await index_mgr.find_collscans(ProfileManager.query_shapes() + TagCatalog.query_shapes() + TweetStore.query_shapes())
+    await profile_mgr.cache.start()
+    await session_store.start()
+    await similarity_index.start()
+    await token_broker.start()
+    await upstream_pool.start()
+    await clone_jobs.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await clone_jobs.stop()
+    await profile_mgr.cache.stop()
+    await session_store.stop()
+    await similarity_index.stop()
+    if crawler.x:
+        await crawler.x.stop()
+    await token_broker.stop()
+    await upstream_pool.stop()
+
 # --- REST ENDPOINTS ---
 
+def trusted_response(content):
+    """
+    Documents we wrote ourselves skip response_model validation and go straight to
+    orjson. With TRUSTED_READS off, FastAPI validates them against response_model.
+    """
+    return ORJSONResponse(content) if TRUSTED_READS else content
+
+def profile_response(profile: UserX):
+    """A UserX for a response_model=UserX endpoint, serialized once (see trusted_response)."""
+    return trusted_response(profile.model_dump(mode="json", by_alias=True))
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint to verify the server is running."""
+    return {
+        "status": "healthy",
+        "token_pool": token_broker.stats(),
+        "upstream_pool": upstream_pool.stats(),
+        "profile_cache": profile_mgr.cache.stats(),
+        "prompt_cache": chat_engine.stats(),
+        "clones": clone_coordinator.stats(),
+        "clone_jobs": clone_jobs.stats(),
+        "session_writes": session_store.stats(),
+        "similarity_index": similarity_index.stats(),
+        "x_api": crawler.x.stats() if crawler.x else None,
+        "tweets": crawler.tweets.stats(),
+        "llm_cache": llm_cache.stats(),
+        # Cheap enough to poll: the load balancer routes on load.free
+        "load": admission.load(),
+    }
+
 @app.post("/api/clone", response_model=UserX)
 async def clone_user(
     handle: str = Body(..., embed=True),
     voice: str = Body("Ara", embed=True),
-    goals: List[str] = Body(default=[], embed=True)
+    goals: List[str] = Body(default=[], embed=True),
+    refresh: bool = Body(False, embed=True)
 ):
-    """Trigger the crawler to clone a Twitter user."""
+    """
+    Trigger the crawler to clone a Twitter user. With refresh=true, an existing
+    profile is refreshed incrementally from the tweets posted since its last analysis.
+    """
     from models import VALID_VOICE_IDS
     if voice not in VALID_VOICE_IDS:
         raise HTTPException(400, f"Invalid voice ID. Must be one of: {VALID_VOICE_IDS}")
@@ -53,23 +147,125 @@ async def clone_user(
     # Check if profile already exists
     existing_profile = await profile_mgr.get_profile_by_username(handle)
     if existing_profile:
-        return existing_profile
+        if not refresh:
+            return profile_response(existing_profile)
+        try:
+            # Concurrent refreshes (and clones) of one handle share a single crawl
+            return profile_response(await clone_coordinator.refresh(existing_profile))
+        except XApiError as e:
+            raise HTTPException(e.status_code if e.status_code in (404, 429) else 502, e.detail)
+
+    # Clone new profile; concurrent requests for the same handle share one crawl
+    return profile_response(await clone_coordinator.clone(handle, voice, goals))
+
+@app.post("/api/clone/batch", status_code=202)
+async def clone_batch(
+    handles: List[str] = Body(..., embed=True),
+    voice: str = Body("Ara", embed=True),
+    goals: List[str] = Body(default=[], embed=True)
+):
+    """
+    Queue many handles for cloning in the background. Handles that already have a
+    profile are skipped. Poll GET /api/jobs/{job_id} for progress.
+    """
+    from models import VALID_VOICE_IDS
+    if voice not in VALID_VOICE_IDS:
+        raise HTTPException(400, f"Invalid voice ID. Must be one of: {VALID_VOICE_IDS}")
+    if len(handles) > CLONE_BATCH_MAX_HANDLES:
+        raise HTTPException(400, f"At most {CLONE_BATCH_MAX_HANDLES} handles per batch")
+    return await clone_jobs.enqueue(handles, voice, goals)
 
-    # Clone new profile
-    profile = await crawler.clone_profile(handle, voice, goals)
-    return profile
+@app.get("/api/jobs/{job_id}")
+async def get_clone_job(job_id: str):
+    """Status and progress of a batch clone job, with the handles that failed."""
+    job = await clone_jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return job
 
-@app.get("/api/profiles", response_model=List[UserX])
-async def list_profiles(tag: Optional[str] = None):
-    """Get discovery list, optionally filtered by tag."""
-    if tag:
-        return await profile_mgr.search_by_tag(tag)
-    return await profile_mgr.get_all_profiles()
+@app.get("/api/profiles", response_model=ProfilePage)
+async def list_profiles(
+    tag: Optional[str] = None,
+    tag_prefix: bool = False,
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = None
+):
+    """
+    Get a page of the discovery list, optionally filtered by tag (exact, or prefix with
+    tag_prefix=true). Pass `next_cursor` back as `after`.
+    """
+    try:
+        if tag:
+            page = await profile_mgr.search_by_tag(tag, limit, after, prefix=tag_prefix)
+        else:
+            page = await profile_mgr.get_all_profiles(limit, after)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return trusted_response(page)
+
+@app.get("/api/profiles/export")
+async def export_profiles(gzip: bool = False):
+    """Stream every profile as NDJSON (gzip-compressed with gzip=true)."""
+    filename = "profiles.ndjson.gz" if gzip else "profiles.ndjson"
+    return StreamingResponse(
+        export_ndjson(compress=gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.post("/api/profiles/import")
+async def import_profiles(request: Request):
+    """
+    Upsert profiles from an NDJSON body (plain or gzip), as produced by the export.
+    Invalid lines are skipped and reported; progress is at /api/profiles/imports.
+    """
+    job = ProfileImport(tag_catalog=profile_mgr.tag_catalog, on_batch=similarity_index.upsert_profiles)
+    try:
+        report = await job.run(request.stream())
+    except (ValueError, zlib.error) as e:
+        raise HTTPException(400, f"Import aborted after {job.lines} lines: {e}")
+    finally:
+        if job.upserted or job.modified:
+            # Cheaper than invalidating every imported id; the tag catalog was updated per batch
+            profile_mgr.cache.clear()
+    return report
+
+@app.get("/api/profiles/imports")
+async def list_profile_imports():
+    """Progress of imports running on this worker."""
+    return import_progress()
+
+@app.get("/api/profiles/{profile_id}/similar", response_model=List[SimilarProfile])
+async def similar_profiles(profile_id: str, k: int = Query(10, ge=1, le=50)):
+    """Personas most like this one, by description, prompt, style and tags."""
+    if profile_id not in similarity_index and not await profile_mgr.get_profile_by_id(profile_id):
+        raise HTTPException(404, "Profile not found")
+    scores = dict(similarity_index.similar(profile_id, k))
+    items = await profile_mgr.get_summaries(list(scores))
+    return trusted_response([{**item, "score": round(scores[item["_id"]], 4)} for item in items])
+
+@app.post("/api/profiles/{profile_id}/reanalyze", response_model=UserX)
+async def reanalyze_profile(profile_id: str, bypass_cache: bool = False):
+    """
+    Regenerate the persona from stored tweets, without calling the X API.
+    bypass_cache=true asks Grok again even if the same request was answered before.
+    """
+    profile = await profile_mgr.get_profile_by_id(profile_id)
+    if not profile:
+        raise HTTPException(404, "Profile not found")
+    try:
+        profile = await crawler.reanalyze_profile(profile, bypass_cache=bypass_cache)
+    except ReanalyzeUnavailable as e:
+        raise HTTPException(409, str(e))
+    except PersonaAnalysisFailed as e:
+        raise HTTPException(502, str(e))
+    profile_mgr.cache.invalidate(profile.id)
+    return profile_response(profile)
 
 @app.get("/api/tags", response_model=List[str])
-async def list_tags():
-    """Get all unique tags from the database."""
-    return await profile_mgr.get_all_tags()
+async def list_tags(prefix: str = "", limit: int = Query(1000, ge=1, le=1000)):
+    """Get tags, most used first. With `prefix`, autocomplete suggestions for it."""
+    return trusted_response(await profile_mgr.get_all_tags(prefix, limit))
 
 @app.get("/api/profile/exists")
 async def profile_exists(handle: str):
@@ -95,103 +291,92 @@ async def init_session(profile_id: str = Body(...), goals: List[str] = Body(defa
     conv_goals = [ConversationalGoal(description=g) for g in goals]
 
     # Generate the Master Prompt
-    system_instructions = chat_engine.construct_system_instruction(user_x, conv_goals)
+    system_instructions, prompt_hash = chat_engine.compile_system_instruction(user_x, conv_goals)
+
+    session = ChatSession(
+        user_id=user_x.id,
+        goals=conv_goals,
+        instructions=system_instructions,
+        voice_id=user_x.voice_id,
+        prompt_hash=prompt_hash,
+        expires_at=datetime.utcnow() + timedelta(seconds=SESSION_TTL_SECONDS)
+    )
+    # Queued for the batched writer; /ws on this worker can read it immediately
+    session_store.create(session)
 
     return {
-        "session_id": "new_sess_123",
+        "session_id": session.id,
         "system_instructions": system_instructions,
+        # Same prompt, same hash: clients can skip a session.update they already sent
+        "prompt_hash": prompt_hash,
         "voice_preset": user_x.voice_id  # Uses the Voice ID from the schema
     }
 
+@app.get("/relay/sessions")
+async def list_relay_sessions():
+    """Queue depth and drop counters for every live relay session on this worker."""
+    return relay_stats()
+
 @app.post("/session")
 async def get_ephemeral_token():
     if not XAI_API_KEY:
         logging.error("❌ XAI_API_KEY is missing in environment variables!")
         raise HTTPException(status_code=500, detail="Server misconfigured: API Key missing")
 
-    logging.info("Requesting ephemeral token from xAI...")
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                url=SESSION_REQUEST_URL,
-                headers={
-                    "Authorization": f"Bearer {XAI_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={"expires_after": {"seconds": 300}},
-            )
-
-            # 2. LOG THE RESPONSE if it fails
-            if response.status_code != 200:
-                logging.error(f"❌ xAI API Error: {response.status_code} - {response.text}")
-                raise HTTPException(status_code=response.status_code, detail=f"xAI Error: {response.text}")
-
-            data = response.json()
-            logging.info("✅ Token received successfully")
-            return data
-
-        except httpx.RequestError as e:
-            logging.error(f"❌ Network Error: {e}")
-            raise HTTPException(status_code=500, detail="Failed to connect to xAI")
+    try:
+        return await token_broker.get_token()
+    except TokenMintError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 # --- WEBSOCKET RELAY ---
 # (Stays mostly the same, just imports UserX context indirectly via session/init)
-import websockets
-import os
 
-XAI_URL = "wss://api.x.ai/v1/realtime"
-XAI_API_KEY = os.getenv("XAI_API_KEY")
-SESSION_REQUEST_URL = "https://api.x.ai/v1/realtime/client_secrets"
+# Sent when /ws is opened without a valid session_id
+WS_CLOSE_POLICY_VIOLATION = 1008
 
 @app.websocket("/ws")
 async def websocket_endpoint(client_ws: WebSocket):
-    await client_ws.accept()
+    # Only open an upstream socket once this worker has room for another call
+    try:
+        async with admission.admit():
+            await relay_browser(client_ws)
+    except AdmissionRejected:
+        await admission.reject(client_ws)
+
+async def relay_browser(client_ws: WebSocket):
+    subprotocol = negotiate_subprotocol(client_ws.scope.get("subprotocols", []))
+    await client_ws.accept(subprotocol=subprotocol)
     
+    # The browser only names its session; the persona comes from what /api/session/init stored
     init_data = await client_ws.receive_json()
-    system_instructions = init_data.get("instructions", "You are a helpful AI.")
-    voice = init_data.get("voice", "Ara")
-    
-    async with websockets.connect(
-        uri=XAI_URL,
-        ssl=True,
-        additional_headers={"Authorization": f"Bearer {XAI_API_KEY}"}
-    ) as xai_ws:
-        
+    session = await session_store.get(str(init_data.get("session_id", "")))
+    if not session:
+        await client_ws.close(code=WS_CLOSE_POLICY_VIOLATION, reason="Unknown or expired session_id")
+        return
+
+    # Pooled sockets already carry SESSION_DEFAULTS, only the persona is left to send
+    persona = {
+        "instructions": session.instructions,
+        "voice": session.voice_id or "Ara",
+    }
+    xai_ws = await upstream_pool.acquire()
+    relay = None
+    session_store.update(session.id, {"relay_started_at": datetime.utcnow()})
+    try:
         await xai_ws.send(json.dumps({
             "type": "session.update",
-            "session": {
-                "modalities": ["text", "audio"],
-                "instructions": system_instructions,
-                "voice": voice,
-                "input_audio_format": "pcm16",
-                "output_audio_format": "pcm16",
-                "turn_detection": {"type": "server_vad"}
-            }
+            "session": persona
         }))
         
-        async def browser_to_xai():
-            try:
-                while True:
-                    data = await client_ws.receive_text()
-                    logger.info(f"⬆️ Sending to xAI: {data[:100]}...")
-                    await xai_ws.send(data)
-            except Exception:
-                pass
-
-        async def xai_to_browser():
-            try:
-                async for message in xai_ws:
-                    if isinstance(message, str):
-                        msg_data = json.loads(message)
-                        if msg_data.get('type') != 'response.audio.delta':
-                            logger.info(f"⬇️ Received from xAI: {json.dumps(msg_data, indent=2)}")
-
-                        await client_ws.send_text(message)
-                    else:
-                        # Binary data, e.g., audio
-                        await client_ws.send_bytes(message)
-            except Exception as e:
-                logger.error(f"Error xAI->Browser: {e}")
-
-        await asyncio.gather(browser_to_xai(), xai_to_browser())
\ No newline at end of file
+        # Browser session.update events cannot change this persona: their instructions and voice are stripped
+        relay = RelaySession(
+            client_ws, xai_ws, subprotocol=subprotocol,
+            prompt_hash=session.prompt_hash, voice=persona["voice"]
+        )
+        await relay.run()
+    finally:
+        await xai_ws.close()
+        session_store.update(session.id, {
+            "relay_ended_at": datetime.utcnow(),
+            "relay_stats": relay.stats() if relay else None,
+        })
@@ -1,9 +1,12 @@
 from datetime import datetime
-from typing import List, Dict, Optional, Any
-from pydantic import BaseModel, Field, HttpUrl, field_validator
+from functools import lru_cache
+from typing import List, Dict, Optional, Any, Tuple, Type, TypeVar, get_args, get_origin
+from pydantic import AnyUrl, BaseModel, Field, HttpUrl, field_validator
 from enum import Enum
 import uuid
 
+M = TypeVar("M", bound=BaseModel)
+
 # --- 1. CORE X SCHEMA (Provided by you) ---
 
 class UrlEntity(BaseModel):
@@ -76,6 +79,13 @@ class UserX(BaseModel):
     speech_style: Optional[str] = Field(default=None, description="Analysis of user's speech style (tone, vocabulary, pacing)")
     behavior_summary: Optional[str] = Field(default=None, description="Summary of user's behavioral patterns and interaction style")
 
+    # Compiled persona half of the system prompt, precomputed by the crawler
+    persona_prompt: Optional[str] = Field(default=None, description="Goal-independent system prompt compiled from the fields above")
+    persona_version: Optional[str] = Field(default=None, description="Hash of persona_prompt; keys the compiled prompt cache")
+
+    # Newest tweet the persona has been analyzed against; refreshes fetch only tweets after it
+    newest_tweet_id: Optional[str] = None
+
     # Metadata
     fetched_at: datetime = Field(default_factory=datetime.utcnow)
     last_updated: Optional[datetime] = None
@@ -92,6 +102,31 @@ class UserX(BaseModel):
         populate_by_name = True
         json_encoders = { datetime: lambda v: v.isoformat() }
 
+class ProfileSummary(BaseModel):
+    """Card-sized view of a UserX for the discovery list."""
+    id: str = Field(..., alias="_id")
+    username: str
+    name: str
+    description: Optional[str] = None
+    profile_image_url: Optional[HttpUrl] = None
+    verified: bool = False
+    voice_id: Optional[str] = None
+    tags: List[str] = Field(default_factory=list)
+    public_metrics: PublicMetrics
+    fetched_at: datetime
+
+    class Config:
+        populate_by_name = True
+
+class SimilarProfile(ProfileSummary):
+    # Cosine similarity to the query persona, 1.0 is identical
+    score: float
+
+class ProfilePage(BaseModel):
+    items: List[ProfileSummary]
+    # Opaque keyset cursor; pass as `after` to get the next page. None on the last page.
+    next_cursor: Optional[str] = None
+
 # --- 2. VOICE ENUMS & MODELS (Provided by you) ---
 
 class VoiceGender(str, Enum):
@@ -114,8 +149,75 @@ class ConversationalGoal(BaseModel):
     description: str
     status: str = "pending"
 
+# Resolve the "ConversationalGoal" forward reference in UserX
+UserX.model_rebuild()
+
 class ChatSession(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()), alias="_id")
     user_id: str  # The X user ID we are talking to
     goals: List[ConversationalGoal] = []
-    created_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    # What /ws sends upstream for this session; never taken from the browser
+    instructions: str
+    voice_id: Optional[str] = "Ara"
+    prompt_hash: Optional[str] = None
+
+    # Relay usage, filled in when the call connects and ends
+    relay_started_at: Optional[datetime] = None
+    relay_ended_at: Optional[datetime] = None
+    relay_stats: Optional[Dict[str, Any]] = None
+
+    # Removed by the sessions TTL index
+    expires_at: datetime
+
+    class Config:
+        populate_by_name = True
+
+# --- 4. TRUSTED READS ---
+
+@lru_cache(maxsize=None)
+def _nested_models(cls: Type[BaseModel]) -> Tuple[Tuple[str, Type[BaseModel], bool], ...]:
+    """(key, model, is_list) for every field of `cls` holding a model or a list of them."""
+    nested = []
+    for name, field in cls.model_fields.items():
+        annotation = field.annotation
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        # Unwrap Optional[X]
+        if get_origin(annotation) is not list and len(args) == 1:
+            annotation = args[0]
+        is_list = get_origin(annotation) is list
+        inner = get_args(annotation)[0] if is_list else annotation
+        if isinstance(inner, type) and issubclass(inner, BaseModel):
+            nested.append((field.alias or name, inner, is_list))
+    return tuple(nested)
+
+@lru_cache(maxsize=None)
+def _url_fields(cls: Type[BaseModel]) -> Tuple[Tuple[str, Type[AnyUrl]], ...]:
+    """(key, url type) for every field of `cls` holding a URL; they are stored as strings."""
+    urls = []
+    for name, field in cls.model_fields.items():
+        args = [a for a in get_args(field.annotation) if a is not type(None)]
+        inner = args[0] if len(args) == 1 else field.annotation
+        if isinstance(inner, type) and issubclass(inner, AnyUrl):
+            urls.append((field.alias or name, inner))
+    return tuple(urls)
+
+def construct_trusted(cls: Type[M], doc: Dict[str, Any]) -> M:
+    """
+    Build `cls` from a document this service validated when it wrote it, without
+    validating again. Nested models are constructed too. URL strings are turned
+    back into URL objects (the only parsing done), so the model serializes
+    without warnings. Never use this on client input.
+    """
+    values = dict(doc)
+    for key, url_type in _url_fields(cls):
+        if isinstance(values.get(key), str):
+            values[key] = url_type(values[key])
+    for key, model, is_list in _nested_models(cls):
+        value = values.get(key)
+        if isinstance(value, dict):
+            values[key] = construct_trusted(model, value)
+        elif is_list and value:
+            values[key] = [construct_trusted(model, v) if isinstance(v, dict) else v for v in value]
+    return cls.model_construct(**values)
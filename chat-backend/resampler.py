@@ -0,0 +1,57 @@
+from math import gcd
+
+import numpy as np
+
+
+class PolyphaseResampler:
+    """
+    Streaming rational resampler (in_rate -> out_rate) using a Kaiser-windowed
+    sinc low-pass split into `up` polyphase branches. Each call processes a whole
+    chunk with one gather + one multiply-accumulate in NumPy, and carries the
+    filter history over so chunk boundaries are seamless.
+    """
+
+    def __init__(self, in_rate: int, out_rate: int, taps_per_phase: int = 32, beta: float = 8.0):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        g = gcd(in_rate, out_rate)
+        self.up = out_rate // g
+        self.down = in_rate // g
+        self.passthrough = self.up == self.down
+
+        n_taps = taps_per_phase * self.up
+        # Cut off just below the lower of the two Nyquist rates (relative to the
+        # upsampled rate) so the transition band does not alias back in
+        cutoff = 0.92 / max(self.up, self.down)
+        t = np.arange(n_taps) - (n_taps - 1) / 2
+        h = cutoff * np.sinc(cutoff * t) * np.kaiser(n_taps, beta) * self.up
+        # _phases[p, k] == h[p + k * up]
+        self._phases = h.reshape(taps_per_phase, self.up).T.astype(np.float32)
+        self._taps = np.arange(taps_per_phase)
+
+        self._history = np.zeros(taps_per_phase - 1, dtype=np.float32)
+        # Position of the next output sample in the upsampled domain, relative to
+        # the first sample of history
+        self._t = (taps_per_phase - 1) * self.up
+
+    def process(self, pcm: bytes) -> bytes:
+        if self.passthrough:
+            return pcm
+
+        buf = np.concatenate((self._history, np.frombuffer(pcm, dtype=np.int16).astype(np.float32)))
+        last = len(buf) - 1
+        n_out = max((last * self.up - self._t) // self.down + 1, 0)
+
+        positions = self._t + np.arange(n_out) * self.down
+        base = positions // self.up
+        phase = positions % self.up
+        windows = buf[base[:, None] - self._taps[None, :]]
+        out = np.einsum("ij,ij->i", windows, self._phases[phase])
+
+        self._t += n_out * self.down
+        keep = len(self._history)
+        shift = len(buf) - keep
+        self._t -= shift * self.up
+        self._history = buf[shift:]
+
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16).tobytes()
@@ -1,15 +1,18 @@
 import os
-import asyncio
 import logging
 import json
-import httpx
-import websockets
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from services.token_broker import TokenBroker, TokenMintError
+from services.relay import RelaySession, relay_stats
+from services.upstream_pool import UpstreamPool
+from services.pcm_protocol import negotiate_subprotocol
+from services.admission import AdmissionController, AdmissionRejected
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("GrokRelay")
 
@@ -23,14 +26,37 @@ app.add_middleware(
 )
 
 XAI_API_KEY = os.getenv("XAI_API_KEY")
-SESSION_REQUEST_URL = "https://api.x.ai/v1/realtime/client_secrets"
-# Ensure this matches the docs exactly
-XAI_URL = "wss://api.x.ai/v1/realtime"
+token_broker = TokenBroker(api_key=XAI_API_KEY)
+admission = AdmissionController()
+# The browser sends its own session.update, so pooled sockets are only connected
+upstream_pool = UpstreamPool(api_key=XAI_API_KEY)
+
+@app.on_event("startup")
+async def startup():
+    await token_broker.start()
+    await upstream_pool.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await token_broker.stop()
+    await upstream_pool.stop()
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint to verify the server is running."""
-    return {"status": "healthy", "service": "grok-auth-server"}
+    return {
+        "status": "healthy",
+        "service": "grok-auth-server",
+        "token_pool": token_broker.stats(),
+        "upstream_pool": upstream_pool.stats(),
+        # Cheap enough to poll: the load balancer routes on load.free
+        "load": admission.load(),
+    }
+
+@app.get("/relay/sessions")
+async def list_relay_sessions():
+    """Queue depth and drop counters for every live relay session on this worker."""
+    return relay_stats()
 
 @app.post("/session")
 async def get_ephemeral_token():
@@ -38,35 +64,23 @@ async def get_ephemeral_token():
         logger.error("❌ XAI_API_KEY is missing in environment variables!")
         raise HTTPException(status_code=500, detail="Server misconfigured: API Key missing")
 
-    logger.info("Requesting ephemeral token from xAI...")
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                url=SESSION_REQUEST_URL,
-                headers={
-                    "Authorization": f"Bearer {XAI_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={"expires_after": {"seconds": 300}},
-            )
-            
-            # 2. LOG THE RESPONSE if it fails
-            if response.status_code != 200:
-                logger.error(f"❌ xAI API Error: {response.status_code} - {response.text}")
-                raise HTTPException(status_code=response.status_code, detail=f"xAI Error: {response.text}")
-
-            data = response.json()
-            logger.info("✅ Token received successfully")
-            return data
-
-        except httpx.RequestError as e:
-            logger.error(f"❌ Network Error: {e}")
-            raise HTTPException(status_code=500, detail="Failed to connect to xAI")
+    try:
+        return await token_broker.get_token()
+    except TokenMintError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 @app.websocket("/ws")
 async def websocket_endpoint(client_ws: WebSocket):
-    await client_ws.accept()
+    # Only open an upstream socket once this worker has room for another call
+    try:
+        async with admission.admit():
+            await relay_browser(client_ws)
+    except AdmissionRejected:
+        await admission.reject(client_ws)
+
+async def relay_browser(client_ws: WebSocket):
+    subprotocol = negotiate_subprotocol(client_ws.scope.get("subprotocols", []))
+    await client_ws.accept(subprotocol=subprotocol)
     logger.info("🟢 Browser connected")
 
     if not XAI_API_KEY:
@@ -74,40 +88,14 @@ async def websocket_endpoint(client_ws: WebSocket):
         return
 
     try:
-        async with websockets.connect(
-            uri=XAI_URL,
-            ssl=True,
-            additional_headers={"Authorization": f"Bearer {XAI_API_KEY}"}
-        ) as xai_ws:
-            
+        xai_ws = await upstream_pool.acquire()
+        try:
             logger.info("✅ Connected to xAI")
             await client_ws.send_text(json.dumps({"type": "server_log", "message": "Connected to xAI"}))
 
-            async def browser_to_xai():
-                try:
-                    while True:
-                        data = await client_ws.receive_text()
-                        logger.info(f"⬆️ Sending to xAI: {data[:100]}...") # Log what we send
-                        await xai_ws.send(data)
-                except Exception:
-                    pass
-
-            async def xai_to_browser():
-                try:
-                    async for message in xai_ws:
-                        if isinstance(message, str):
-                            msg_data = json.loads(message)
-                            if msg_data.get('type') != 'response.audio.delta':
-                                logger.info(f"⬇️ Received from xAI: {json.dumps(msg_data, indent=2)}")
-
-                            await client_ws.send_text(message)
-                        else:
-                            # Binary data, e.g., audio
-                            await client_ws.send_bytes(message)
-                except Exception as e:
-                    logger.error(f"Error xAI->Browser: {e}")
-
-            await asyncio.gather(browser_to_xai(), xai_to_browser())
+            await RelaySession(client_ws, xai_ws, subprotocol=subprotocol).run()
+        finally:
+            await xai_ws.close()
 
     except Exception as e:
         logger.error(f"❌ Connection Error: {e}")
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+from fastapi import WebSocket
+from fastapi.responses import JSONResponse
+
+from config import (
+    RELAY_MAX_SESSIONS,
+    RELAY_ADMISSION_QUEUE,
+    RELAY_ADMISSION_TIMEOUT_SECONDS,
+    RELAY_RETRY_AFTER_SECONDS,
+)
+
+logger = logging.getLogger("Admission")
+
+# "Try Again Later"
+WS_CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+class AdmissionController:
+    """
+    Caps concurrent relay sessions on this worker. Callers over the cap wait in a
+    short queue; once the queue is full or the wait times out they are rejected
+    instead of being allowed to degrade every call already running.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = RELAY_MAX_SESSIONS,
+        max_waiting: int = RELAY_ADMISSION_QUEUE,
+        wait_timeout: float = RELAY_ADMISSION_TIMEOUT_SECONDS,
+        retry_after: int = RELAY_RETRY_AFTER_SECONDS,
+    ):
+        self.max_sessions = max_sessions
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+
+        self._slots = asyncio.Semaphore(max_sessions)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def admit(self):
+        if self._slots.locked():
+            if self.waiting >= self.max_waiting:
+                self.rejected += 1
+                raise AdmissionRejected("Admission queue full")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.wait_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise AdmissionRejected("Timed out waiting for a relay slot")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+
+        self.active += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    def load(self) -> Dict[str, Any]:
+        return {
+            "active_sessions": self.active,
+            "waiting": self.waiting,
+            "capacity": self.max_sessions,
+            "free": max(self.max_sessions - self.active, 0),
+            "utilization": round(self.active / self.max_sessions, 3) if self.max_sessions else 1.0,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+    async def reject(self, client_ws: WebSocket):
+        """Turn the browser away: HTTP 503 + Retry-After if the server supports it, else a 1013 close."""
+        retry_after = str(self.retry_after)
+        try:
+            await client_ws.send_denial_response(JSONResponse(
+                {"detail": "Relay at capacity, retry later"},
+                status_code=503,
+                headers={"Retry-After": retry_after},
+            ))
+        except RuntimeError:
+            await client_ws.accept()
+            await client_ws.close(code=WS_CLOSE_TRY_AGAIN_LATER, reason=f"Relay at capacity, retry after {retry_after}s")
+        logger.warning(f"⛔ Relay session rejected: {self.load()}")
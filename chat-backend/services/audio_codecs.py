@@ -0,0 +1,143 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+from config import RELAY_AUDIO_SAMPLE_RATE, RELAY_CODEC_WORKERS
+
+try:
+    import opuslib  # Optional: needs the native libopus
+except ImportError:
+    opuslib = None
+
+# Encoding/decoding never runs on the event loop
+codec_executor = ThreadPoolExecutor(max_workers=RELAY_CODEC_WORKERS, thread_name_prefix="codec")
+
+
+class AudioCodec:
+    """
+    Browser-leg codec. xAI always gets PCM16; only the browser sees encoded audio.
+    decode() raises ValueError for a payload that is not valid audio, whatever
+    the codec, so the relay can drop the frame and carry on.
+    """
+
+    name = "pcm16"
+    # Cheap enough that an executor hop would cost more than the work itself
+    inline = True
+
+    def __init__(self):
+        self.codec_seconds = 0.0
+
+    def encode_sync(self, pcm: bytes) -> List[bytes]:
+        return [pcm]
+
+    def decode_sync(self, payload) -> bytes:
+        if len(payload) % 2:
+            raise ValueError(f"PCM16 payload of odd length {len(payload)}")
+        # Raw PCM: hand the view straight to the base64 encoder
+        return payload
+
+    async def encode(self, pcm: bytes) -> List[bytes]:
+        return await self._run(self.encode_sync, pcm)
+
+    async def decode(self, payload) -> bytes:
+        return await self._run(self.decode_sync, payload)
+
+    async def _run(self, fn, data):
+        started = time.perf_counter()
+        if self.inline:
+            result = fn(data)
+        else:
+            result = await asyncio.get_running_loop().run_in_executor(codec_executor, fn, data)
+        self.codec_seconds += time.perf_counter() - started
+        return result
+
+
+def _build_mulaw_tables():
+    # G.711 mu-law (same rounding as the classic Sun reference / audioop),
+    # computed once for every possible input so that encode and decode are each
+    # a single vectorised table lookup.
+    samples = np.arange(-32768, 32768, dtype=np.int32)
+    value = samples >> 2
+    mask = np.where(value < 0, 0x7F, 0xFF)
+    value = np.minimum(np.abs(value), 8159) + 0x21
+    seg_ends = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+    seg = np.searchsorted(seg_ends, value)
+    encoded = np.where(seg > 7, 0x7F, (seg << 4) | ((value >> (seg + 1)) & 0x0F)) ^ mask
+    # Index by the raw uint16 bit pattern of each int16 sample
+    encode_table = np.empty(65536, dtype=np.uint8)
+    encode_table[samples.astype(np.int16).view(np.uint16)] = encoded
+
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    magnitude = ((((codes & 0x0F) << 3) + 0x84) << ((codes >> 4) & 0x07)) - 0x84
+    decode_table = np.where(codes & 0x80, -magnitude, magnitude).astype("<i2")
+    return encode_table, decode_table
+
+
+_MULAW_ENCODE, _MULAW_DECODE = _build_mulaw_tables()
+
+
+class MuLawCodec(AudioCodec):
+    """G.711 mu-law: half the bytes of PCM16 and no native library needed."""
+
+    name = "mulaw"
+    inline = False
+
+    def encode_sync(self, pcm: bytes) -> List[bytes]:
+        samples = np.frombuffer(pcm, dtype="<i2").view(np.uint16)
+        return [_MULAW_ENCODE[samples].tobytes()]
+
+    def decode_sync(self, payload) -> bytes:
+        return _MULAW_DECODE[np.frombuffer(payload, dtype=np.uint8)].tobytes()
+
+
+class OpusCodec(AudioCodec):
+    """Opus in 20 ms packets, one packet per binary frame. Stateful, so one per session."""
+
+    name = "opus"
+    inline = False
+
+    def __init__(self, sample_rate: int = RELAY_AUDIO_SAMPLE_RATE):
+        super().__init__()
+        self.frame_samples = sample_rate // 50
+        self.max_frame_samples = sample_rate * 120 // 1000
+        self._encoder = opuslib.Encoder(sample_rate, 1, opuslib.APPLICATION_VOIP)
+        self._decoder = opuslib.Decoder(sample_rate, 1)
+        self._pending = b""
+
+    def encode_sync(self, pcm: bytes) -> List[bytes]:
+        # Opus only takes whole frames; carry the remainder over to the next delta
+        data = self._pending + pcm
+        frame_bytes = self.frame_samples * 2
+        whole = len(data) - len(data) % frame_bytes
+        self._pending = data[whole:]
+        view = memoryview(data)
+        return [
+            self._encoder.encode(bytes(view[i:i + frame_bytes]), self.frame_samples)
+            for i in range(0, whole, frame_bytes)
+        ]
+
+    def decode_sync(self, payload) -> bytes:
+        try:
+            return self._decoder.decode(bytes(payload), self.max_frame_samples)
+        except opuslib.OpusError as e:
+            raise ValueError(f"Bad Opus packet: {e}") from e
+
+
+def create_codec(name: str) -> Optional[AudioCodec]:
+    if name == "pcm16":
+        return AudioCodec()
+    if name == "mulaw":
+        return MuLawCodec()
+    if name == "opus" and opuslib is not None:
+        return OpusCodec()
+    return None
+
+
+def available_codecs() -> List[str]:
+    names = ["pcm16", "mulaw"]
+    if opuslib is not None:
+        names.insert(0, "opus")
+    return names
@@ -1,39 +1,104 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from config import PROMPT_CACHE_SIZE
 from models import UserX, ConversationalGoal
 
+
+def prompt_hash(text: str) -> str:
+    """Stable across workers and restarts, unlike hash()."""
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def compile_persona(user: UserX) -> str:
+    """
+    The goal-independent part of the system prompt. The crawler stores it on the
+    profile (persona_prompt / persona_version) when it writes it.
+    """
+    # 1. Base Persona (The "Soul")
+    parts = [
+        "### YOUR PERSONA ###\n",
+        f"Name: {user.name} (@{user.username})\n",
+        f"Bio: {user.description}\n",
+    ]
+
+    # Use the generated prompt if available, otherwise fallback
+    if user.system_prompt:
+        parts.append(f"Instructions: {user.system_prompt}\n\n")
+    else:
+        parts.append("Instructions: You are this person. Speak in their likely tone based on their bio.\n\n")
+
+    # 1.5. Style Analysis
+    if user.typing_style:
+        parts.append(f"### TYPING STYLE ###\n{user.typing_style}\n\n")
+    if user.speech_style:
+        parts.append(f"### SPEECH STYLE ###\n{user.speech_style}\n\n")
+    if user.behavior_summary:
+        parts.append(f"### BEHAVIOR PATTERNS ###\n{user.behavior_summary}\n\n")
+
+    # 2. Contextual Tags
+    if user.tags:
+        parts.append(f"### KNOWN TOPICS ###\nYou differ to these topics: {', '.join(user.tags)}\n\n")
+
+    return "".join(parts)
+
+
+def compile_goals(goals: list[ConversationalGoal]) -> str:
+    # 3. Conversational Goals
+    if not goals:
+        return ""
+    parts = [
+        "### HIDDEN OBJECTIVES ###\n",
+        "Subtly steer the conversation towards these outcomes:\n",
+    ]
+    for idx, goal in enumerate(goals):
+        parts.append(f"{idx+1}. {goal.description} (Status: {goal.status})\n")
+    return "".join(parts)
+
+
 class ChatEngine:
+    def __init__(self, cache_size: int = PROMPT_CACHE_SIZE):
+        self.cache_size = cache_size
+        # (persona version, goals hash) -> (instructions, prompt hash)
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[str, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
     def construct_system_instruction(self, user: UserX, goals: list[ConversationalGoal]) -> str:
         """
         Compiles the UserX data + Goals into the Realtime API System Prompt.
         """
-        
-        # 1. Base Persona (The "Soul")
-        instruction = f"### YOUR PERSONA ###\n"
-        instruction += f"Name: {user.name} (@{user.username})\n"
-        instruction += f"Bio: {user.description}\n"
-        
-        # Use the generated prompt if available, otherwise fallback
-        if user.system_prompt:
-            instruction += f"Instructions: {user.system_prompt}\n\n"
-        else:
-            instruction += "Instructions: You are this person. Speak in their likely tone based on their bio.\n\n"
-
-        # 1.5. Style Analysis
-        if user.typing_style:
-            instruction += f"### TYPING STYLE ###\n{user.typing_style}\n\n"
-        if user.speech_style:
-            instruction += f"### SPEECH STYLE ###\n{user.speech_style}\n\n"
-        if user.behavior_summary:
-            instruction += f"### BEHAVIOR PATTERNS ###\n{user.behavior_summary}\n\n"
-        
-        # 2. Contextual Tags
-        if user.tags:
-            instruction += f"### KNOWN TOPICS ###\nYou differ to these topics: {', '.join(user.tags)}\n\n"
-        
-        # 3. Conversational Goals
-        if goals:
-            instruction += "### HIDDEN OBJECTIVES ###\n"
-            instruction += "Subtly steer the conversation towards these outcomes:\n"
-            for idx, goal in enumerate(goals):
-                instruction += f"{idx+1}. {goal.description} (Status: {goal.status})\n"
-        
-        return instruction
\ No newline at end of file
+        return self.compile_system_instruction(user, goals)[0]
+
+    def compile_system_instruction(self, user: UserX, goals: list[ConversationalGoal]) -> Tuple[str, str]:
+        """Same as construct_system_instruction, plus its prompt_hash. Cached per profile version and goals."""
+        # Profiles written before persona_version existed are keyed by their fetch time instead
+        version = user.persona_version or f"{user.id}@{user.fetched_at.isoformat()}"
+        goals_key = prompt_hash("\n".join(f"{g.description}\x00{g.status}" for g in goals))
+        key = (version, goals_key)
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return cached
+        self.misses += 1
+
+        persona = user.persona_prompt or compile_persona(user)
+        instructions = persona + compile_goals(goals)
+        compiled = (instructions, prompt_hash(instructions))
+        self._cache[key] = compiled
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return compiled
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "capacity": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from config import CLONE_LEASE_SECONDS, CLONE_LEASE_POLL_SECONDS
+from database import db
+from models import UserX
+
+logger = logging.getLogger("CloneCoordinator")
+
+
+def normalize_handle(handle: str) -> str:
+    return handle.strip().lstrip("@").casefold()
+
+
+class CloneCoordinator:
+    """
+    Makes sure a handle is crawled and analyzed once, however many requests ask
+    for it at the same time. Incremental refreshes go through the same path, so
+    a handle is never cloned and refreshed, or refreshed twice, concurrently.
+
+    Within a worker, concurrent callers for the same normalized handle await one
+    shared task. Across workers, that task first takes a lease document in
+    `clone_leases` ({_id: handle, owner, expires_at}); workers that find the
+    lease taken poll for the profile the owner is writing instead of crawling
+    themselves. A TTL index reaps leases left behind by a crashed worker, and an
+    expired lease can be taken over before the TTL monitor gets to it.
+    """
+
+    def __init__(
+        self,
+        crawler,
+        profile_mgr,
+        database=db,
+        lease_seconds: float = CLONE_LEASE_SECONDS,
+        poll_seconds: float = CLONE_LEASE_POLL_SECONDS,
+    ):
+        self.crawler = crawler
+        self.profile_mgr = profile_mgr
+        self.db = database
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.crawls = 0
+        self.refreshes = 0
+        self.coalesced = 0
+        self.waited_on_lease = 0
+
+    async def clone(self, handle: str, voice: str, goals: List[str], **crawl_options) -> UserX:
+        """
+        Clone `handle`, or join a clone of it already running here or on another
+        worker. Joiners get the profile as the first caller configured it.
+        crawl_options are passed on to CrawlerService.clone_profile.
+        """
+        key = normalize_handle(handle)
+        return await self._join(key, lambda: self._clone_once(key, handle, voice, goals, crawl_options))
+
+    async def refresh(self, profile: UserX) -> UserX:
+        """
+        Incrementally refresh `profile` (CrawlerService.refresh_profile), or join a
+        clone or refresh of the same handle already running here or on another worker.
+        """
+        key = normalize_handle(profile.username)
+        return await self._join(key, lambda: self._refresh_once(key, profile))
+
+    async def _join(self, key: str, start) -> UserX:
+        task = self._inflight.get(key)
+        if task:
+            self.coalesced += 1
+        else:
+            task = asyncio.create_task(start())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        # Shielded so a caller that disconnects does not cancel the crawl for the rest
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception():
+            logger.error(f"❌ Clone of @{key} failed: {task.exception()}")
+
+    async def _clone_once(self, key: str, handle: str, voice: str, goals: List[str], crawl_options: Dict[str, Any]) -> UserX:
+        while True:
+            if await self._acquire(key):
+                heartbeat = asyncio.create_task(self._renew_lease(key))
+                try:
+                    # The previous owner may have finished between our check and the lease
+                    existing = await self.profile_mgr.get_profile_by_username(key)
+                    if existing:
+                        return existing
+                    self.crawls += 1
+                    profile = await self.crawler.clone_profile(handle, voice, goals, **crawl_options)
+                    # Don't wait for the change stream to drop a stale copy on this worker
+                    self.profile_mgr.cache.invalidate(profile.id)
+                    return profile
+                finally:
+                    heartbeat.cancel()
+                    await self._release(key)
+
+            self.waited_on_lease += 1
+            profile = await self._wait_for_owner(key)
+            if profile:
+                return profile
+            # Owner gave up or died without writing the profile: try to take over
+
+    async def _refresh_once(self, key: str, profile: UserX) -> UserX:
+        while True:
+            if await self._acquire(key):
+                heartbeat = asyncio.create_task(self._renew_lease(key))
+                try:
+                    # Refresh from the stored copy: another worker may have refreshed it since
+                    self.profile_mgr.cache.invalidate(profile.id)
+                    current = await self.profile_mgr.get_profile_by_id(profile.id) or profile
+                    self.refreshes += 1
+                    refreshed, _ = await self.crawler.refresh_profile(current)
+                    self.profile_mgr.cache.invalidate(refreshed.id)
+                    return refreshed
+                finally:
+                    heartbeat.cancel()
+                    await self._release(key)
+
+            self.waited_on_lease += 1
+            if await self._wait_for_release(key):
+                # Whoever held the lease has just cloned or refreshed it
+                self.profile_mgr.cache.invalidate(profile.id)
+                return await self.profile_mgr.get_profile_by_id(profile.id) or profile
+            # Lease expired under a dead owner: try to take over
+
+    async def _acquire(self, key: str) -> bool:
+        now = datetime.utcnow()
+        lease = {"owner": self.owner, "expires_at": now + timedelta(seconds=self.lease_seconds)}
+        try:
+            await self.db.clone_leases.insert_one({"_id": key, **lease})
+            return True
+        except DuplicateKeyError:
+            # Expired but not reaped yet (the TTL monitor only runs once a minute)
+            taken = await self.db.clone_leases.find_one_and_update(
+                {"_id": key, "expires_at": {"$lte": now}},
+                {"$set": lease}
+            )
+            return taken is not None
+
+    async def _renew_lease(self, key: str):
+        # X rate-limit waits and Grok can outlast a lease; keep it while we are still crawling
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.db.clone_leases.update_one(
+                    {"_id": key, "owner": self.owner},
+                    {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+                )
+            except PyMongoError as e:
+                logger.warning(f"⚠️ Renewing the clone lease on @{key} failed: {e}")
+
+    async def _release(self, key: str):
+        await self.db.clone_leases.delete_one({"_id": key, "owner": self.owner})
+
+    async def _wait_for_owner(self, key: str) -> Optional[UserX]:
+        while True:
+            profile = await self.profile_mgr.get_profile_by_username(key)
+            if profile:
+                return profile
+            lease = await self.db.clone_leases.find_one({"_id": key})
+            if not lease or lease["expires_at"] <= datetime.utcnow():
+                return None
+            await asyncio.sleep(self.poll_seconds)
+
+    async def _wait_for_release(self, key: str) -> bool:
+        """True once the lease is released, False if it expired instead."""
+        while True:
+            lease = await self.db.clone_leases.find_one({"_id": key})
+            if not lease:
+                return True
+            if lease["expires_at"] <= datetime.utcnow():
+                return False
+            await asyncio.sleep(self.poll_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "crawls": self.crawls,
+            "refreshes": self.refreshes,
+            "coalesced": self.coalesced,
+            "waited_on_lease": self.waited_on_lease,
+        }
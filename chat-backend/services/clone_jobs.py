@@ -0,0 +1,283 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from config import (
+    CLONE_JOB_WORKERS,
+    CLONE_JOB_X_CONCURRENCY,
+    CLONE_JOB_LLM_CONCURRENCY,
+    CLONE_JOB_MAX_ATTEMPTS,
+    CLONE_JOB_RETRY_SECONDS,
+    CLONE_JOB_LEASE_SECONDS,
+    CLONE_JOB_POLL_SECONDS,
+)
+from database import db
+from services.clone_coordinator import normalize_handle
+from services.x_client import XApiError
+
+logger = logging.getLogger("CloneJobs")
+
+# Handles inserted per insert_many when a batch is enqueued
+ENQUEUE_CHUNK = 1000
+# Failed items listed in a job's status
+MAX_REPORTED_FAILURES = 50
+
+
+def is_permanent(error: Exception) -> bool:
+    """X rejected the request itself (not found, invalid, forbidden); retrying gets the same answer."""
+    return isinstance(error, XApiError) and 400 <= error.status_code < 500 and error.status_code != 429
+
+
+class CloneJobQueue:
+    """
+    Bulk cloning through two collections:
+
+    - `clone_jobs`: one document per POST /api/clone/batch, with the clone
+      settings and done / failed / existing counters.
+    - `clone_job_items`: one document per handle, which is the unit of work.
+
+    Every worker runs CLONE_JOB_WORKERS loops that claim queued items (or items
+    whose lease expired because their worker died) with find_one_and_update,
+    so several processes share one queue and a restart resumes where it left
+    off. X fetches and Grok analyses are bounded by separate per-worker
+    semaphores, so the pool drains at the rate the upstream quotas allow.
+    Failed items are retried with exponential back-off up to
+    CLONE_JOB_MAX_ATTEMPTS; errors that another attempt cannot fix (unknown or
+    invalid handle, any other 4xx from X but a 429) fail the item at once.
+    """
+
+    def __init__(
+        self,
+        clone_coordinator,
+        profile_mgr,
+        database=db,
+        workers: int = CLONE_JOB_WORKERS,
+        x_concurrency: int = CLONE_JOB_X_CONCURRENCY,
+        llm_concurrency: int = CLONE_JOB_LLM_CONCURRENCY,
+        max_attempts: int = CLONE_JOB_MAX_ATTEMPTS,
+        retry_seconds: float = CLONE_JOB_RETRY_SECONDS,
+        lease_seconds: float = CLONE_JOB_LEASE_SECONDS,
+        poll_seconds: float = CLONE_JOB_POLL_SECONDS,
+    ):
+        self.coordinator = clone_coordinator
+        self.profile_mgr = profile_mgr
+        self.db = database
+        self.workers = workers
+        self.x_slots = asyncio.Semaphore(x_concurrency)
+        self.llm_slots = asyncio.Semaphore(llm_concurrency)
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.owner = clone_coordinator.owner
+
+        self._tasks: List[asyncio.Task] = []
+        # Set on enqueue so idle workers on this process don't wait out a poll
+        self._wake = asyncio.Event()
+
+        self.cloned = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker_loop()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        # Items in progress keep their lease and are picked up again once it expires
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # --- Jobs ---
+
+    async def enqueue(self, handles: List[str], voice: str, goals: List[str]) -> Dict[str, Any]:
+        # Keep the first spelling of each handle, drop repeats and blanks
+        unique: Dict[str, str] = {}
+        for handle in handles:
+            key = normalize_handle(handle)
+            if key and key not in unique:
+                unique[key] = handle.strip().lstrip("@")
+
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow()
+        await self.db.clone_jobs.insert_one({
+            "_id": job_id,
+            "voice": voice,
+            "goals": goals,
+            "total": len(unique),
+            "done": 0,
+            "existing": 0,
+            "failed": 0,
+            "created_at": now,
+            "finished_at": now if not unique else None,
+        })
+        items = [{
+            "_id": f"{job_id}:{key}",
+            "job_id": job_id,
+            "handle": handle,
+            "status": "queued",
+            "attempts": 0,
+            "next_attempt_at": now,
+        } for key, handle in unique.items()]
+        for i in range(0, len(items), ENQUEUE_CHUNK):
+            await self.db.clone_job_items.insert_many(items[i:i + ENQUEUE_CHUNK], ordered=False)
+        self._wake.set()
+        logger.info(f"📋 Clone job {job_id} queued with {len(unique)} handles")
+        return {"job_id": job_id, "total": len(unique)}
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await self.db.clone_jobs.find_one({"_id": job_id})
+        if not job:
+            return None
+        counts = {"queued": 0, "running": 0}
+        async for row in self.db.clone_job_items.aggregate([
+            {"$match": {"job_id": job_id, "status": {"$in": ["queued", "running"]}}},
+            {"$group": {"_id": "$status", "n": {"$sum": 1}}},
+        ]):
+            counts[row["_id"]] = row["n"]
+        failures = await self.db.clone_job_items.find(
+            {"job_id": job_id, "status": "failed"},
+            {"_id": 0, "handle": 1, "attempts": 1, "error": 1}
+        ).limit(MAX_REPORTED_FAILURES).to_list(MAX_REPORTED_FAILURES)
+        finished = job["done"] + job["failed"]
+        return {
+            "id": job["_id"],
+            "status": "finished" if job["finished_at"] else "running" if finished or counts["running"] else "queued",
+            "total": job["total"],
+            "done": job["done"],
+            "existing": job["existing"],
+            "failed": job["failed"],
+            **counts,
+            "progress": round(finished / job["total"], 4) if job["total"] else 1.0,
+            "created_at": job["created_at"],
+            "finished_at": job["finished_at"],
+            "failures": failures,
+        }
+
+    # --- Workers ---
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await self.db.clone_job_items.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "next_attempt_at": {"$lte": now}},
+                # Its worker stopped renewing the lease: crashed or restarted mid-clone
+                {"status": "running", "lease_expires_at": {"$lte": now}},
+            ]},
+            {
+                "$set": {"status": "running", "owner": self.owner, "lease_expires_at": now + timedelta(seconds=self.lease_seconds)},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _worker_loop(self):
+        while True:
+            try:
+                item = await self._claim()
+            except PyMongoError as e:
+                logger.warning(f"⚠️ Claiming a clone job item failed: {e}")
+                item = None
+            if item is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._process(item)
+            except PyMongoError as e:
+                # The item's lease runs out and it is claimed again
+                logger.error(f"❌ Clone job item {item['_id']} hit a database error: {e}")
+
+    async def _process(self, item: Dict[str, Any]):
+        job = await self.db.clone_jobs.find_one({"_id": item["job_id"]}, {"voice": 1, "goals": 1})
+        if not job:
+            # Job deleted under us: nothing left to report to
+            await self.db.clone_job_items.delete_one({"_id": item["_id"]})
+            return
+
+        heartbeat = asyncio.create_task(self._renew_lease(item["_id"]))
+        try:
+            existing = await self.profile_mgr.get_profile_by_username(item["handle"])
+            if existing:
+                await self._complete(item, "done", {"profile_id": existing.id}, existing=True)
+                return
+            profile = await self.coordinator.clone(
+                item["handle"], job["voice"], job["goals"],
+                x_slot=self.x_slots, llm_slot=self.llm_slots, fallback=False
+            )
+            self.cloned += 1
+            await self._complete(item, "done", {"profile_id": profile.id})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:500]
+            if item["attempts"] < self.max_attempts and not is_permanent(e):
+                self.retried += 1
+                delay = self.retry_seconds * 2 ** (item["attempts"] - 1)
+                logger.warning(f"⚠️ Clone of @{item['handle']} failed (attempt {item['attempts']}), retrying in {delay:.0f}s: {error}")
+                await self.db.clone_job_items.update_one(
+                    {"_id": item["_id"], "owner": self.owner},
+                    {"$set": {
+                        "status": "queued",
+                        "error": error,
+                        "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay),
+                    }}
+                )
+            else:
+                self.failed += 1
+                await self._complete(item, "failed", {"error": error})
+        finally:
+            heartbeat.cancel()
+
+    async def _renew_lease(self, item_id: str):
+        # X rate-limit waits can outlast a lease; keep it while we are still working
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.db.clone_job_items.update_one(
+                    {"_id": item_id, "owner": self.owner, "status": "running"},
+                    {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+                )
+            except PyMongoError as e:
+                # A missed renewal is survivable; the next one may get through before expiry
+                logger.warning(f"⚠️ Renewing the lease on clone job item {item_id} failed: {e}")
+
+    async def _complete(self, item: Dict[str, Any], status: str, fields: Dict[str, Any], existing: bool = False):
+        result = await self.db.clone_job_items.update_one(
+            {"_id": item["_id"], "owner": self.owner, "status": "running"},
+            {"$set": {"status": status, "finished_at": datetime.utcnow(), **fields}}
+        )
+        if not result.modified_count:
+            # Lease was lost and another worker took the item over; it does the counting
+            return
+        counter = {"done": 1, "existing": 1} if existing else {status: 1}
+        job = await self.db.clone_jobs.find_one_and_update(
+            {"_id": item["job_id"]},
+            {"$inc": counter},
+            return_document=ReturnDocument.AFTER
+        )
+        if job and job["done"] + job["failed"] >= job["total"]:
+            await self.db.clone_jobs.update_one(
+                {"_id": job["_id"], "finished_at": None},
+                {"$set": {"finished_at": datetime.utcnow()}}
+            )
+            logger.info(f"✅ Clone job {job['_id']} finished: {job['done']} done, {job['failed']} failed")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "cloned": self.cloned,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
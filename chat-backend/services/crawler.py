@@ -1,26 +1,71 @@
 import asyncio
+import hashlib
 import os
+from contextlib import nullcontext
 from datetime import datetime
-from typing import List
-import tweepy
+from typing import Any, Dict, List, Tuple
+from pymongo import ReturnDocument
 from models import UserX, PublicMetrics, Entities, ConversationalGoal
+from config import REFRESH_MIN_NEW_TWEETS
 from database import db
 from services.llm_service import GrokService # Import the new service
+from services.tag_catalog import TagCatalog, tag_keys
+from services.chat_engine import compile_persona, prompt_hash
+from services.x_client import XClient
+from services.tweet_store import TweetStore
+from services.profile_io import URL_FIELDS
+
+# Grok-derived fields an incremental refresh may revise
+PERSONA_FIELDS = ("system_prompt", "tags", "typing_style", "speech_style", "behavior_summary")
+
+
+def mock_user_id(handle: str) -> str:
+    """Numeric id for a mock user, the same for a handle on every worker and after restarts."""
+    digest = hashlib.sha256(handle.strip().lstrip("@").casefold().encode()).digest()
+    return str(int.from_bytes(digest[:8], "big") >> 1)
+
+
+class ReanalyzeUnavailable(Exception):
+    """Nothing to re-analyze with: no stored tweets for the profile, or no Grok service."""
+
+
+class PersonaAnalysisFailed(Exception):
+    """Grok failed or answered with something that is not a persona."""
+
 
 class CrawlerService:
-    def __init__(self, grok_service: GrokService | None):
+    def __init__(self, grok_service: GrokService | None, similarity_index=None):
         self.grok = grok_service  # Inject the service
+        self.similarity_index = similarity_index
+        self.tag_catalog = TagCatalog()
+        self.tweets = TweetStore()
         self.bearer_token = os.getenv("X_BEARER_TOKEN")
-        self.client = tweepy.Client(bearer_token=self.bearer_token) if self.bearer_token else None
+        self.x = XClient(self.bearer_token) if self.bearer_token else None
 
-    async def clone_profile(self, handle: str, voice: str = "Ara", goals: List[str] = []) -> UserX:
+    async def clone_profile(
+        self,
+        handle: str,
+        voice: str = "Ara",
+        goals: List[str] = [],
+        x_slot=None,
+        llm_slot=None,
+        fallback: bool = True
+    ) -> UserX:
+        """
+        x_slot / llm_slot: optional async context managers (e.g. semaphores) held
+        around the X fetch and the Grok analysis respectively. With fallback=False,
+        X API and Grok errors (or a missing X client / Grok service) are raised
+        instead of replaced by mock data and a generic persona.
+        """
         print(f"🕵️‍♀️ Cloning profile: @{handle}...")
 
         # 1. Fetch User Data and Tweets
-        user_data, raw_tweets = await self._fetch_tweets(handle)
+        async with x_slot or nullcontext():
+            user_data, raw_tweets, newest_tweet_id = await self._fetch_tweets(handle, fallback)
 
         # 2. Analyze Persona using Grok
-        analysis = await self._analyze_persona(handle, raw_tweets)
+        async with llm_slot or nullcontext():
+            analysis = await self._analyze_persona(handle, raw_tweets, fallback)
 
         # 3. Create UserX Object
         user_profile = UserX(
@@ -55,23 +100,128 @@ class CrawlerService:
 
             verified=user_data["verified"],
             verified_type="blue_verified" if user_data["verified"] else None,
-            profile_image_url=user_data["profile_image_url"]
-        )
-        
-        # Upsert into DB
-        await db.profiles.update_one(
-            {"_id": user_profile.id}, 
-            {"$set": user_profile.model_dump(by_alias=True)}, 
-            upsert=True
+            profile_image_url=user_data["profile_image_url"],
+            newest_tweet_id=newest_tweet_id
         )
-        
+
+
+        await self._save(user_profile)
         return user_profile
 
-    async def _analyze_persona(self, handle: str, tweets: List[str]) -> dict:
+    async def refresh_profile(
+        self,
+        profile: UserX,
+        min_new_tweets: int = REFRESH_MIN_NEW_TWEETS
+    ) -> Tuple[UserX, Dict[str, Any]]:
+        """
+        Incremental re-crawl: fetches only tweets newer than profile.newest_tweet_id.
+        Below min_new_tweets, only the X-side fields (name, bio, metrics...) are
+        updated and Grok is not called; the new tweets stay pending for the next
+        refresh. Otherwise Grok revises the persona from the new tweets alone.
+        Returns the updated profile and {"new_tweets", "analyzed"}.
+        """
+        if not self.x:
+            print("⚠️ X_BEARER_TOKEN not set, nothing to refresh")
+            return profile, {"new_tweets": 0, "analyzed": False}
+
+        print(f"🔄 Refreshing profile: @{profile.username} (since {profile.newest_tweet_id})...")
+        user = self._user_dict(await self.x.get_user(profile.username))
+        tweet_data, meta = await self.x.get_users_tweets(profile.id, max_results=50, since_id=profile.newest_tweet_id)
+        await self.tweets.upsert_many(profile.id, tweet_data)
+        new_tweets = [tweet["text"] for tweet in tweet_data]
+
+        updated = profile.model_copy(deep=True)
+        updated.name = user["name"]
+        updated.description = user["description"] or profile.description
+        updated.location = user["location"] or profile.location
+        updated.verified = user["verified"]
+        updated.public_metrics = PublicMetrics(**user["public_metrics"])
+        updated.last_updated = datetime.utcnow()
+
+        analyzed = False
+        if profile.newest_tweet_id is None:
+            # Cloned before newest ids were kept: its persona already covers these tweets
+            updated.newest_tweet_id = meta.get("newest_id")
+        elif len(new_tweets) >= min_new_tweets and self.grok:
+            current = {field: getattr(profile, field) for field in PERSONA_FIELDS}
+            print(f"🧠 Asking Grok to update @{profile.username} from {len(new_tweets)} new tweets...")
+            try:
+                analysis = await self.grok.update_persona_analysis(profile.username, current, new_tweets)
+            except Exception as e:
+                # Keep the persona and newest_tweet_id; the next refresh tries again
+                print(f"❌ Persona update failed for @{profile.username}: {e}")
+            else:
+                for field in PERSONA_FIELDS:
+                    if analysis.get(field):
+                        setattr(updated, field, analysis[field])
+                updated.newest_tweet_id = meta.get("newest_id")
+                # Other workers' similarity indexes catch up on fetched_at
+                updated.fetched_at = updated.last_updated
+                analyzed = True
+
+        await self._save(updated)
+        return updated, {"new_tweets": len(new_tweets), "analyzed": analyzed}
+
+    async def reanalyze_profile(self, profile: UserX, limit: int = 50, bypass_cache: bool = False) -> UserX:
+        """
+        Re-run the full persona analysis (e.g. after a prompt or model change)
+        on the tweets already in the tweet store. Costs no X API quota.
+        Raises ReanalyzeUnavailable when there is nothing to analyze or no Grok
+        service, and PersonaAnalysisFailed when Grok's answer is unusable.
+        """
+        if not self.grok:
+            raise ReanalyzeUnavailable("Grok service not available")
+        tweets = await self.tweets.recent_texts(profile.id, limit)
+        if not tweets:
+            raise ReanalyzeUnavailable(f"No stored tweets for @{profile.username}")
+        print(f"🧠 Asking Grok to re-analyze {len(tweets)} stored tweets for @{profile.username}...")
+        # No generic fallback: a failed re-analysis must not replace a good persona
+        try:
+            analysis = await self.grok.generate_persona_analysis(
+                profile.username, tweets, fallback=False, bypass_cache=bypass_cache
+            )
+        except Exception as e:
+            raise PersonaAnalysisFailed(f"Persona analysis for @{profile.username} failed: {e}") from e
+
+        updated = profile.model_copy(deep=True)
+        for field in PERSONA_FIELDS:
+            if analysis.get(field):
+                setattr(updated, field, analysis[field])
+        updated.last_updated = updated.fetched_at = datetime.utcnow()
+
+        await self._save(updated)
+        return updated
+
+    async def _save(self, user_profile: UserX):
+        # Precompile the persona half of the system prompt at write time. Every
+        # write recompiles it: name and bio are part of it, not just Grok's fields
+        user_profile.persona_prompt = compile_persona(user_profile)
+        user_profile.persona_version = prompt_hash(user_profile.persona_prompt)
+
+        # Upsert into DB, keeping the previous tags to diff against the catalog
+        previous = await db.profiles.find_one_and_update(
+            {"_id": user_profile.id},
+            {"$set": {
+                **user_profile.model_dump(by_alias=True),
+                # HttpUrl is not BSON-encodable; store URLs as strings
+                **user_profile.model_dump(mode="json", include=URL_FIELDS),
+                "tag_keys": tag_keys(user_profile.tags)
+            }},
+            projection={"tags": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        await self.tag_catalog.apply_change(previous.get("tags", []) if previous else [], user_profile.tags)
+        if self.similarity_index:
+            self.similarity_index.upsert_profile(user_profile)
+
+    async def _analyze_persona(self, handle: str, tweets: List[str], fallback: bool = True) -> dict:
         """
         Delegates the analysis to the GrokService.
         """
         if not self.grok:
+            if not fallback:
+                raise RuntimeError("Grok service not available")
             print("⚠️ Grok service not available, using fallback analysis")
             return {
                 "bio_snippet": f"Digital clone of @{handle} (Analysis unavailable).",
@@ -82,16 +232,36 @@ class CrawlerService:
                 "behavior_summary": "Helpful and straightforward interaction style."
             }
         print(f"🧠 Asking Grok to analyze {len(tweets)} tweets for @{handle}...")
-        return await self.grok.generate_persona_analysis(handle, tweets)
+        return await self.grok.generate_persona_analysis(handle, tweets, fallback=fallback)
 
-    async def _fetch_tweets(self, handle: str) -> tuple:
-        """Fetch user profile and tweets from Twitter API."""
-        if not self.client:
+    def _user_dict(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": str(user["id"]),
+            "username": user["username"],
+            "name": user["name"],
+            "description": user.get("description") or "",
+            "location": user.get("location") or "",
+            "profile_image_url": user.get("profile_image_url"),
+            "verified": user.get("verified") or False,
+            "created_at": user["created_at"],
+            "public_metrics": {
+                "followers_count": user["public_metrics"]["followers_count"],
+                "following_count": user["public_metrics"]["following_count"],
+                "tweet_count": user["public_metrics"]["tweet_count"],
+                "listed_count": user["public_metrics"]["listed_count"]
+            }
+        }
+
+    async def _fetch_tweets(self, handle: str, fallback: bool = True) -> tuple:
+        """Fetch user profile, tweets and the newest tweet id from Twitter API."""
+        if not self.x:
+            if not fallback:
+                raise RuntimeError("X_BEARER_TOKEN not set")
             # Fallback to mock data if no token
             print("⚠️ X_BEARER_TOKEN not set, using mock data")
             await asyncio.sleep(0.5)
             mock_user = {
-                "id": str(abs(hash(handle))),
+                "id": mock_user_id(handle),
                 "username": handle,
                 "name": handle.capitalize(),
                 "description": "Mock bio",
@@ -107,56 +277,20 @@ class CrawlerService:
                 "AI safety is actually a huge concern.",
                 "Meme review 👏👏"
             ]
-            return mock_user, mock_tweets
+            return mock_user, mock_tweets, None
 
         try:
-            # Fetch user
-            user_response = self.client.get_user(
-                username=handle,
-                user_fields=["public_metrics", "description", "location", "verified", "profile_image_url", "created_at"]
-            )
-            if not user_response.data:
-                raise ValueError(f"User @{handle} not found")
-
-            user = user_response.data
-
-            # Fetch recent tweets
-            tweets_response = self.client.get_users_tweets(
-                user.id,
-                max_results=50,
-                tweet_fields=["created_at", "public_metrics", "entities"]
-            )
-
-            tweets = []
-            if tweets_response.data:
-                for tweet in tweets_response.data:
-                    tweets.append(tweet.text)
-
-            user_dict = {
-                "id": str(user.id),
-                "username": user.username,
-                "name": user.name,
-                "description": user.description or "",
-                "location": user.location or "",
-                "profile_image_url": user.profile_image_url,
-                "verified": user.verified or False,
-                "created_at": user.created_at,
-                "public_metrics": {
-                    "followers_count": user.public_metrics["followers_count"],
-                    "following_count": user.public_metrics["following_count"],
-                    "tweet_count": user.public_metrics["tweet_count"],
-                    "listed_count": user.public_metrics["listed_count"]
-                }
-            }
-
-            return user_dict, tweets
-
+            # Fetch user (batched with any other lookups in flight) and recent tweets
+            user = await self.x.get_user(handle)
+            tweet_data, meta = await self.x.get_users_tweets(user["id"], max_results=50)
         except Exception as e:
             print(f"❌ Twitter API error for @{handle}: {e}")
+            if not fallback:
+                raise
             # Fallback to mock
             await asyncio.sleep(0.5)
             mock_user = {
-                "id": str(abs(hash(handle))),
+                "id": mock_user_id(handle),
                 "username": handle,
                 "name": handle.capitalize(),
                 "description": "Mock bio",
@@ -172,4 +306,9 @@ class CrawlerService:
                 "AI safety is actually a huge concern.",
                 "Meme review 👏👏"
             ]
-            return mock_user, mock_tweets
\ No newline at end of file
+            return mock_user, mock_tweets, None
+
+        # Keep the raw tweets so re-analysis does not need the API again
+        await self.tweets.upsert_many(user["id"], tweet_data)
+        tweets = [tweet["text"] for tweet in tweet_data]
+        return self._user_dict(user), tweets, meta.get("newest_id")
@@ -0,0 +1,120 @@
+import logging
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from config import INDEX_STRICT
+from database import db
+
+logger = logging.getLogger("IndexManager")
+
+# Case-insensitive matching for handles; queries must pass the same collation to use the index
+USERNAME_COLLATION = {"locale": "en", "strength": 2}
+
+
+class CollectionScanError(RuntimeError):
+    def __init__(self, labels: List[str]):
+        super().__init__(f"Queries do a collection scan: {', '.join(labels)}")
+        self.labels = labels
+
+
+# Every index the service relies on, per collection
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    "profiles": [
+        IndexModel([("username", ASCENDING)], name="username_ci_unique", unique=True, collation=USERNAME_COLLATION),
+        # Exact/prefix tag search, already in discovery list order
+        IndexModel([("tag_keys", ASCENDING), ("fetched_at", DESCENDING), ("_id", DESCENDING)], name="tag_keys_fetched_at_id"),
+        # Discovery list order and keyset pagination cursor
+        IndexModel([("fetched_at", DESCENDING), ("_id", DESCENDING)], name="fetched_at_id"),
+    ],
+    "clone_leases": [
+        # Reaps leases left behind by a worker that died mid-clone
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "sessions": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        # Usage per persona
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_id_created_at"),
+    ],
+    "clone_job_items": [
+        # Claiming: due queued items, and running items whose lease expired
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at"),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)], name="status_lease_expires_at"),
+        # Job progress and failure listing
+        IndexModel([("job_id", ASCENDING), ("status", ASCENDING)], name="job_id_status"),
+    ],
+    "tweets": [
+        # An author's tweets, newest first, for re-analysis
+        IndexModel([("author_id", ASCENDING), ("created_at", DESCENDING)], name="author_id_created_at"),
+    ],
+    "llm_cache": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        # Size-based eviction, least recently used first
+        IndexModel([("last_used_at", ASCENDING)], name="last_used_at"),
+    ],
+    "tags": [
+        # Catalog listing and autocomplete, most used first
+        IndexModel([("count", DESCENDING), ("_id", ASCENDING)], name="count_id"),
+    ],
+}
+
+
+class IndexManager:
+    """Creates the declared indexes at startup and reports drift from the declaration."""
+
+    def __init__(self, database=db, specs: Dict[str, List[IndexModel]] = INDEX_SPECS):
+        self.db = database
+        self.specs = specs
+
+    async def ensure_indexes(self) -> Dict[str, Dict[str, List[str]]]:
+        """
+        Idempotent: creating an index that already exists with the same options is a no-op.
+        Returns {collection: {"missing": [...], "extra": [...], "errors": [...]}}.
+        """
+        report = {}
+        for collection, models in self.specs.items():
+            declared = [m.document["name"] for m in models]
+            errors = []
+            for model in models:
+                try:
+                    await self.db[collection].create_indexes([model])
+                except OperationFailure as e:
+                    # e.g. same name with different options, or duplicates blocking a unique index
+                    errors.append(f"{model.document['name']}: {e}")
+
+            existing = set((await self.db[collection].index_information()).keys())
+            report[collection] = {
+                "missing": [name for name in declared if name not in existing],
+                "extra": sorted(existing - set(declared) - {"_id_"}),
+                "errors": errors,
+            }
+
+        for collection, result in report.items():
+            if any(result.values()):
+                logger.warning(f"⚠️ Index drift on {collection}: {result}")
+            else:
+                logger.info(f"✅ Indexes OK on {collection}")
+        return report
+
+    async def find_collscans(
+        self,
+        queries: List[Tuple[str, str, Dict[str, Any], Dict[str, Any]]],
+        strict: bool = INDEX_STRICT
+    ) -> List[str]:
+        """
+        Runs explain() for each (label, collection, filter, options) query shape and
+        returns the labels whose winning plan contains a COLLSCAN. With strict,
+        raises CollectionScanError instead, so startup fails on a missing index.
+        """
+        offenders = []
+        for label, collection, query, options in queries:
+            cursor = self.db[collection].find(query, **options)
+            plan = await cursor.explain()
+            if "COLLSCAN" in str(plan.get("queryPlanner", {}).get("winningPlan", {})):
+                offenders.append(label)
+        for label in offenders:
+            logger.warning(f"⚠️ Query does a collection scan: {label}")
+        if offenders and strict:
+            raise CollectionScanError(offenders)
+        return offenders
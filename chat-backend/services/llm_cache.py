@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import orjson
+from pymongo import ASCENDING
+
+from config import (
+    LLM_CACHE_BACKEND,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_CACHE_MAX_ENTRIES,
+)
+from database import db
+
+logger = logging.getLogger("LLMCache")
+
+# Entry count is checked against the limit once every this many writes
+EVICT_EVERY_PUTS = 100
+
+
+def cache_key(model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    """Content address of a completion request: same model, messages and parameters, same key."""
+    payload = orjson.dumps({"model": model, "messages": messages, "params": params}, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(payload).hexdigest()
+
+
+class MongoCacheBackend:
+    """Entries in `llm_cache`; a TTL index drops expired ones, the least recently used go past max_entries."""
+
+    def __init__(self, database=db, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.db = database
+        self.max_entries = max_entries
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        # Expired entries can outlive expires_at until the TTL monitor runs
+        return await self.db.llm_cache.find_one_and_update(
+            {"_id": key, "expires_at": {"$gt": now}},
+            {"$set": {"last_used_at": now}},
+            projection={"content": 1, "tokens": 1}
+        )
+
+    async def put(self, key: str, entry: Dict[str, Any], ttl: float):
+        now = datetime.utcnow()
+        await self.db.llm_cache.replace_one(
+            {"_id": key},
+            {**entry, "created_at": now, "last_used_at": now, "expires_at": now + timedelta(seconds=ttl)},
+            upsert=True
+        )
+
+    async def evict(self) -> int:
+        excess = await self.db.llm_cache.estimated_document_count() - self.max_entries
+        if excess <= 0:
+            return 0
+        oldest = await self.db.llm_cache.find({}, {"_id": 1}).sort("last_used_at", ASCENDING).limit(excess).to_list(excess)
+        result = await self.db.llm_cache.delete_many({"_id": {"$in": [doc["_id"] for doc in oldest]}})
+        return result.deleted_count
+
+
+class DiskCacheBackend:
+    """
+    One JSON file per entry under `path`, fanned out by key prefix. A file's
+    mtime is its last use, so eviction past max_entries drops the least
+    recently used. File I/O runs in the default executor.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key + ".json")
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._file(key)
+        try:
+            with open(path, "rb") as f:
+                entry = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+        if entry["expires_at"] <= time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        os.utime(path)
+        return entry
+
+    def _write(self, key: str, entry: Dict[str, Any]):
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so a reader never sees half an entry
+        with open(path + ".tmp", "wb") as f:
+            f.write(orjson.dumps(entry))
+        os.replace(path + ".tmp", path)
+
+    def _evict(self) -> int:
+        files = []
+        for shard in os.scandir(self.path):
+            if shard.is_dir():
+                files += [(e.stat().st_mtime, e.path) for e in os.scandir(shard.path) if e.name.endswith(".json")]
+        excess = len(files) - self.max_entries
+        if excess <= 0:
+            return 0
+        files.sort()
+        for _, path in files[:excess]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return excess
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.get_running_loop().run_in_executor(None, self._read, key)
+
+    async def put(self, key: str, entry: Dict[str, Any], ttl: float):
+        await asyncio.get_running_loop().run_in_executor(None, self._write, key, {**entry, "expires_at": time.time() + ttl})
+
+    async def evict(self) -> int:
+        return await asyncio.get_running_loop().run_in_executor(None, self._evict)
+
+
+class LLMCache:
+    """
+    Content-addressed cache of completion responses, keyed by cache_key().
+    Only responses the caller could use are stored: GrokService puts after a
+    successful parse, so its generic fallback answers are never cached.
+    Cache errors are logged and treated as misses; they never fail a request.
+    """
+
+    def __init__(self, backend: str = LLM_CACHE_BACKEND, ttl_seconds: float = LLM_CACHE_TTL_SECONDS):
+        self.ttl = ttl_seconds
+        if backend == "mongo":
+            self.backend = MongoCacheBackend()
+        elif backend == "disk":
+            self.backend = DiskCacheBackend()
+        else:
+            self.backend = None
+        self.backend_name = backend if self.backend else "off"
+
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.tokens_saved = 0
+        self.errors = 0
+        self._puts = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            entry = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️ LLM cache read failed: {e}")
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.tokens_saved += entry.get("tokens") or 0
+        return entry
+
+    async def put(self, key: str, content: str, tokens: Optional[int]):
+        try:
+            await self.backend.put(key, {"content": content, "tokens": tokens}, self.ttl)
+            self._puts += 1
+            if self._puts % EVICT_EVERY_PUTS == 0:
+                evicted = await self.backend.evict()
+                if evicted:
+                    logger.info(f"🧹 Evicted {evicted} LLM cache entries")
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️ LLM cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "tokens_saved": self.tokens_saved,
+            "errors": self.errors,
+        }
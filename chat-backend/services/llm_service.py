@@ -3,14 +3,17 @@ import re
 from typing import List, Dict, Any
 from openai import AsyncOpenAI
 
+from services.llm_cache import LLMCache, cache_key
+
 class GrokService:
-    def __init__(self, api_key: str, model: str = "grok-4-1-fast-non-reasoning-latest"):
+    def __init__(self, api_key: str, model: str = "grok-4-1-fast-non-reasoning-latest", cache: LLMCache | None = None):
         """
         Initialize the Grok service wrapper.
         
         Args:
             api_key: The xAI API key.
             model: The specific model ID (defaulting to latest Grok 2).
+            cache: Optional response cache, consulted before every completion.
         """
         if not api_key:
             raise ValueError("xAI API Key is required for GrokService")
@@ -20,10 +23,13 @@ class GrokService:
             base_url="https://api.x.ai/v1"
         )
         self.model = model
+        self.cache = cache
 
-    async def generate_persona_analysis(self, handle: str, tweets: List[str]) -> Dict[str, Any]:
+    async def generate_persona_analysis(self, handle: str, tweets: List[str], fallback: bool = True, bypass_cache: bool = False) -> Dict[str, Any]:
         """
         Sends tweets to Grok to generate a persona profile, system prompts, and tags.
+        With fallback=False, errors are raised instead of answered with a generic persona.
+        With bypass_cache=True, a cached answer is not used (the fresh one replaces it).
         """
         
         # 1. Construct the Prompt
@@ -64,26 +70,13 @@ class GrokService:
 
         try:
             # 2. Call xAI API
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_instruction},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7, # Slight creativity for the persona description
-                max_tokens=1000,
-            )
-
-            raw_content = response.choices[0].message.content
-            if not raw_content:
-                raise ValueError("Empty response from Grok")
-
-            # 3. Robust JSON Parsing
-            # Grok might wrap the JSON in markdown code blocks (```json ... ```)
-            return self._extract_json(raw_content)
+            # Slight creativity for the persona description
+            return await self._complete_json(system_instruction, user_prompt, temperature=0.7, bypass_cache=bypass_cache)
 
         except Exception as e:
-            # Fallback data so the app doesn't crash
+            if not fallback:
+                raise
+            # Fallback data so the app doesn't crash (never cached: it is not Grok's answer)
             return {
                 "bio_snippet": f"Digital clone of @{handle} (Analysis failed).",
                 "system_prompt": f"You are @{handle}. Please speak in a generic but helpful tone.",
@@ -93,6 +86,89 @@ class GrokService:
                 "behavior_summary": "Helpful and straightforward interaction style."
             }
 
+    async def update_persona_analysis(self, handle: str, current: Dict[str, Any], new_tweets: List[str], bypass_cache: bool = False) -> Dict[str, Any]:
+        """
+        Revises an existing analysis in light of tweets posted since it was made.
+        Only the new tweets are sent, next to the current fields. Unlike
+        generate_persona_analysis there is no fallback: on failure this raises,
+        so the caller keeps the persona it has.
+        """
+        tweets_block = "\n".join([f"- {t}" for t in new_tweets[:50]])
+
+        system_instruction = (
+            "You are an expert social media analyst and behavioral psychologist. "
+            "You maintain a 'Digital Soul' configuration for a user and revise it as they post."
+        )
+
+        user_prompt = f"""
+        This is the current persona analysis for the user @{handle}:
+        {json.dumps(current, ensure_ascii=False, indent=2)}
+
+        These tweets were posted since it was written:
+        {tweets_block}
+
+        Task:
+        Update the analysis only where the new tweets show something it misses or gets wrong
+        (new topics, a shift in tone, new habits). Keep everything else as it is, word for word.
+        Respect the same limits: 'system_prompt' max 100 words, 5-8 'tags', and max 50 words
+        each for 'typing_style', 'speech_style' and 'behavior_summary'.
+
+        Return ONLY valid JSON with this structure:
+        {{
+            "system_prompt": "string",
+            "tags": ["string", "string"],
+            "typing_style": "string",
+            "speech_style": "string",
+            "behavior_summary": "string"
+        }}
+        """
+
+        # Lower temperature than a fresh analysis: unchanged fields should come back unchanged
+        return await self._complete_json(system_instruction, user_prompt, temperature=0.3, bypass_cache=bypass_cache)
+
+    async def _complete_json(
+        self,
+        system_instruction: str,
+        user_prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        bypass_cache: bool = False
+    ) -> Dict[str, Any]:
+        messages = [
+            {"role": "system", "content": system_instruction},
+            {"role": "user", "content": user_prompt}
+        ]
+        params = {"temperature": temperature, "max_tokens": max_tokens}
+
+        key = None
+        if self.cache and self.cache.enabled:
+            key = cache_key(self.model, messages, params)
+            if bypass_cache:
+                self.cache.bypassed += 1
+            else:
+                cached = await self.cache.get(key)
+                if cached:
+                    return self._extract_json(cached["content"])
+
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            **params,
+        )
+
+        raw_content = response.choices[0].message.content
+        if not raw_content:
+            raise ValueError("Empty response from Grok")
+
+        # Robust JSON Parsing
+        # Grok might wrap the JSON in markdown code blocks (```json ... ```)
+        result = self._extract_json(raw_content)
+
+        # Only cache what parsed: anything else would send the caller to its fallback again
+        if key:
+            await self.cache.put(key, raw_content, response.usage.total_tokens if response.usage else None)
+        return result
+
     def _extract_json(self, text: str | None) -> Dict[str, Any]:
         """
         Helper to extract JSON from an LLM response string, handling markdown fences.
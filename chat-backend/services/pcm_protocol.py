@@ -0,0 +1,88 @@
+"""
+Binary audio sub-protocol for the browser leg of /ws.
+
+A browser that opens the socket with one of the `grok-<codec>.v1` sub-protocols
+sends and receives audio as binary frames instead of base64 inside JSON:
+`grok-pcm16.v1` carries raw PCM16, `grok-mulaw.v1` G.711 mu-law and
+`grok-opus.v1` one Opus packet per frame (only offered when libopus is
+installed). Every binary frame starts with a 4 byte header:
+
+    kind (uint8) | flags (uint8) | seq (uint16, big endian, wraps)
+
+followed by the audio payload. All other events keep travelling as JSON text,
+and xAI itself is always spoken to in PCM16.
+"""
+import base64
+import struct
+from typing import List, Optional
+
+from services.audio_codecs import available_codecs
+
+# Sub-protocol -> browser-leg codec
+SUBPROTOCOLS = {
+    "grok-opus.v1": "opus",
+    "grok-mulaw.v1": "mulaw",
+    "grok-pcm16.v1": "pcm16",
+}
+
+HEADER = struct.Struct("!BBH")
+
+KIND_AUDIO_IN = 0x01   # browser -> relay, becomes input_audio_buffer.append
+KIND_AUDIO_OUT = 0x02  # relay -> browser, unwrapped from response.audio.delta
+
+_DELTA_KEY = '"delta"'
+
+
+def negotiate_subprotocol(requested: List[str]) -> Optional[str]:
+    """First binary sub-protocol offered by the browser that we can serve, else None (JSON)."""
+    codecs = available_codecs()
+    for name in requested:
+        if SUBPROTOCOLS.get(name) in codecs:
+            return name
+    return None
+
+
+def input_payload(frame: bytes) -> memoryview:
+    """Audio payload of a binary browser frame, as a view into the frame (no copy)."""
+    view = memoryview(frame)
+    if len(view) < HEADER.size:
+        raise ValueError("Binary frame shorter than header")
+    kind, _, _ = HEADER.unpack_from(view)
+    if kind != KIND_AUDIO_IN:
+        raise ValueError(f"Unexpected binary frame kind: {kind}")
+    return view[HEADER.size:]
+
+
+def input_audio_event(pcm) -> str:
+    """PCM16 -> the input_audio_buffer.append event xAI expects."""
+    # b64encode reads straight from a memoryview, no intermediate copy of the PCM
+    audio = base64.b64encode(pcm).decode("ascii")
+    return '{"type":"input_audio_buffer.append","audio":"' + audio + '"}'
+
+
+def extract_delta(message: str) -> Optional[str]:
+    """Base64 `delta` of a response.audio.delta event, found without parsing the JSON."""
+    idx = message.find(_DELTA_KEY)
+    if idx < 0:
+        return None
+    start = message.find('"', idx + len(_DELTA_KEY) + 1)
+    if start < 0:
+        return None
+    end = message.find('"', start + 1)
+    if end < 0:
+        return None
+    delta = message[start + 1:end]
+    # Base64 never needs escaping, but some encoders still write "/" as "\/"
+    return delta.replace("\\/", "/") if "\\" in delta else delta
+
+
+class AudioOutFramer:
+    """Numbers and frames outgoing audio payloads for one browser."""
+
+    def __init__(self):
+        self.seq = 0
+
+    def frame(self, payload: bytes) -> bytes:
+        header = HEADER.pack(KIND_AUDIO_OUT, 0, self.seq)
+        self.seq = (self.seq + 1) & 0xFFFF
+        return header + payload
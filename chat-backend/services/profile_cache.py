@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from pymongo.errors import PyMongoError
+
+from config import (
+    PROFILE_CACHE_ENABLED,
+    PROFILE_CACHE_MAX_ENTRIES,
+    PROFILE_CACHE_TTL_SECONDS,
+    PROFILE_CACHE_FALLBACK_TTL_SECONDS,
+)
+from models import UserX
+
+logger = logging.getLogger("ProfileCache")
+
+# Back-off before re-opening a change stream that died or was refused
+WATCH_RETRY_SECONDS = 5
+WATCH_RETRY_MAX_SECONDS = 300
+
+
+def _username_key(username: str) -> str:
+    # Mirrors USERNAME_COLLATION (strength 2): handles match regardless of case
+    return username.casefold()
+
+
+class ProfileCache:
+    """
+    Bounded LRU of UserX keyed by _id, with a username -> _id alias so either
+    lookup hits the same entry. Concurrent misses on one key share a single DB
+    read. While a change stream on `profiles` is open, entries live for
+    `ttl_seconds` and are dropped as soon as the document changes; without one
+    (e.g. a standalone mongod) they only live for `fallback_ttl_seconds`.
+    """
+
+    def __init__(
+        self,
+        collection,
+        enabled: bool = PROFILE_CACHE_ENABLED,
+        max_entries: int = PROFILE_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = PROFILE_CACHE_TTL_SECONDS,
+        fallback_ttl_seconds: float = PROFILE_CACHE_FALLBACK_TTL_SECONDS,
+    ):
+        self.collection = collection
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.fallback_ttl_seconds = fallback_ttl_seconds
+
+        # _id -> (expires_at, profile)
+        self._entries: "OrderedDict[str, Tuple[float, UserX]]" = OrderedDict()
+        self._by_username: Dict[str, str] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        # Bumped on every invalidation so a read that raced one is not stored
+        self._generation = 0
+        self._watch_task: Optional[asyncio.Task] = None
+        self.watching = False
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def start(self):
+        if self.enabled and not self._watch_task:
+            self._watch_task = asyncio.create_task(self._watch_loop())
+
+    async def stop(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+        self.watching = False
+
+    async def get_by_id(self, pid: str, load: Callable[[], Awaitable[Optional[UserX]]]) -> Optional[UserX]:
+        return await self._get(("id", pid), pid, load)
+
+    async def get_by_username(self, username: str, load: Callable[[], Awaitable[Optional[UserX]]]) -> Optional[UserX]:
+        key = _username_key(username)
+        return await self._get(("username", key), self._by_username.get(key), load)
+
+    async def _get(self, flight_key: Tuple[str, str], pid: Optional[str], load) -> Optional[UserX]:
+        if not self.enabled:
+            return await load()
+
+        if pid is not None:
+            cached = self._lookup(pid)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        self.misses += 1
+
+        # Single flight: every caller for a cold key awaits the same read. It runs as its
+        # own task so a caller that disconnects does not cancel it for the others.
+        task = self._inflight.get(flight_key)
+        if task:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._load(flight_key, load))
+            self._inflight[flight_key] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, flight_key: Tuple[str, str], load) -> Optional[UserX]:
+        generation = self._generation
+        try:
+            profile = await load()
+        finally:
+            del self._inflight[flight_key]
+        # Missing profiles are not cached: /api/clone creates them right after a miss
+        if profile is not None and generation == self._generation:
+            self._store(profile)
+        return profile
+
+    def _lookup(self, pid: str) -> Optional[UserX]:
+        entry = self._entries.get(pid)
+        if entry is None:
+            return None
+        expires_at, profile = entry
+        if time.monotonic() >= expires_at:
+            self._drop(pid)
+            return None
+        self._entries.move_to_end(pid)
+        return profile
+
+    def _store(self, profile: UserX):
+        ttl = self.ttl_seconds if self.watching else self.fallback_ttl_seconds
+        self._drop(profile.id)
+        self._entries[profile.id] = (time.monotonic() + ttl, profile)
+        self._by_username[_username_key(profile.username)] = profile.id
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, pid: str) -> bool:
+        entry = self._entries.pop(pid, None)
+        if entry is None:
+            return False
+        key = _username_key(entry[1].username)
+        if self._by_username.get(key) == pid:
+            del self._by_username[key]
+        return True
+
+    def invalidate(self, pid: str):
+        self._generation += 1
+        if self._drop(pid):
+            self.invalidations += 1
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self._by_username.clear()
+
+    async def _watch_loop(self):
+        delay = WATCH_RETRY_SECONDS
+        warned = False
+        while True:
+            try:
+                # Only the key is needed; the next read reloads the document
+                async with self.collection.watch([{"$project": {"documentKey": 1, "operationType": 1}}]) as stream:
+                    self.watching = True
+                    delay = WATCH_RETRY_SECONDS
+                    warned = False
+                    logger.info("👀 Profile cache invalidated by change stream")
+                    async for change in stream:
+                        if change["operationType"] in ("drop", "rename", "dropDatabase", "invalidate"):
+                            self.clear()
+                        else:
+                            self.invalidate(change["documentKey"]["_id"])
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                if not warned:
+                    logger.warning(f"⚠️ Profile change stream unavailable, entries expire after {self.fallback_ttl_seconds}s: {e}")
+                    warned = True
+            # Whatever was cached under the long TTL may have missed invalidations
+            if self.watching:
+                self.watching = False
+                self.clear()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WATCH_RETRY_MAX_SECONDS)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "mode": "change_stream" if self.watching else "ttl_fallback",
+            "size": len(self._entries),
+            "capacity": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "miss_rate": round(self.misses / lookups, 3) if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
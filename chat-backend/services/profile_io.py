@@ -0,0 +1,207 @@
+import logging
+import time
+import uuid
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+import orjson
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config import PROFILE_IO_BATCH
+from database import db
+from models import UserX
+from services.chat_engine import compile_persona, prompt_hash
+from services.tag_catalog import tag_keys
+
+logger = logging.getLogger("ProfileIO")
+
+GZIP_MAGIC = b"\x1f\x8b"
+# Export chunks handed to the response, before compression
+EXPORT_CHUNK_BYTES = 64 * 1024
+# Errors kept in the report; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+# A line longer than this is not a profile; refuse it rather than buffer it
+MAX_LINE_BYTES = 1024 * 1024
+# Most bytes a gzip body may inflate to in one step, whatever the compression ratio
+INFLATE_CHUNK_BYTES = 64 * 1024
+
+# HttpUrl fields, stored as plain strings
+URL_FIELDS = {"url", "profile_image_url", "profile_banner_url"}
+
+# Imports running on this worker, for progress polling
+active_imports: Dict[str, "ProfileImport"] = {}
+
+
+async def export_ndjson(compress: bool = False, database=db) -> AsyncIterator[bytes]:
+    """
+    Every profile as one JSON line, straight from a cursor. Memory stays at one
+    cursor batch plus one output chunk no matter how large the collection is.
+    """
+    gz = zlib.compressobj(wbits=31) if compress else None
+    buf = bytearray()
+    async for doc in database.profiles.find({}, sort=[("_id", 1)], batch_size=PROFILE_IO_BATCH):
+        buf += orjson.dumps(doc)
+        buf += b"\n"
+        if len(buf) >= EXPORT_CHUNK_BYTES:
+            chunk = gz.compress(bytes(buf)) if gz else bytes(buf)
+            buf.clear()
+            if chunk:
+                yield chunk
+    tail = gz.compress(bytes(buf)) + gz.flush() if gz else bytes(buf)
+    if tail:
+        yield tail
+
+
+def _to_document(profile: UserX) -> Dict[str, Any]:
+    """What the crawler would have written for this profile."""
+    doc = profile.model_dump(by_alias=True)
+    doc.update(profile.model_dump(mode="json", include=URL_FIELDS))
+    doc["tag_keys"] = tag_keys(profile.tags)
+    doc["persona_prompt"] = compile_persona(profile)
+    doc["persona_version"] = prompt_hash(doc["persona_prompt"])
+    return doc
+
+
+class ProfileImport:
+    """
+    Upserts profiles from an NDJSON (optionally gzip) byte stream. Each line is
+    validated as a UserX; valid ones are written with one unordered bulk_write
+    per PROFILE_IO_BATCH lines, invalid ones are counted and skipped, and so are
+    rows the database refuses (e.g. a handle another profile already has). With
+    a tag_catalog, the tag changes of the rows that were written are applied to
+    it per batch. Progress is visible through active_imports while it runs.
+    """
+
+    def __init__(self, database=db, batch_size: int = PROFILE_IO_BATCH, tag_catalog=None, on_batch=None):
+        self.id = uuid.uuid4().hex
+        self.db = database
+        self.batch_size = batch_size
+        self.tag_catalog = tag_catalog
+        # Awaited with each written batch of UserX, e.g. to update the similarity index
+        self.on_batch = on_batch
+        self.started_at = time.time()
+        self.finished = False
+
+        self.lines = 0
+        self.upserted = 0
+        self.modified = 0
+        self.invalid = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    async def run(self, body: AsyncIterator[bytes]) -> Dict[str, Any]:
+        active_imports[self.id] = self
+        try:
+            # (line number, profile)
+            batch: List[Tuple[int, UserX]] = []
+            async for line in self._lines(body):
+                self.lines += 1
+                if not line.strip():
+                    continue
+                try:
+                    batch.append((self.lines, UserX.model_validate_json(line)))
+                except ValidationError as e:
+                    self._error(f"{e.error_count()} validation error(s): {e.errors()[0]['loc']} {e.errors()[0]['msg']}")
+                    continue
+                if len(batch) >= self.batch_size:
+                    await self._write(batch)
+                    batch = []
+            await self._write(batch)
+        finally:
+            self.finished = True
+            active_imports.pop(self.id, None)
+        logger.info(f"📥 Profile import {self.id} finished: {self.progress()}")
+        return self.progress()
+
+    async def _inflate(self, body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """The body, gunzipped if it is gzip, in pieces of at most INFLATE_CHUNK_BYTES."""
+        decoder = None
+        first = True
+        async for chunk in body:
+            if first and chunk:
+                # Accept gzip with or without Content-Encoding: sniff the magic bytes
+                if chunk[:2] == GZIP_MAGIC:
+                    decoder = zlib.decompressobj(wbits=47)
+                first = False
+            if not decoder:
+                yield chunk
+                continue
+            # Bounded, so a small body cannot inflate into memory before the line check sees it
+            data = decoder.decompress(chunk, INFLATE_CHUNK_BYTES)
+            while True:
+                yield data
+                if not decoder.unconsumed_tail:
+                    break
+                data = decoder.decompress(decoder.unconsumed_tail, INFLATE_CHUNK_BYTES)
+        if decoder:
+            yield decoder.flush()
+
+    async def _lines(self, body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        pending = b""
+        async for data in self._inflate(body):
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            if len(pending) > MAX_LINE_BYTES:
+                raise ValueError(f"Line {self.lines + len(lines) + 1} is longer than {MAX_LINE_BYTES} bytes")
+            for line in lines:
+                yield line
+        if pending:
+            yield pending
+
+    def _error(self, message: str):
+        self.invalid += 1
+        self._report(self.lines, message)
+
+    def _report(self, line: int, message: str):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    async def _write(self, rows: List[Tuple[int, UserX]]):
+        if not rows:
+            return
+        # Last line wins for a profile repeated within a batch (unordered writes have no "last")
+        rows = list({p.id: (line, p) for line, p in rows}.values())
+        previous = {}
+        if self.tag_catalog:
+            async for doc in self.db.profiles.find({"_id": {"$in": [p.id for _, p in rows]}}, {"tags": 1}):
+                previous[doc["_id"]] = doc.get("tags", [])
+        ops = [UpdateOne({"_id": p.id}, {"$set": _to_document(p)}, upsert=True) for _, p in rows]
+        rejected = set()
+        try:
+            result = await self.db.profiles.bulk_write(ops, ordered=False)
+            self.upserted += result.upserted_count
+            self.modified += result.modified_count
+        except BulkWriteError as e:
+            # Unordered: every op but the failed ones went through
+            self.upserted += e.details.get("nUpserted", 0)
+            self.modified += e.details.get("nModified", 0)
+            for error in e.details.get("writeErrors", []):
+                rejected.add(error["index"])
+                self.failed += 1
+                self._report(rows[error["index"]][0], error.get("errmsg", f"write error {error.get('code')}"))
+        batch = [p for i, (_, p) in enumerate(rows) if i not in rejected]
+        if self.tag_catalog:
+            await self.tag_catalog.apply_changes((previous.get(p.id, []), p.tags) for p in batch)
+        if self.on_batch and batch:
+            await self.on_batch(batch)
+
+    def progress(self) -> Dict[str, Any]:
+        elapsed = time.time() - self.started_at
+        return {
+            "id": self.id,
+            "finished": self.finished,
+            "lines": self.lines,
+            "upserted": self.upserted,
+            "modified": self.modified,
+            "invalid": self.invalid,
+            "failed": self.failed,
+            "errors": self.errors,
+            "elapsed_seconds": round(elapsed, 1),
+            "lines_per_second": round(self.lines / elapsed) if elapsed else 0,
+        }
+
+
+def import_progress() -> List[Dict[str, Any]]:
+    return [imp.progress() for imp in active_imports.values()]
@@ -1,25 +1,104 @@
-from typing import List, Optional, Dict, Any
-from models import UserX
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Tuple
+from pymongo import DESCENDING
+from config import TRUSTED_READS
+from models import UserX, ProfileSummary, construct_trusted
 from database import db
+from services.index_manager import USERNAME_COLLATION
+from services.profile_cache import ProfileCache
+from services.tag_catalog import TagCatalog, normalize_tag, tag_prefix_filter
+
+# Newest first, _id breaks ties so the keyset order is total
+LIST_SORT = [("fetched_at", DESCENDING), ("_id", DESCENDING)]
+# Only what a discovery card shows; skips system_prompt and the style analyses
+SUMMARY_PROJECTION = {(f.alias or name): 1 for name, f in ProfileSummary.model_fields.items()}
+
+def _encode_cursor(doc: Dict[str, Any]) -> str:
+    raw = json.dumps({"f": doc["fetched_at"].isoformat(), "i": doc["_id"]})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        fetched_at = datetime.fromisoformat(raw["f"])
+        last_id = raw["i"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid pagination cursor")
+    # Everything strictly after the last item in LIST_SORT order
+    return {"$or": [
+        {"fetched_at": {"$lt": fetched_at}},
+        {"fetched_at": fetched_at, "_id": {"$lt": last_id}},
+    ]}
 
 class ProfileManager:
-    async def get_all_profiles(self) -> List[UserX]:
-        cursor = db.profiles.find({})
-        profiles = await cursor.to_list(length=100)
-        return [UserX(**p) for p in profiles]
+    def __init__(self, cache: Optional[ProfileCache] = None):
+        self.cache = cache or ProfileCache(db.profiles)
+        self.tag_catalog = TagCatalog()
+
+    async def get_all_profiles(self, limit: int = 20, after: Optional[str] = None) -> Dict[str, Any]:
+        return await self._list_summaries({}, limit, after)
+
+    async def search_by_tag(self, tag: str, limit: int = 20, after: Optional[str] = None, prefix: bool = False) -> Dict[str, Any]:
+        # Matches the normalized tag_keys, so either form is a tag_keys index scan
+        match = tag_prefix_filter(tag) if prefix else normalize_tag(tag)
+        return await self._list_summaries({"tag_keys": match}, limit, after)
 
-    async def search_by_tag(self, tag: str) -> List[UserX]:
-        cursor = db.profiles.find({"tags": {"$regex": tag, "$options": "i"}})
-        profiles = await cursor.to_list(length=100)
-        return [UserX(**p) for p in profiles]
+    async def _list_summaries(self, query: Dict[str, Any], limit: int, after: Optional[str]) -> Dict[str, Any]:
+        """
+        Keyset pagination: cost depends on the page size, not on how deep the page is.
+        Returns a ProfilePage-shaped dict of the projected documents as stored, so the
+        endpoint can encode them directly or validate them through ProfilePage.
+        """
+        if after:
+            query = {"$and": [query, _decode_cursor(after)]} if query else _decode_cursor(after)
+        cursor = db.profiles.find(query, SUMMARY_PROJECTION, sort=LIST_SORT, limit=limit + 1)
+        docs = await cursor.to_list(length=limit + 1)
+
+        next_cursor = _encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+        return {"items": docs[:limit], "next_cursor": next_cursor}
+
+    async def get_summaries(self, pids: List[str]) -> List[Dict[str, Any]]:
+        """Projected summaries for `pids`, in the order given; missing ones are skipped."""
+        docs = await db.profiles.find({"_id": {"$in": pids}}, SUMMARY_PROJECTION).to_list(length=len(pids))
+        by_id = {d["_id"]: d for d in docs}
+        return [by_id[pid] for pid in pids if pid in by_id]
 
     async def get_profile_by_id(self, pid: str) -> Optional[UserX]:
-        data = await db.profiles.find_one({"_id": pid})
-        return UserX(**data) if data else None
+        return await self.cache.get_by_id(pid, lambda: self._load_by_id(pid))
 
     async def get_profile_by_username(self, username: str) -> Optional[UserX]:
-        data = await db.profiles.find_one({"username": username})
-        return UserX(**data) if data else None
+        return await self.cache.get_by_username(username, lambda: self._load_by_username(username))
+
+    async def _load_by_id(self, pid: str) -> Optional[UserX]:
+        data = await db.profiles.find_one({"_id": pid})
+        return self._to_model(data) if data else None
+
+    async def _load_by_username(self, username: str) -> Optional[UserX]:
+        # Handles are case-insensitive; the collation lets this use the username index
+        data = await db.profiles.find_one({"username": username}, collation=USERNAME_COLLATION)
+        return self._to_model(data) if data else None
+
+    @staticmethod
+    def _to_model(data: Dict[str, Any]) -> UserX:
+        # Profiles are validated by the crawler before they are written
+        return construct_trusted(UserX, data) if TRUSTED_READS else UserX(**data)
+
+    @staticmethod
+    def query_shapes() -> List[Tuple[str, str, Dict[str, Any], Dict[str, Any]]]:
+        """
+        (label, collection, filter, options) for every find() above, with sample values.
+        Used to explain() them at startup and flag any that would scan the collection.
+        """
+        return [
+            ("get_all_profiles", "profiles", {}, {"sort": LIST_SORT, "limit": 21}),
+            ("get_all_profiles (after)", "profiles", _decode_cursor(_encode_cursor({"fetched_at": datetime(2026, 1, 1), "_id": "0"})), {"sort": LIST_SORT, "limit": 21}),
+            ("search_by_tag", "profiles", {"tag_keys": "ai"}, {"sort": LIST_SORT, "limit": 21}),
+            ("search_by_tag (prefix)", "profiles", {"tag_keys": tag_prefix_filter("ai")}, {"sort": LIST_SORT, "limit": 21}),
+            ("get_profile_by_id", "profiles", {"_id": "0"}, {"limit": 1}),
+            ("get_profile_by_username", "profiles", {"username": "xai"}, {"collation": USERNAME_COLLATION, "limit": 1}),
+        ]
 
     async def get_complete_profile(self, username: str) -> Optional[Dict[str, Any]]:
         """
@@ -44,12 +123,7 @@ class ProfileManager:
             "prompt_attributes": prompt_attributes
         }
 
-    async def get_all_tags(self) -> List[str]:
-        pipeline = [
-            {"$unwind": "$tags"},
-            {"$group": {"_id": "$tags"}},
-            {"$project": {"_id": 0, "tag": "$_id"}}
-        ]
-        cursor = db.profiles.aggregate(pipeline)
-        tags = await cursor.to_list(length=1000)
-        return [tag["tag"] for tag in tags]
\ No newline at end of file
+    async def get_all_tags(self, prefix: str = "", limit: int = 1000) -> List[str]:
+        """Tag display names from the catalog, most used first; `prefix` narrows it for autocomplete."""
+        tags = await self.tag_catalog.top(prefix, limit)
+        return [tag["name"] for tag in tags]
\ No newline at end of file
@@ -0,0 +1,268 @@
+import asyncio
+import base64
+import json
+import logging
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi import WebSocket
+
+from config import RELAY_FAST_PATH, RELAY_LOG_EVENTS, RELAY_LOG_SAMPLE_RATE
+from services.relay_queue import RelayQueue
+from services.pcm_protocol import (
+    SUBPROTOCOLS,
+    AudioOutFramer,
+    extract_delta,
+    input_audio_event,
+    input_payload,
+)
+from services.audio_codecs import create_codec
+from services.chat_engine import prompt_hash as compute_prompt_hash
+
+logger = logging.getLogger("GrokRelay")
+
+AUDIO_DELTA = "response.audio.delta"
+AUDIO_APPEND = "input_audio_buffer.append"
+SESSION_UPDATE = "session.update"
+# session.update fields only the stored session sets; the browser's values are stripped
+PERSONA_KEYS = ("instructions", "voice")
+
+# The event type is always one of the first keys xAI sends, so never scan the
+# (potentially huge) base64 payload that follows it.
+_TYPE_SCAN_LIMIT = 256
+# A browser sending bad frames sends a lot of them; warn on the first and every Nth after
+DROPPED_FRAME_LOG_EVERY = 100
+
+
+def peek_event_type(message: str) -> Optional[str]:
+    """Cheap prefix scan for the top-level `type` of a realtime event, without parsing JSON."""
+    idx = message.find('"type"', 0, _TYPE_SCAN_LIMIT)
+    if idx < 0:
+        return None
+    i = idx + 6
+    n = len(message)
+    while i < n and message[i] in " \t\r\n:":
+        i += 1
+    if i >= n or message[i] != '"':
+        return None
+    end = message.find('"', i + 1)
+    if end < 0:
+        return None
+    return message[i + 1:end]
+
+
+class EventLogPolicy:
+    """Decides which relay events are worth decoding and writing to the log."""
+
+    def __init__(
+        self,
+        allowlist: Set[str] = RELAY_LOG_EVENTS,
+        sample_rate: float = RELAY_LOG_SAMPLE_RATE,
+    ):
+        self.allowlist = allowlist
+        self.sample_rate = sample_rate
+
+    def should_log(self, event_type: Optional[str]) -> bool:
+        if not logger.isEnabledFor(logging.INFO):
+            return False
+        if event_type in self.allowlist:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+
+class RelaySession:
+    """
+    Pumps frames between one browser socket and one xAI realtime socket.
+
+    Each direction is decoupled by a bounded RelayQueue, so a slow browser no
+    longer stalls the upstream reader (and vice versa).
+    """
+
+    def __init__(
+        self,
+        client_ws: WebSocket,
+        xai_ws,
+        fast_path: bool = RELAY_FAST_PATH,
+        log_policy: Optional[EventLogPolicy] = None,
+        subprotocol: Optional[str] = None,
+        prompt_hash: Optional[str] = None,
+        voice: Optional[str] = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.client_ws = client_ws
+        self.xai_ws = xai_ws
+        self.fast_path = fast_path
+        self.log_policy = log_policy or EventLogPolicy()
+        self.started_at = time.time()
+        # Browsers that negotiated a binary sub-protocol get (encoded) audio frames
+        self.subprotocol = subprotocol
+        self.codec = create_codec(SUBPROTOCOLS[subprotocol]) if subprotocol else None
+        self.audio_framer = AudioOutFramer() if self.codec else None
+        self.browser_bytes_in = 0
+        self.browser_bytes_out = 0
+        # The persona xAI was given from the stored session (ChatSession.prompt_hash and voice)
+        self.prompt_hash = prompt_hash
+        self.voice = voice
+        self.session_updates_skipped = 0
+        self.persona_overrides_blocked = 0
+        self.frames_dropped = 0
+
+        self.upstream = RelayQueue(audio_type=AUDIO_APPEND, audio_field="audio")
+        self.downstream = RelayQueue(audio_type=AUDIO_DELTA, audio_field="delta")
+
+    async def run(self):
+        active_sessions[self.id] = self
+        writers = [
+            asyncio.create_task(self.send_to_xai()),
+            asyncio.create_task(self.send_to_browser()),
+        ]
+        tasks = writers + [
+            asyncio.create_task(self.browser_to_xai()),
+            asyncio.create_task(self.xai_to_browser()),
+        ]
+        try:
+            # Readers close their queue when their socket goes away; the writer
+            # drains what is left, and whichever direction finishes first ends the session
+            await asyncio.wait(writers, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            active_sessions.pop(self.id, None)
+            logger.info(f"🔚 Relay session {self.id} closed: {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "age_seconds": round(time.time() - self.started_at, 1),
+            "subprotocol": self.subprotocol,
+            "browser_bytes_in": self.browser_bytes_in,
+            "browser_bytes_out": self.browser_bytes_out,
+            "session_updates_skipped": self.session_updates_skipped,
+            "persona_overrides_blocked": self.persona_overrides_blocked,
+            "frames_dropped": self.frames_dropped,
+            "codec_ms": round(self.codec.codec_seconds * 1000, 2) if self.codec else None,
+            "upstream": self.upstream.stats(),
+            "downstream": self.downstream.stats(),
+        }
+
+    async def browser_to_xai(self):
+        try:
+            while True:
+                message = await self.client_ws.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                data = message.get("text")
+                if data is None:
+                    frame = message["bytes"]
+                    self.browser_bytes_in += len(frame)
+                    if not self.codec:
+                        continue
+                    try:
+                        pcm = await self.codec.decode(input_payload(frame))
+                    except ValueError as e:
+                        # One malformed frame is dropped; the rest of the stream is still good
+                        self.frames_dropped += 1
+                        if self.frames_dropped % DROPPED_FRAME_LOG_EVERY == 1:
+                            logger.warning(f"⚠️ Dropped bad binary frame from browser ({self.frames_dropped} so far): {e}")
+                        continue
+                    data = input_audio_event(pcm)
+                    event_type = AUDIO_APPEND
+                else:
+                    self.browser_bytes_in += len(data)
+                    event_type = peek_event_type(data)
+                    # A type the prefix scan cannot see could still be a session.update
+                    if event_type == SESSION_UPDATE or (event_type is None and SESSION_UPDATE in data):
+                        data = self._without_persona(data)
+                        if data is None:
+                            self.session_updates_skipped += 1
+                            continue
+                    if not self.fast_path or self.log_policy.should_log(event_type):
+                        logger.info(f"⬆️ Sending to xAI: {data[:100]}...")
+                await self.upstream.put(data, event_type)
+        except Exception as e:
+            logger.error(f"Error reading from browser: {e}")
+        finally:
+            self.upstream.close()
+
+    def _without_persona(self, data: str) -> Optional[str]:
+        """
+        A browser session.update minus instructions and voice, which only the
+        stored session sets. None when nothing is left to forward (e.g. the client
+        re-sent the persona it was given).
+        """
+        try:
+            event = json.loads(data)
+        except ValueError:
+            return data
+        session = event.get("session") if isinstance(event, dict) and event.get("type") == SESSION_UPDATE else None
+        if not isinstance(session, dict) or not any(key in session for key in PERSONA_KEYS):
+            return data
+        instructions = session.pop("instructions", None)
+        voice = session.pop("voice", None)
+        if (instructions is not None and compute_prompt_hash(str(instructions)) != self.prompt_hash) or (voice is not None and voice != self.voice):
+            self.persona_overrides_blocked += 1
+            logger.warning(f"⚠️ Relay session {self.id}: ignored a browser attempt to change the persona")
+        if not session and set(event) <= {"type", "session"}:
+            return None
+        return json.dumps(event)
+
+    async def send_to_xai(self):
+        try:
+            while (data := await self.upstream.get()) is not None:
+                await self.xai_ws.send(data)
+        except Exception as e:
+            logger.error(f"Error Browser->xAI: {e}")
+
+    async def xai_to_browser(self):
+        try:
+            async for message in self.xai_ws:
+                if isinstance(message, str):
+                    if self.fast_path:
+                        event_type = peek_event_type(message)
+                        if self.log_policy.should_log(event_type):
+                            logger.info(f"⬇️ Received from xAI: {json.dumps(json.loads(message), indent=2)}")
+                    else:
+                        msg_data = json.loads(message)
+                        event_type = msg_data.get('type')
+                        if event_type != AUDIO_DELTA:
+                            logger.info(f"⬇️ Received from xAI: {json.dumps(msg_data, indent=2)}")
+                else:
+                    # Binary data is passed through as-is and never dropped
+                    event_type = None
+
+                await self.downstream.put(message, event_type)
+        except Exception as e:
+            logger.error(f"Error xAI->Browser: {e}")
+        finally:
+            self.downstream.close()
+
+    async def send_to_browser(self):
+        try:
+            while (message := await self.downstream.get()) is not None:
+                if isinstance(message, str):
+                    if self.codec and peek_event_type(message) == AUDIO_DELTA:
+                        delta = extract_delta(message)
+                        if delta is not None:
+                            for payload in await self.codec.encode(base64.b64decode(delta)):
+                                frame = self.audio_framer.frame(payload)
+                                self.browser_bytes_out += len(frame)
+                                await self.client_ws.send_bytes(frame)
+                            continue
+                    self.browser_bytes_out += len(message)
+                    await self.client_ws.send_text(message)
+                else:
+                    self.browser_bytes_out += len(message)
+                    await self.client_ws.send_bytes(message)
+        except Exception as e:
+            logger.error(f"Error sending to browser: {e}")
+
+
+# Live sessions on this worker, keyed by RelaySession.id
+active_sessions: Dict[str, RelaySession] = {}
+
+
+def relay_stats() -> List[Dict[str, Any]]:
+    return [session.stats() for session in active_sessions.values()]
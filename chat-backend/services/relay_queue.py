@@ -0,0 +1,176 @@
+import asyncio
+import base64
+import json
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Union
+
+from config import (
+    RELAY_QUEUE_MAXSIZE,
+    RELAY_QUEUE_POLICY,
+    RELAY_AUDIO_LATENCY_BUDGET_MS,
+    RELAY_COALESCE_MAX_BYTES,
+)
+
+POLICY_BLOCK = "block"
+POLICY_DROP_AUDIO = "drop_audio"
+
+# Keys that legitimately differ between two audio events we are allowed to merge
+_MERGE_IGNORED_KEYS = {"event_id"}
+
+
+class Frame:
+    __slots__ = ("data", "event_type", "is_audio", "enqueued_at")
+
+    def __init__(self, data: Union[str, bytes], event_type: Optional[str], is_audio: bool):
+        self.data = data
+        self.event_type = event_type
+        self.is_audio = is_audio
+        self.enqueued_at = time.monotonic()
+
+
+class RelayQueue:
+    """
+    Bounded single-producer/single-consumer queue for one relay direction.
+
+    Audio frames may be merged when the consumer is behind, dropped once they are
+    older than the latency budget, or evicted to make room. Control frames are
+    never dropped: when only control frames are queued, the producer waits.
+    """
+
+    def __init__(
+        self,
+        audio_type: str,
+        audio_field: str,
+        maxsize: int = RELAY_QUEUE_MAXSIZE,
+        policy: str = RELAY_QUEUE_POLICY,
+        latency_budget_ms: int = RELAY_AUDIO_LATENCY_BUDGET_MS,
+        coalesce_max_bytes: int = RELAY_COALESCE_MAX_BYTES,
+    ):
+        if policy not in (POLICY_BLOCK, POLICY_DROP_AUDIO):
+            raise ValueError(f"Unknown relay queue policy: {policy}")
+        self.audio_type = audio_type
+        self.audio_field = audio_field
+        self.maxsize = maxsize
+        self.policy = policy
+        self.latency_budget = latency_budget_ms / 1000.0
+        self.coalesce_max_bytes = coalesce_max_bytes
+
+        self._frames: Deque[Frame] = deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._closed = False
+
+        self.enqueued = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped_stale = 0
+        self.dropped_overflow = 0
+        self.max_depth = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def close(self):
+        """Producer is done; the consumer drains what is left and then sees None."""
+        self._closed = True
+        self._not_empty.set()
+
+    async def put(self, data: Union[str, bytes], event_type: Optional[str]):
+        frame = Frame(data, event_type, event_type == self.audio_type)
+        while len(self._frames) >= self.maxsize:
+            if self.policy == POLICY_DROP_AUDIO:
+                if self._evict_oldest_audio():
+                    break
+                if frame.is_audio:
+                    self.dropped_overflow += 1
+                    return
+            self._not_full.clear()
+            await self._not_full.wait()
+
+        self._frames.append(frame)
+        self.enqueued += 1
+        if len(self._frames) > self.max_depth:
+            self.max_depth = len(self._frames)
+        self._not_empty.set()
+
+    async def get(self) -> Optional[Union[str, bytes]]:
+        """Next frame to send, with queued audio merged into it. None once closed and drained."""
+        while True:
+            while not self._frames:
+                if self._closed:
+                    return None
+                self._not_empty.clear()
+                await self._not_empty.wait()
+
+            frame = self._frames.popleft()
+            self._not_full.set()
+
+            if frame.is_audio:
+                if time.monotonic() - frame.enqueued_at > self.latency_budget:
+                    self.dropped_stale += 1
+                    continue
+                if self._frames and self._frames[0].is_audio:
+                    self.delivered += 1
+                    return self._coalesce(frame)
+
+            self.delivered += 1
+            return frame.data
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": len(self._frames),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "coalesced": self.coalesced,
+            "dropped_stale": self.dropped_stale,
+            "dropped_overflow": self.dropped_overflow,
+        }
+
+    def _evict_oldest_audio(self) -> bool:
+        for i, queued in enumerate(self._frames):
+            if queued.is_audio:
+                del self._frames[i]
+                self.dropped_overflow += 1
+                return True
+        return False
+
+    def _coalesce(self, first: Frame) -> Union[str, bytes]:
+        """Merge the run of queued audio events behind `first` into one event."""
+        try:
+            head = json.loads(first.data)
+        except (TypeError, ValueError):
+            return first.data
+
+        chunks = [head.get(self.audio_field) or ""]
+        size = len(chunks[0])
+        fixed = {k: v for k, v in head.items() if k not in _MERGE_IGNORED_KEYS and k != self.audio_field}
+
+        while self._frames and self._frames[0].is_audio and size < self.coalesce_max_bytes:
+            try:
+                nxt = json.loads(self._frames[0].data)
+            except (TypeError, ValueError):
+                break
+            # Only merge deltas that belong to the same response item
+            if {k: v for k, v in nxt.items() if k not in _MERGE_IGNORED_KEYS and k != self.audio_field} != fixed:
+                break
+            self._frames.popleft()
+            chunk = nxt.get(self.audio_field) or ""
+            chunks.append(chunk)
+            size += len(chunk)
+            self.coalesced += 1
+
+        self._not_full.set()
+        if len(chunks) == 1:
+            return first.data
+        head[self.audio_field] = _concat_base64(chunks)
+        return json.dumps(head)
+
+
+def _concat_base64(chunks) -> str:
+    # Unpadded base64 strings can simply be joined; padding forces a round trip
+    if all(not c.endswith("=") for c in chunks[:-1]):
+        return "".join(chunks)
+    return base64.b64encode(b"".join(base64.b64decode(c) for c in chunks)).decode("ascii")
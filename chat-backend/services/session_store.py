@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from config import SESSION_WRITE_BATCH, SESSION_WRITE_INTERVAL_MS, SESSION_WRITE_MAX_ATTEMPTS
+from database import db
+from models import ChatSession, construct_trusted
+
+logger = logging.getLogger("SessionStore")
+
+DUPLICATE_KEY = 11000
+
+
+def _could_be_session_id(session_id: str) -> bool:
+    """ChatSession ids are uuid4 strings; anything else is not worth waiting for."""
+    try:
+        return str(uuid.UUID(session_id, version=4)) == session_id
+    except ValueError:
+        return False
+
+
+class SessionStore:
+    """
+    ChatSession records in `sessions`. Writes never block the caller: they are
+    queued and a background writer flushes them in batches, inserts first and
+    then updates, each with one unordered bulk_write. Sessions created on this
+    worker are readable straight away and stay readable from memory until their
+    insert is acknowledged. Failed writes are retried with back-off.
+    """
+
+    def __init__(
+        self,
+        database=db,
+        batch_size: int = SESSION_WRITE_BATCH,
+        interval_ms: int = SESSION_WRITE_INTERVAL_MS,
+        max_attempts: int = SESSION_WRITE_MAX_ATTEMPTS,
+    ):
+        self.db = database
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000
+        self.max_attempts = max_attempts
+
+        # (op, session_id, attempts so far)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # Created here but not acknowledged by Mongo yet
+        self._pending: Dict[str, ChatSession] = {}
+        self._writer_task: Optional[asyncio.Task] = None
+        self._failures_in_row = 0
+
+        self.batches = 0
+        self.written = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def start(self):
+        if not self._writer_task:
+            self._writer_task = asyncio.create_task(self._writer_loop())
+
+    async def stop(self):
+        if self._writer_task:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+        # Don't lose what was queued before shutdown; every retry counts an attempt, so this ends
+        while not self._queue.empty():
+            await self._flush(self._drain())
+
+    def create(self, session: ChatSession):
+        self._pending[session.id] = session
+        self._queue.put_nowait((InsertOne(session.model_dump(by_alias=True)), session.id, 0))
+
+    def update(self, session_id: str, fields: Dict[str, Any]):
+        self._queue.put_nowait((UpdateOne({"_id": session_id}, {"$set": fields}), session_id, 0))
+
+    async def get(self, session_id: str) -> Optional[ChatSession]:
+        session = self._pending.get(session_id)
+        if session is None:
+            data = await self.db.sessions.find_one({"_id": session_id})
+            if data is None and _could_be_session_id(session_id):
+                # Created on another worker a moment ago: give its writer one flush to catch up
+                await asyncio.sleep(self.interval * 2)
+                data = await self.db.sessions.find_one({"_id": session_id})
+            session = construct_trusted(ChatSession, data) if data else None
+        # The TTL monitor only sweeps once a minute, and never sees pending sessions
+        if session is None or session.expires_at <= datetime.utcnow():
+            return None
+        return session
+
+    def _drain(self, limit: Optional[int] = None) -> List[Tuple[Any, str, int]]:
+        limit = self.batch_size if limit is None else limit
+        items = []
+        while len(items) < limit and not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        return items
+
+    async def _writer_loop(self):
+        while True:
+            items = [await self._queue.get()]
+            # Let a batch build up, unless it is already full
+            if self._queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.interval)
+            items += self._drain(self.batch_size - 1)
+            await self._flush(items)
+            if self._failures_in_row:
+                await asyncio.sleep(min(self.interval * 2 ** self._failures_in_row, 5.0))
+
+    async def _flush(self, items: List[Tuple[Any, str, int]]):
+        if not items:
+            return
+        started = time.perf_counter()
+        inserts = [item for item in items if isinstance(item[0], InsertOne)]
+        updates = [item for item in items if not isinstance(item[0], InsertOne)]
+
+        failed = await self._write(inserts)
+        failed_ids = {session_id for _, session_id, _ in failed}
+        for _, session_id, _ in inserts:
+            if session_id not in failed_ids:
+                self._pending.pop(session_id, None)
+
+        # An update before its insert would match nothing: hold it until the insert lands
+        ready = [item for item in updates if item[1] not in self._pending]
+        for item in updates:
+            if item[1] in self._pending:
+                self._queue.put_nowait(item)
+        failed += await self._write(ready)
+
+        self._retry(failed)
+        self._failures_in_row = self._failures_in_row + 1 if failed else 0
+        self.batches += 1
+        logger.debug(f"💾 Flushed {len(items)} session writes in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    async def _write(self, items: List[Tuple[Any, str, int]]) -> List[Tuple[Any, str, int]]:
+        """One unordered bulk_write; returns the items that did not land."""
+        if not items:
+            return []
+        try:
+            result = await self.db.sessions.bulk_write([op for op, _, _ in items], ordered=False)
+            self.written += result.inserted_count + result.modified_count
+            return []
+        except BulkWriteError as e:
+            details = e.details
+            self.written += details.get("nInserted", 0) + details.get("nModified", 0)
+            # A duplicate key on an insert means an earlier attempt already landed
+            failed = sorted({err["index"] for err in details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY})
+            if failed:
+                logger.warning(f"⚠️ {len(failed)} of {len(items)} session writes failed: {details['writeErrors'][0].get('errmsg')}")
+            return [items[i] for i in failed]
+        except PyMongoError as e:
+            logger.warning(f"⚠️ Session batch of {len(items)} failed: {e}")
+            return items
+
+    def _retry(self, items: List[Tuple[Any, str, int]]):
+        for op, session_id, attempts in items:
+            if attempts + 1 < self.max_attempts:
+                self.retried += 1
+                self._queue.put_nowait((op, session_id, attempts + 1))
+                continue
+            self.failed += 1
+            logger.error(f"❌ Giving up on a session write for {session_id} after {self.max_attempts} attempts")
+            if isinstance(op, InsertOne):
+                self._pending.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "pending_inserts": len(self._pending),
+            "batches": self.batches,
+            "written": self.written,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
@@ -0,0 +1,333 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import uuid
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    SIMILARITY_INDEX_PATH,
+    SIMILARITY_DIM,
+    SIMILARITY_REFRESH_SECONDS,
+    SIMILARITY_PRUNE_SECONDS,
+)
+from database import db
+
+logger = logging.getLogger("SimilarityIndex")
+
+_TOKEN = re.compile(r"[a-z0-9#@']+")
+
+# How much each profile field counts towards similarity
+FIELD_WEIGHTS = {
+    "tags": 3.0,
+    "description": 2.0,
+    "system_prompt": 1.0,
+    "typing_style": 0.5,
+    "speech_style": 0.5,
+    "behavior_summary": 0.5,
+}
+PROFILE_TEXT_PROJECTION = {field: 1 for field in FIELD_WEIGHTS} | {"fetched_at": 1}
+# Another worker's superseded matrix file is deleted once it is this old
+STALE_MATRIX_SECONDS = 3600
+
+
+class HashingVectorizer:
+    """
+    Offline feature hashing: unigrams and bigrams go to one of `dim` signed
+    buckets via CRC32 (stable across processes, unlike hash()), with sublinear
+    term frequency and L2 normalization so a dot product is cosine similarity.
+    """
+
+    def __init__(self, dim: int = SIMILARITY_DIM):
+        self.dim = dim
+
+    def _add(self, vec: np.ndarray, text: str, weight: float):
+        tokens = _TOKEN.findall(text.lower())
+        counts: Dict[str, int] = {}
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            counts[feature] = counts.get(feature, 0) + 1
+        for feature, count in counts.items():
+            h = zlib.crc32(feature.encode())
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vec[h % self.dim] += sign * weight * (1.0 + np.log(count))
+
+    def transform(self, doc: Dict[str, Any]) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for field, weight in FIELD_WEIGHTS.items():
+            value = doc.get(field)
+            if not value:
+                continue
+            if isinstance(value, list):
+                # Tags are matched whole as well as word by word
+                value = " ".join(value) + " " + " ".join(t.replace(" ", "_") for t in value)
+            self._add(vec, value, weight)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+
+class SimilarityIndex:
+    """
+    In-memory matrix of hashed profile vectors (one row per profile) for
+    nearest-neighbour queries with a single mat-vec product.
+
+    Rows are added or replaced as the crawler writes profiles. Profiles written
+    by other workers are picked up by a periodic catch-up on fetched_at. The
+    matrix is saved as .npy + ids JSON and memory-mapped (copy-on-write) on the
+    next start, so startup does not re-vectorize every profile. Deleted profiles
+    are dropped by a periodic prune against the ids in `profiles`.
+    """
+
+    def __init__(
+        self,
+        database=db,
+        path: str = SIMILARITY_INDEX_PATH,
+        dim: int = SIMILARITY_DIM,
+        refresh_seconds: float = SIMILARITY_REFRESH_SECONDS,
+        prune_seconds: float = SIMILARITY_PRUNE_SECONDS,
+    ):
+        self.db = database
+        self.path = path
+        self.vectorizer = HashingVectorizer(dim)
+        self.refresh_seconds = refresh_seconds
+        self.prune_seconds = prune_seconds
+        self._pruned_at = time.monotonic()
+
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        # Newest fetched_at already indexed; catch-up reads everything after it
+        self.watermark: Optional[datetime] = None
+        self._dirty = False
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, profile_id: str) -> bool:
+        return profile_id in self._rows
+
+    async def start(self):
+        if not self._load():
+            await self.rebuild()
+        else:
+            await self.catch_up()
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+        if self._dirty:
+            await self.save()
+
+    # --- Updates ---
+
+    def upsert(self, profile_id: str, doc: Dict[str, Any], vec: Optional[np.ndarray] = None):
+        if vec is None:
+            vec = self.vectorizer.transform(doc)
+        row = self._rows.get(profile_id)
+        if row is None:
+            row = len(self._ids)
+            if row == self._matrix.shape[0]:
+                # Amortized growth; also turns a read-only mmap into a private array
+                grown = np.zeros((max(1024, row * 2), self.vectorizer.dim), dtype=np.float32)
+                grown[:row] = self._matrix[:row]
+                self._matrix = grown
+            self._ids.append(profile_id)
+            self._rows[profile_id] = row
+        self._matrix[row] = vec
+        # The watermark is only moved by catch_up(): a local write says nothing about
+        # what other workers wrote before it
+        self._dirty = True
+
+    def upsert_profile(self, profile):
+        """Crawler hook: index a UserX as it was just written."""
+        self.upsert(profile.id, profile.model_dump(include=set(PROFILE_TEXT_PROJECTION)))
+
+    async def upsert_profiles(self, profiles):
+        """Bulk variant for imports: vectorizes off the event loop, then swaps the rows in."""
+        docs = [(p.id, p.model_dump(include=set(PROFILE_TEXT_PROJECTION))) for p in profiles]
+        vectors = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: [self.vectorizer.transform(doc) for _, doc in docs]
+        )
+        for (pid, doc), vec in zip(docs, vectors):
+            self.upsert(pid, doc, vec)
+
+    def remove(self, profile_ids: List[str]) -> int:
+        """Drop rows; the last row moves into each freed slot, so the matrix stays dense."""
+        removed = 0
+        for pid in profile_ids:
+            row = self._rows.pop(pid, None)
+            if row is None:
+                continue
+            last = len(self._ids) - 1
+            if row != last:
+                # Fine on a loaded index too: the mmap is copy-on-write
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = self._ids[last]
+                self._rows[self._ids[row]] = row
+            self._ids.pop()
+            removed += 1
+        if removed:
+            self._dirty = True
+        return removed
+
+    async def prune(self) -> int:
+        """Remove profiles that no longer exist in `profiles` (deletes leave no fetched_at to catch up on)."""
+        existing = set()
+        async for doc in self.db.profiles.find({}, {"_id": 1}):
+            existing.add(doc["_id"])
+        removed = self.remove([pid for pid in self._ids if pid not in existing])
+        if removed:
+            logger.info(f"🧭 Similarity index pruned {removed} deleted profiles")
+        return removed
+
+    async def catch_up(self) -> int:
+        """Index profiles written (on any worker) since the watermark."""
+        # $gte: re-indexing a profile is idempotent, missing one written in the same millisecond is not
+        query = {"fetched_at": {"$gte": self.watermark}} if self.watermark else {}
+        count = 0
+        newest = self.watermark
+        async for doc in self.db.profiles.find(query, PROFILE_TEXT_PROJECTION):
+            fetched_at = doc.get("fetched_at")
+            if fetched_at and (newest is None or fetched_at > newest):
+                newest = fetched_at
+            if fetched_at == self.watermark and doc["_id"] in self._rows:
+                continue
+            self.upsert(doc["_id"], doc)
+            count += 1
+        self.watermark = newest
+        return count
+
+    async def rebuild(self) -> int:
+        started = time.perf_counter()
+        self._matrix = np.zeros((0, self.vectorizer.dim), dtype=np.float32)
+        self._ids, self._rows, self.watermark = [], {}, None
+        count = await self.catch_up()
+        logger.info(f"🧭 Similarity index built: {count} profiles in {time.perf_counter() - started:.1f}s")
+        await self.save()
+        return count
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.catch_up()
+                if time.monotonic() - self._pruned_at >= self.prune_seconds:
+                    self._pruned_at = time.monotonic()
+                    await self.prune()
+                if self._dirty:
+                    await self.save()
+            except Exception as e:
+                logger.warning(f"⚠️ Similarity index refresh failed: {e}")
+
+    # --- Queries ---
+
+    def similar(self, profile_id: str, k: int = 10) -> List[Tuple[str, float]]:
+        row = self._rows.get(profile_id)
+        if row is None:
+            return []
+        return self._top_k(self._matrix[row], k, exclude=row)
+
+    def search(self, doc: Dict[str, Any], k: int = 10) -> List[Tuple[str, float]]:
+        return self._top_k(self.vectorizer.transform(doc), k)
+
+    def _top_k(self, vec: np.ndarray, k: int, exclude: Optional[int] = None) -> List[Tuple[str, float]]:
+        n = len(self._ids)
+        if n == 0:
+            return []
+        scores = self._matrix[:n] @ vec
+        if exclude is not None:
+            scores[exclude] = -np.inf
+        k = min(k, n - (exclude is not None))
+        if k <= 0:
+            return []
+        top = np.argpartition(scores, n - k)[n - k:]
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[i], float(scores[i])) for i in top]
+
+    # --- Persistence ---
+
+    async def save(self):
+        """
+        Snapshot the rows on the loop (a memcpy), write them in the default
+        executor. The matrix goes to a file named for this save and the ids JSON,
+        renamed into place last, points at it, so a reader always gets a matrix
+        and id list from the same save, whichever worker wrote it.
+        """
+        n = len(self._ids)
+        matrix = np.array(self._matrix[:n])
+        meta = {
+            "dim": self.vectorizer.dim,
+            "ids": list(self._ids),
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+        }
+        self._dirty = False
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_files, matrix, meta)
+        except Exception:
+            self._dirty = True
+            raise
+
+    def _write_files(self, matrix: np.ndarray, meta: Dict[str, Any]):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        generation = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        matrix_file = f"{os.path.basename(self.path)}.{generation}.npy"
+        with open(os.path.join(directory, matrix_file), "wb") as f:
+            np.save(f, matrix)
+        # Per-process temp name: workers sharing the path never write the same file
+        tmp = f"{self.path}.json.{generation}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({**meta, "matrix": matrix_file}, f)
+        os.replace(tmp, self.path + ".json")
+        self._remove_stale_matrices(directory, keep=matrix_file)
+
+    def _remove_stale_matrices(self, directory: str, keep: str):
+        # Our previous save right away; other workers' only once no reader can be about to open them
+        prefix = os.path.basename(self.path) + "."
+        mine = f"{prefix}{os.getpid()}-"
+        cutoff = time.time() - STALE_MATRIX_SECONDS
+        for entry in os.scandir(directory):
+            if not entry.name.startswith(prefix) or not entry.name.endswith(".npy") or entry.name == keep:
+                continue
+            try:
+                if entry.name.startswith(mine) or entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _load(self) -> bool:
+        try:
+            with open(self.path + ".json") as f:
+                meta = json.load(f)
+            # Unlinking a file that is mapped here is safe: the mapping keeps it alive
+            matrix = np.load(os.path.join(os.path.dirname(self.path), meta["matrix"]), mmap_mode="c")
+        except (OSError, ValueError, KeyError):
+            return False
+        if meta["dim"] != self.vectorizer.dim or matrix.shape[0] != len(meta["ids"]):
+            logger.warning("⚠️ Similarity index on disk does not match the config, rebuilding")
+            return False
+        self._matrix = matrix
+        self._ids = meta["ids"]
+        self._rows = {pid: i for i, pid in enumerate(self._ids)}
+        self.watermark = datetime.fromisoformat(meta["watermark"]) if meta["watermark"] else None
+        logger.info(f"🧭 Similarity index loaded: {len(self._ids)} profiles")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "profiles": len(self._ids),
+            "dim": self.vectorizer.dim,
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+        }
@@ -0,0 +1,154 @@
+import logging
+import re
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Tuple
+
+from pymongo import DESCENDING, UpdateOne
+
+from database import db
+from services.index_manager import INDEX_SPECS
+
+logger = logging.getLogger("TagCatalog")
+
+_WHITESPACE = re.compile(r"\s+")
+# Profiles per tag_keys bulk_write, and tags per insert_many, during a rebuild
+REBUILD_CHUNK = 1000
+# `meta` document recording that the catalog has been built for this database
+BUILT_MARKER = "tag_catalog"
+
+
+def normalize_tag(tag: str) -> str:
+    """Catalog key for a tag: "  Machine   Learning " and "machine learning" are the same tag."""
+    return _WHITESPACE.sub(" ", tag).strip().casefold()
+
+
+def tag_keys(tags: Iterable[str]) -> List[str]:
+    """Normalized, de-duplicated keys for a profile's tags, stored alongside them as `tag_keys`."""
+    return list(dict.fromkeys(key for key in map(normalize_tag, tags) if key))
+
+
+def tag_prefix_filter(prefix: str) -> Dict[str, Any]:
+    # Anchored and case-sensitive on an already-normalized key, so it is an index range scan
+    return {"$regex": "^" + re.escape(normalize_tag(prefix))}
+
+
+class TagCatalog:
+    """
+    Materialized `tags` collection: one document per normalized tag,
+    {_id: key, name: display name, count: profiles carrying it}. Kept current by
+    apply_change() on every profile upsert, so listing and autocomplete never
+    have to aggregate over `profiles`.
+    """
+
+    def __init__(self, database=db):
+        self.db = database
+
+    async def apply_change(self, old_tags: Iterable[str], new_tags: Iterable[str]):
+        """Adjust counts for one profile whose tags went from old_tags to new_tags."""
+        await self.apply_changes([(old_tags, new_tags)])
+
+    async def apply_changes(self, changes: Iterable[Tuple[Iterable[str], Iterable[str]]]):
+        """
+        apply_change() for many profiles at once: the (old_tags, new_tags) diffs are
+        summed per tag and written with one bulk_write.
+        """
+        deltas: Dict[str, int] = {}
+        names: Dict[str, str] = {}
+        for old_tags, new_tags in changes:
+            new_tags = list(new_tags)
+            old_keys = set(tag_keys(old_tags))
+            # First spelling wins as the display name, matching tag_keys() order
+            new_names = {normalize_tag(t): t.strip() for t in reversed(new_tags)}
+            for key in tag_keys(new_tags):
+                if key not in old_keys:
+                    deltas[key] = deltas.get(key, 0) + 1
+                    names.setdefault(key, new_names[key])
+            for key in old_keys:
+                if key not in new_names:
+                    deltas[key] = deltas.get(key, 0) - 1
+        ops = [
+            UpdateOne({"_id": key}, {"$inc": {"count": delta}, "$setOnInsert": {"name": names[key]}}, upsert=True)
+            if delta > 0 else UpdateOne({"_id": key}, {"$inc": {"count": delta}})
+            for key, delta in deltas.items() if delta
+        ]
+        if not ops:
+            return
+        await self.db.tags.bulk_write(ops, ordered=False)
+        removed = [key for key, delta in deltas.items() if delta < 0]
+        if removed:
+            await self.db.tags.delete_many({"_id": {"$in": removed}, "count": {"$lte": 0}})
+
+    async def top(self, prefix: str = "", limit: int = 50) -> List[Dict[str, Any]]:
+        """Most used tags first, optionally only those starting with `prefix` (autocomplete)."""
+        query = {"_id": tag_prefix_filter(prefix)} if normalize_tag(prefix) else {}
+        cursor = self.db.tags.find(query, sort=[("count", DESCENDING), ("_id", 1)], limit=limit)
+        return await cursor.to_list(length=limit)
+
+    async def rebuild(self) -> int:
+        """
+        Recompute the catalog and every profile's `tag_keys` from scratch. Only needed
+        for data written before the catalog existed; returns the number of tags.
+
+        The new catalog is built in a scratch collection and renamed over `tags`, so
+        readers never see it empty or half-built. Memory is one chunk of profile
+        updates plus the per-tag counts.
+        """
+        counts: Dict[str, Dict[str, Any]] = {}
+        ops = []
+        profiles = 0
+        async for doc in self.db.profiles.find({}, {"tags": 1}):
+            keys = tag_keys(doc.get("tags", []))
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"tag_keys": keys}}))
+            names = {normalize_tag(t): t.strip() for t in reversed(doc.get("tags", []))}
+            for key in keys:
+                counts.setdefault(key, {"name": names[key], "count": 0})["count"] += 1
+            profiles += 1
+            if len(ops) >= REBUILD_CHUNK:
+                await self.db.profiles.bulk_write(ops, ordered=False)
+                ops = []
+        if ops:
+            await self.db.profiles.bulk_write(ops, ordered=False)
+
+        if not counts:
+            await self.db.tags.delete_many({})
+        else:
+            scratch = self.db[f"tags_rebuild_{uuid.uuid4().hex[:8]}"]
+            docs = [{"_id": key, **entry} for key, entry in counts.items()]
+            for i in range(0, len(docs), REBUILD_CHUNK):
+                await scratch.insert_many(docs[i:i + REBUILD_CHUNK])
+            # rename() replaces the target's indexes with the scratch collection's
+            await scratch.create_indexes(INDEX_SPECS["tags"])
+            await scratch.rename("tags", dropTarget=True)
+        await self._mark_built()
+        logger.info(f"🏷️ Tag catalog rebuilt: {len(counts)} tags from {profiles} profiles")
+        return len(counts)
+
+    async def ensure_built(self):
+        """
+        Rebuild once if profiles exist but the catalog was never populated. Whether
+        it was is recorded in `meta`, not inferred from `tags`: profiles without any
+        tags leave the catalog empty, and that must not mean a rebuild every start.
+        """
+        if await self.db.meta.find_one({"_id": BUILT_MARKER}, {"_id": 1}):
+            return
+        if await self.db.tags.estimated_document_count() == 0 and await self.db.profiles.find_one({}, {"_id": 1}):
+            await self.rebuild()
+        else:
+            # Nothing to build from yet, or built before the marker existed
+            await self._mark_built()
+
+    async def _mark_built(self):
+        await self.db.meta.update_one(
+            {"_id": BUILT_MARKER},
+            {"$set": {"built_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    @staticmethod
+    def query_shapes() -> List[Tuple[str, str, Dict[str, Any], Dict[str, Any]]]:
+        sort = [("count", DESCENDING), ("_id", 1)]
+        return [
+            ("tags.top", "tags", {}, {"sort": sort, "limit": 50}),
+            ("tags.top (prefix)", "tags", {"_id": tag_prefix_filter("ai")}, {"sort": sort, "limit": 10}),
+        ]
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import httpx
+
+from config import (
+    XAI_SESSION_URL,
+    TOKEN_POOL_SIZE,
+    TOKEN_TTL_SECONDS,
+    TOKEN_MIN_REMAINING_SECONDS,
+)
+
+logger = logging.getLogger("TokenBroker")
+
+
+class TokenMintError(Exception):
+    """Raised when xAI refuses (or we cannot reach it) to mint an ephemeral token."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class TokenBroker:
+    """
+    Keeps a small pool of pre-minted ephemeral realtime tokens so POST /session
+    can answer from memory. One long-lived HTTP/2 client is shared by every mint.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        url: str = XAI_SESSION_URL,
+        pool_size: int = TOKEN_POOL_SIZE,
+        ttl_seconds: int = TOKEN_TTL_SECONDS,
+        min_remaining_seconds: int = TOKEN_MIN_REMAINING_SECONDS,
+    ):
+        self.api_key = api_key
+        self.url = url
+        self.pool_size = pool_size
+        self.ttl_seconds = ttl_seconds
+        self.min_remaining_seconds = min_remaining_seconds
+
+        # (monotonic deadline after which the token must not be handed out, payload)
+        self._pool: Deque[Tuple[float, Dict[str, Any]]] = deque()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._refill_task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.mint_errors = 0
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                timeout=httpx.Timeout(10.0),
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            )
+        if self.api_key and self.pool_size > 0 and self._refill_task is None:
+            self._refill_task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self):
+        if self._refill_task:
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+            self._refill_task = None
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+        self._pool.clear()
+
+    async def get_token(self) -> Dict[str, Any]:
+        """Hand out a pooled token if one is fresh enough, otherwise mint inline."""
+        self._drop_stale()
+        if self._pool:
+            _, data = self._pool.popleft()
+            self.hits += 1
+            self._wakeup.set()
+            return data
+
+        self.misses += 1
+        self._wakeup.set()
+        _, data = await self._mint()
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "pooled": len(self._pool),
+            "pool_size": self.pool_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+            "expired": self.expired,
+            "mint_errors": self.mint_errors,
+        }
+
+    def _drop_stale(self):
+        now = time.monotonic()
+        # Every token is minted with the same TTL, so the oldest sit at the front
+        while self._pool and self._pool[0][0] <= now:
+            self._pool.popleft()
+            self.expired += 1
+
+    async def _mint(self) -> Tuple[float, Dict[str, Any]]:
+        if not self.api_key:
+            raise TokenMintError(500, "Server misconfigured: API Key missing")
+        if self._client is None:
+            await self.start()
+
+        try:
+            response = await self._client.post(
+                url=self.url,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+                json={"expires_after": {"seconds": self.ttl_seconds}},
+            )
+        except httpx.RequestError as e:
+            self.mint_errors += 1
+            logger.error(f"❌ Network Error: {e}")
+            raise TokenMintError(500, "Failed to connect to xAI")
+
+        if response.status_code != 200:
+            self.mint_errors += 1
+            logger.error(f"❌ xAI API Error: {response.status_code} - {response.text}")
+            raise TokenMintError(response.status_code, f"xAI Error: {response.text}")
+
+        data = response.json()
+        return self._usable_until(data), data
+
+    def _usable_until(self, data: Dict[str, Any]) -> float:
+        """Monotonic deadline for handing this token out, from `expires_at` when xAI sends one."""
+        lifetime = float(self.ttl_seconds)
+        expires_at = data.get("expires_at")
+        if expires_at is None and isinstance(data.get("client_secret"), dict):
+            expires_at = data["client_secret"].get("expires_at")
+        if isinstance(expires_at, (int, float)):
+            lifetime = min(lifetime, expires_at - time.time())
+        return time.monotonic() + lifetime - self.min_remaining_seconds
+
+    async def _refill_loop(self):
+        backoff = 1.0
+        while True:
+            self._drop_stale()
+            try:
+                while len(self._pool) < self.pool_size:
+                    deadline, data = await self._mint()
+                    if deadline <= time.monotonic():
+                        logger.warning("⚠️ Minted token expires too soon to pool, check TOKEN_MIN_REMAINING_SECONDS")
+                        break
+                    self._pool.append((deadline, data))
+                backoff = 1.0
+            except TokenMintError:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            except Exception as e:
+                logger.error(f"❌ Token refill failed: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            # Sleep until a token falls out of its usable window or one is taken
+            timeout = max(self._pool[0][0] - time.monotonic(), 0.0) if self._pool else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
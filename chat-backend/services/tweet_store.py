@@ -0,0 +1,92 @@
+import hashlib
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import DESCENDING, UpdateOne
+
+from database import db
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def content_hash(text: str) -> str:
+    """Same words, same hash: whitespace and case do not count."""
+    normalized = _WHITESPACE.sub(" ", text).strip().casefold()
+    return hashlib.sha256(normalized.encode()).hexdigest()[:16]
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    # Stored naive UTC, like every other timestamp in the database
+    return datetime.fromisoformat(value).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class TweetStore:
+    """
+    Raw tweets as fetched from X, in `tweets` keyed by tweet id, so a persona
+    can be re-analyzed (new prompt, new model) without going back to the API.
+    Re-fetching a tweet refreshes its metrics in place.
+    """
+
+    def __init__(self, database=db):
+        self.db = database
+        self.upserted = 0
+
+    async def upsert_many(self, author_id: str, tweets: List[Dict[str, Any]]) -> int:
+        """Bulk-upsert tweets from an X API v2 response; returns how many were new."""
+        if not tweets:
+            return 0
+        now = datetime.utcnow()
+        ops = [UpdateOne(
+            {"_id": str(tweet["id"])},
+            {
+                "$set": {
+                    "text": tweet["text"],
+                    "content_hash": content_hash(tweet["text"]),
+                    "public_metrics": tweet.get("public_metrics"),
+                    "fetched_at": now,
+                },
+                "$setOnInsert": {
+                    "author_id": str(author_id),
+                    "created_at": _parse_time(tweet.get("created_at")),
+                    "entities": tweet.get("entities"),
+                },
+            },
+            upsert=True
+        ) for tweet in tweets]
+        result = await self.db.tweets.bulk_write(ops, ordered=False)
+        self.upserted += result.upserted_count
+        return result.upserted_count
+
+    async def recent_texts(self, author_id: str, limit: int = 50) -> List[str]:
+        """
+        An author's newest tweets for analysis, newest first. Repeats of the same
+        text (reposted announcements, copy-paste replies) are counted once.
+        """
+        texts: List[str] = []
+        seen = set()
+        cursor = self.db.tweets.find(
+            {"author_id": str(author_id)},
+            {"text": 1, "content_hash": 1},
+            sort=[("created_at", DESCENDING)]
+        )
+        async for doc in cursor:
+            if doc["content_hash"] in seen:
+                continue
+            seen.add(doc["content_hash"])
+            texts.append(doc["text"])
+            if len(texts) >= limit:
+                break
+        await cursor.close()
+        return texts
+
+    def stats(self) -> Dict[str, Any]:
+        return {"upserted": self.upserted}
+
+    @staticmethod
+    def query_shapes() -> List[Tuple[str, str, Dict[str, Any], Dict[str, Any]]]:
+        return [
+            ("tweets.recent_texts", "tweets", {"author_id": "0"}, {"sort": [("created_at", DESCENDING)]}),
+        ]
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import websockets
+from websockets.protocol import State
+
+from config import (
+    XAI_REALTIME_URL,
+    UPSTREAM_POOL_SIZE,
+    UPSTREAM_MAX_AGE_SECONDS,
+    UPSTREAM_PING_INTERVAL_SECONDS,
+)
+
+logger = logging.getLogger("UpstreamPool")
+
+
+class UpstreamPool:
+    """
+    Keeps a few xAI realtime sockets connected, authenticated and (optionally)
+    configured with the persona-independent part of session.update, so a browser
+    attaching to /ws skips the TLS/WebSocket handshake entirely.
+
+    Sockets are handed out, never returned: a realtime session is stateful.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        url: str = XAI_REALTIME_URL,
+        size: int = UPSTREAM_POOL_SIZE,
+        max_age_seconds: int = UPSTREAM_MAX_AGE_SECONDS,
+        ping_interval_seconds: int = UPSTREAM_PING_INTERVAL_SECONDS,
+        session_defaults: Optional[Dict[str, Any]] = None,
+    ):
+        self.api_key = api_key
+        self.url = url
+        self.size = size
+        self.max_age_seconds = max_age_seconds
+        self.ping_interval_seconds = ping_interval_seconds
+        self.session_defaults = session_defaults
+
+        # (monotonic time connected, socket)
+        self._idle: Deque[Tuple[float, Any]] = deque()
+        self._maintain_task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+        self.hits = 0
+        self.misses = 0
+        self.retired = 0
+        self.connect_errors = 0
+
+    async def start(self):
+        if self.api_key and self.size > 0 and self._maintain_task is None:
+            self._maintain_task = asyncio.create_task(self._maintain_loop())
+
+    async def stop(self):
+        if self._maintain_task:
+            self._maintain_task.cancel()
+            try:
+                await self._maintain_task
+            except asyncio.CancelledError:
+                pass
+            self._maintain_task = None
+        while self._idle:
+            _, ws = self._idle.popleft()
+            await ws.close()
+
+    async def acquire(self):
+        """A ready upstream socket; the caller owns it and must close it."""
+        while self._idle:
+            connected_at, ws = self._idle.popleft()
+            if self._usable(connected_at, ws):
+                self.hits += 1
+                self._wakeup.set()
+                return ws
+            await self._retire(ws)
+
+        self.misses += 1
+        self._wakeup.set()
+        return await self._connect()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "idle": len(self._idle),
+            "pool_size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+            "retired": self.retired,
+            "connect_errors": self.connect_errors,
+        }
+
+    async def _connect(self):
+        ws = await websockets.connect(
+            self.url,
+            additional_headers={"Authorization": f"Bearer {self.api_key}"},
+            ping_interval=self.ping_interval_seconds,
+        )
+        if self.session_defaults:
+            await ws.send(json.dumps({"type": "session.update", "session": self.session_defaults}))
+        return ws
+
+    def _usable(self, connected_at: float, ws) -> bool:
+        return ws.state is State.OPEN and time.monotonic() - connected_at < self.max_age_seconds
+
+    async def _retire(self, ws):
+        self.retired += 1
+        try:
+            await ws.close()
+        except Exception:
+            pass
+
+    async def _maintain_loop(self):
+        backoff = 1.0
+        while True:
+            # Drop sockets that died (missed heartbeats) or aged out
+            for _ in range(len(self._idle)):
+                connected_at, ws = self._idle.popleft()
+                if self._usable(connected_at, ws):
+                    self._idle.append((connected_at, ws))
+                else:
+                    await self._retire(ws)
+
+            try:
+                while len(self._idle) < self.size:
+                    ws = await self._connect()
+                    self._idle.append((time.monotonic(), ws))
+                backoff = 1.0
+            except Exception as e:
+                self.connect_errors += 1
+                logger.error(f"❌ Upstream pre-connect failed: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            # Wake up when a socket is taken, or in time to replace the oldest one
+            timeout = float(self.ping_interval_seconds)
+            if self._idle:
+                timeout = min(timeout, max(self._idle[0][0] + self.max_age_seconds - time.monotonic(), 0.0))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from config import (
+    X_API_BASE_URL,
+    X_MAX_CONNECTIONS,
+    X_LOOKUP_BATCH_WINDOW_MS,
+    X_MAX_RATE_LIMIT_WAIT_SECONDS,
+)
+
+logger = logging.getLogger("XClient")
+
+USER_FIELDS = "public_metrics,description,location,verified,profile_image_url,created_at"
+TWEET_FIELDS = "created_at,public_metrics,entities"
+# Usernames per GET /2/users/by call (API limit)
+LOOKUP_BATCH_MAX = 100
+# 429s retried after waiting out the window, before giving up
+MAX_RATE_LIMIT_RETRIES = 3
+# What X accepts as a username; one bad name would fail a whole users lookup
+VALID_USERNAME = re.compile(r"^[A-Za-z0-9_]{1,15}$")
+
+
+class XApiError(Exception):
+    """X answered with an error, or a rate-limit window is further away than we are willing to wait."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class XUserNotFound(XApiError):
+    def __init__(self, username: str):
+        super().__init__(404, f"User @{username} not found")
+
+
+class XInvalidUsername(XApiError):
+    def __init__(self, username: str):
+        super().__init__(400, f"{username!r} is not a valid X username")
+
+
+class RateWindow:
+    """
+    Client-side view of one X rate-limit bucket, fed by the x-rate-limit-*
+    headers. Callers take a slot before each request; once the window is spent
+    they wait for its reset instead of sending a request that would 429.
+    """
+
+    def __init__(self, name: str, max_wait: float):
+        self.name = name
+        self.max_wait = max_wait
+        # None until X has told us
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.waits = 0
+
+    async def acquire(self):
+        while True:
+            if self.remaining is None or self.remaining > 0 or time.time() >= self.reset_at:
+                if self.remaining is not None:
+                    # Reserve it now so concurrent callers don't all spend the last slot
+                    self.remaining = self.remaining - 1 if time.time() < self.reset_at else None
+                return
+            delay = self.reset_at - time.time() + 0.5
+            if delay > self.max_wait:
+                raise XApiError(429, f"X rate limit for {self.name} resets in {int(delay)}s")
+            self.waits += 1
+            logger.info(f"⏳ X {self.name} window spent, queueing {delay:.1f}s until reset")
+            await asyncio.sleep(delay)
+
+    def update(self, headers: httpx.Headers):
+        remaining = headers.get("x-rate-limit-remaining")
+        reset = headers.get("x-rate-limit-reset")
+        if remaining is not None and reset is not None:
+            self.remaining = int(remaining)
+            self.reset_at = float(reset)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "remaining": self.remaining,
+            "resets_in": max(round(self.reset_at - time.time()), 0) if self.remaining is not None else None,
+            "waits": self.waits,
+        }
+
+
+class XClient:
+    """
+    Async X API v2 client on one pooled HTTP/2 connection set. Requests are
+    scheduled per rate-limit bucket (see RateWindow), and get_user() calls that
+    arrive within X_LOOKUP_BATCH_WINDOW_MS of each other share one
+    GET /2/users/by lookup. The base URL is configurable so it can be pointed
+    at a local fake X API.
+    """
+
+    def __init__(
+        self,
+        bearer_token: Optional[str],
+        base_url: str = X_API_BASE_URL,
+        max_connections: int = X_MAX_CONNECTIONS,
+        batch_window_ms: int = X_LOOKUP_BATCH_WINDOW_MS,
+        max_wait_seconds: float = X_MAX_RATE_LIMIT_WAIT_SECONDS,
+    ):
+        self.bearer_token = bearer_token
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.batch_window = batch_window_ms / 1000
+        self.max_wait_seconds = max_wait_seconds
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._windows: Dict[str, RateWindow] = {}
+        # Lowercased username -> futures waiting on the next lookup batch
+        self._pending_lookups: Dict[str, List[asyncio.Future]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        # Lookups in flight; held so they are not garbage-collected mid-request
+        self._lookup_tasks: Set[asyncio.Task] = set()
+
+        self.requests = 0
+        self.lookup_batches = 0
+        self.rate_limited = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=True,
+                headers={"Authorization": f"Bearer {self.bearer_token}"},
+                timeout=httpx.Timeout(10.0),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def stop(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        # Callers still waiting on a lookup get an error instead of hanging
+        batch, self._pending_lookups = self._pending_lookups, {}
+        self._fail(batch, XApiError(503, "X client stopped"))
+        for task in list(self._lookup_tasks):
+            task.cancel()
+        await asyncio.gather(*self._lookup_tasks, return_exceptions=True)
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    def _window(self, bucket: str) -> RateWindow:
+        window = self._windows.get(bucket)
+        if window is None:
+            window = self._windows[bucket] = RateWindow(bucket, self.max_wait_seconds)
+        return window
+
+    async def _get(self, bucket: str, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        window = self._window(bucket)
+        for _ in range(MAX_RATE_LIMIT_RETRIES + 1):
+            await window.acquire()
+            self.requests += 1
+            try:
+                response = await self._http().get(path, params=params)
+            except httpx.HTTPError as e:
+                raise XApiError(502, f"X request failed: {e}")
+            window.update(response.headers)
+            if response.status_code == 429:
+                # Window state came with the 429; acquire() waits out the reset
+                self.rate_limited += 1
+                window.remaining = 0
+                if not response.headers.get("x-rate-limit-reset"):
+                    window.reset_at = time.time() + 60
+                continue
+            if response.status_code >= 400:
+                raise XApiError(response.status_code, response.text[:200])
+            return response.json()
+        raise XApiError(429, f"X kept rate limiting {bucket}")
+
+    # --- Users ---
+
+    async def get_user(self, username: str) -> Dict[str, Any]:
+        """One user by handle; concurrent calls are batched into a single lookup."""
+        username = username.strip().lstrip("@")
+        if not VALID_USERNAME.match(username):
+            # Rejected here so it fails alone, not the whole batch it would have joined
+            raise XInvalidUsername(username)
+        future = asyncio.get_running_loop().create_future()
+        self._pending_lookups.setdefault(username.lower(), []).append(future)
+        if len(self._pending_lookups) >= LOOKUP_BATCH_MAX:
+            self._flush_lookups()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_after_window())
+        return await future
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.batch_window)
+        self._flush_task = None
+        self._flush_lookups()
+
+    def _flush_lookups(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        batch, self._pending_lookups = self._pending_lookups, {}
+        if batch:
+            task = asyncio.create_task(self._lookup(batch))
+            self._lookup_tasks.add(task)
+            task.add_done_callback(self._lookup_tasks.discard)
+
+    async def _lookup(self, batch: Dict[str, List[asyncio.Future]]):
+        self.lookup_batches += 1
+        try:
+            users = await self.get_users(list(batch))
+        except asyncio.CancelledError:
+            self._fail(batch, XApiError(503, "X client stopped"))
+            raise
+        except Exception as e:
+            self._fail(batch, e)
+            return
+        for username, futures in batch.items():
+            user = users.get(username)
+            for f in futures:
+                if f.done():
+                    continue
+                if user:
+                    f.set_result(user)
+                else:
+                    f.set_exception(XUserNotFound(username))
+
+    @staticmethod
+    def _fail(batch: Dict[str, List[asyncio.Future]], error: Exception):
+        for futures in batch.values():
+            for f in futures:
+                if not f.done():
+                    f.set_exception(error)
+
+    async def get_users(self, usernames: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Up to LOOKUP_BATCH_MAX users by handle in one call, keyed by lowercased username."""
+        body = await self._get("users_by", "/2/users/by", {
+            "usernames": ",".join(usernames),
+            "user.fields": USER_FIELDS,
+        })
+        return {u["username"].lower(): u for u in body.get("data", [])}
+
+    # --- Tweets ---
+
+    async def get_users_tweets(self, user_id: str, max_results: int = 50, since_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """A user's most recent tweets (newest first) and the response meta."""
+        params = {"max_results": max_results, "tweet.fields": TWEET_FIELDS}
+        if since_id:
+            params["since_id"] = since_id
+        body = await self._get("user_tweets", f"/2/users/{user_id}/tweets", params)
+        return body.get("data", []), body.get("meta", {})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "lookup_batches": self.lookup_batches,
+            "rate_limited": self.rate_limited,
+            "windows": {name: w.stats() for name, w in self._windows.items()},
+        }
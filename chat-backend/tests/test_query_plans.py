@@ -0,0 +1,46 @@
+"""
+Every query shape the services declare must be answered from an index.
+
+Runs against the MongoDB at MONGODB_URL, in a scratch database that is
+dropped afterwards; skipped when no server is reachable.
+
+    cd chat-backend && MONGODB_URL=mongodb://localhost:27017 python -m pytest -q tests
+"""
+import asyncio
+import uuid
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+
+from config import MONGO_URI
+from services.index_manager import IndexManager
+from services.profile_manager import ProfileManager
+from services.tag_catalog import TagCatalog
+from services.tweet_store import TweetStore
+
+QUERY_SHAPES = ProfileManager.query_shapes() + TagCatalog.query_shapes() + TweetStore.query_shapes()
+
+
+async def _check_plans():
+    client = AsyncIOMotorClient(MONGO_URI, serverSelectionTimeoutMS=1000)
+    try:
+        try:
+            await client.admin.command("ping")
+        except PyMongoError as e:
+            pytest.skip(f"MongoDB not reachable at {MONGO_URI}: {e}")
+        database = client[f"test_query_plans_{uuid.uuid4().hex[:8]}"]
+        try:
+            index_mgr = IndexManager(database=database)
+            report = await index_mgr.ensure_indexes()
+            assert not any(result["errors"] for result in report.values()), report
+            # Raises CollectionScanError naming every offending shape
+            await index_mgr.find_collscans(QUERY_SHAPES, strict=True)
+        finally:
+            await client.drop_database(database.name)
+    finally:
+        client.close()
+
+
+def test_query_shapes_use_an_index():
+    asyncio.run(_check_plans())